@@ -13,11 +13,17 @@ from app.db.database import Base  # noqa E402
 from app.db.models import (  # noqa E402
     Driver,
     Enterprise,
+    EnterpriseMileageReport,
+    GazetteerPlace,
+    GeocodedAddress,
     Report,
+    ReportJob,
     Trip,
     User,
     Vehicle,
     VehicleBrand,
+    VehicleDailyMileage,
+    VehicleDayWatermark,
     VehicleMileageReport,
     VehicleModel,
     VehicleTrackPoint,
@@ -0,0 +1,51 @@
+"""Report cache watermarks
+
+Revision ID: 0a7e4c91b5d6
+Revises: f2c6d8e0a1b4
+Create Date: 2026-10-18 15:47:09.221503
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "0a7e4c91b5d6"
+down_revision: Union[str, None] = "f2c6d8e0a1b4"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "vehicle_day_watermark",
+        sa.Column("vehicle_id", sa.BigInteger(), nullable=False),
+        sa.Column("day", sa.Date(), nullable=False),
+        sa.Column("modified_at", sa.DateTime(timezone=True), server_default=sa.text("now()"), nullable=False),
+        sa.ForeignKeyConstraint(["vehicle_id"], ["vehicle.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("vehicle_id", "day"),
+    )
+    op.add_column(
+        "report",
+        sa.Column("computed_at", sa.DateTime(timezone=True), server_default=sa.text("now()"), nullable=False),
+    )
+    op.add_column("vehiclemileagereport", sa.Column("vehicle_id", sa.BigInteger(), nullable=True))
+    op.create_foreign_key(
+        "vehiclemileagereport_vehicle_id_fkey",
+        "vehiclemileagereport",
+        "vehicle",
+        ["vehicle_id"],
+        ["id"],
+        ondelete="CASCADE",
+    )
+    op.create_index(op.f("ix_vehiclemileagereport_vehicle_id"), "vehiclemileagereport", ["vehicle_id"], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f("ix_vehiclemileagereport_vehicle_id"), table_name="vehiclemileagereport")
+    op.drop_constraint("vehiclemileagereport_vehicle_id_fkey", "vehiclemileagereport", type_="foreignkey")
+    op.drop_column("vehiclemileagereport", "vehicle_id")
+    op.drop_column("report", "computed_at")
+    op.drop_table("vehicle_day_watermark")
@@ -0,0 +1,25 @@
+"""Trip vehicle start index
+
+Revision ID: 3c8e1f5a9d27
+Revises: 0a7e4c91b5d6
+Create Date: 2026-10-18 17:12:40.518327
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "3c8e1f5a9d27"
+down_revision: Union[str, None] = "0a7e4c91b5d6"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index("ix_trip_vehicle_id_start_date_time", "trip", ["vehicle_id", "start_date_time"], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index("ix_trip_vehicle_id_start_date_time", table_name="trip")
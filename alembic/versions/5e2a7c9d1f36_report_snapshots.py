@@ -0,0 +1,29 @@
+"""Report snapshots and watermark transaction ids
+
+Revision ID: 5e2a7c9d1f36
+Revises: b4e9c2d7f813
+Create Date: 2026-10-18 21:05:12.417530
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "5e2a7c9d1f36"
+down_revision: Union[str, None] = "b4e9c2d7f813"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # reports without a snapshot are computed again on the next request
+    op.add_column("report", sa.Column("computed_snapshot", sa.String(), nullable=True))
+    op.add_column("vehicle_day_watermark", sa.Column("modified_xid", sa.BigInteger(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("vehicle_day_watermark", "modified_xid")
+    op.drop_column("report", "computed_snapshot")
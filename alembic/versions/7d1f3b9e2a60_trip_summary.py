@@ -0,0 +1,55 @@
+"""Trip summary
+
+Revision ID: 7d1f3b9e2a60
+Revises: 3c8e1f5a9d27
+Create Date: 2026-10-18 18:05:27.301964
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import geoalchemy2
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "7d1f3b9e2a60"
+down_revision: Union[str, None] = "3c8e1f5a9d27"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "trip_summary",
+        sa.Column("trip_id", sa.BigInteger(), nullable=False),
+        sa.Column("points_count", sa.Integer(), nullable=False),
+        sa.Column("distance_km", sa.Float(), nullable=False),
+        sa.Column("duration_seconds", sa.Float(), nullable=False),
+        sa.Column("max_speed_kmh", sa.Float(), nullable=False),
+        sa.Column("avg_speed_kmh", sa.Float(), nullable=False),
+        sa.Column(
+            "bbox",
+            geoalchemy2.types.Geometry(geometry_type="POLYGON", spatial_index=False, from_text="ST_GeomFromEWKT"),
+            nullable=True,
+        ),
+        sa.Column(
+            "start_point",
+            geoalchemy2.types.Geometry(geometry_type="POINT", spatial_index=False, from_text="ST_GeomFromEWKT"),
+            nullable=True,
+        ),
+        sa.Column(
+            "finish_point",
+            geoalchemy2.types.Geometry(geometry_type="POINT", spatial_index=False, from_text="ST_GeomFromEWKT"),
+            nullable=True,
+        ),
+        sa.Column("updated_at", sa.DateTime(timezone=True), server_default=sa.text("now()"), nullable=False),
+        sa.ForeignKeyConstraint(["trip_id"], ["trip.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("trip_id"),
+    )
+    op.create_index("idx_trip_summary_bbox", "trip_summary", ["bbox"], postgresql_using="gist")
+
+
+def downgrade() -> None:
+    op.drop_index("idx_trip_summary_bbox", table_name="trip_summary", postgresql_using="gist")
+    op.drop_table("trip_summary")
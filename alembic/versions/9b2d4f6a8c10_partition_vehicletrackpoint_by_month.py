@@ -0,0 +1,99 @@
+"""Partition vehicletrackpoint by month and index (vehicle_id, date_time)
+
+Revision ID: 9b2d4f6a8c10
+Revises: 057e3b8b04a4
+Create Date: 2026-10-18 10:12:31.402117
+
+"""
+
+from datetime import date, datetime, timezone
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "9b2d4f6a8c10"
+down_revision: Union[str, None] = "057e3b8b04a4"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+MONTHS_AHEAD = 3
+
+
+def _add_months(day: date, months: int) -> date:
+    month_index = day.month - 1 + months
+    return date(day.year + month_index // 12, month_index % 12 + 1, 1)
+
+
+def upgrade() -> None:
+    # keep the old table (and its id sequence) aside until the rows are copied
+    op.execute("ALTER TABLE vehicletrackpoint RENAME TO vehicletrackpoint_legacy")
+    op.execute("ALTER INDEX vehicletrackpoint_pkey RENAME TO vehicletrackpoint_legacy_pkey")
+    op.execute("ALTER INDEX IF EXISTS idx_vehicletrackpoint_geotag RENAME TO idx_vehicletrackpoint_legacy_geotag")
+    op.execute("ALTER SEQUENCE vehicletrackpoint_id_seq OWNED BY NONE")
+
+    # partition key has to be a part of the primary key
+    op.execute(
+        """
+        CREATE TABLE vehicletrackpoint (
+            id BIGINT NOT NULL DEFAULT nextval('vehicletrackpoint_id_seq'),
+            date_time TIMESTAMP WITH TIME ZONE NOT NULL,
+            geotag geometry(POINT) NOT NULL,
+            vehicle_id BIGINT NOT NULL REFERENCES vehicle (id) ON DELETE CASCADE,
+            PRIMARY KEY (id, date_time)
+        ) PARTITION BY RANGE (date_time)
+        """
+    )
+    op.execute("ALTER SEQUENCE vehicletrackpoint_id_seq OWNED BY vehicletrackpoint.id")
+    op.create_index("ix_vehicletrackpoint_vehicle_id_date_time", "vehicletrackpoint", ["vehicle_id", "date_time"])
+    op.create_index("idx_vehicletrackpoint_geotag", "vehicletrackpoint", ["geotag"], postgresql_using="gist")
+    op.execute("CREATE TABLE vehicletrackpoint_default PARTITION OF vehicletrackpoint DEFAULT")
+
+    first_point = op.get_bind().execute(sa.text("SELECT min(date_time) FROM vehicletrackpoint_legacy")).scalar()
+    today = datetime.now(tz=timezone.utc).date()
+    month = (first_point.astimezone(timezone.utc).date() if first_point else today).replace(day=1)
+    last_month = _add_months(today, MONTHS_AHEAD)
+    while month <= last_month:
+        next_month = _add_months(month, 1)
+        op.execute(
+            f"CREATE TABLE vehicletrackpoint_y{month.year}m{month.month:02d} PARTITION OF vehicletrackpoint "
+            f"FOR VALUES FROM ('{month} 00:00:00+00') TO ('{next_month} 00:00:00+00')"
+        )
+        month = next_month
+
+    op.execute(
+        """
+        INSERT INTO vehicletrackpoint (id, date_time, geotag, vehicle_id)
+        SELECT id, date_time, geotag, vehicle_id FROM vehicletrackpoint_legacy
+        """
+    )
+    op.drop_table("vehicletrackpoint_legacy")
+
+
+def downgrade() -> None:
+    op.execute("ALTER TABLE vehicletrackpoint RENAME TO vehicletrackpoint_partitioned")
+    op.execute("ALTER INDEX vehicletrackpoint_pkey RENAME TO vehicletrackpoint_partitioned_pkey")
+    op.execute("ALTER INDEX idx_vehicletrackpoint_geotag RENAME TO idx_vehicletrackpoint_partitioned_geotag")
+    op.execute("ALTER SEQUENCE vehicletrackpoint_id_seq OWNED BY NONE")
+    op.execute(
+        """
+        CREATE TABLE vehicletrackpoint (
+            id BIGINT NOT NULL DEFAULT nextval('vehicletrackpoint_id_seq'),
+            date_time TIMESTAMP WITH TIME ZONE NOT NULL,
+            geotag geometry(POINT) NOT NULL,
+            vehicle_id BIGINT NOT NULL REFERENCES vehicle (id) ON DELETE CASCADE,
+            CONSTRAINT vehicletrackpoint_pkey PRIMARY KEY (id)
+        )
+        """
+    )
+    op.execute("ALTER SEQUENCE vehicletrackpoint_id_seq OWNED BY vehicletrackpoint.id")
+    op.create_index("idx_vehicletrackpoint_geotag", "vehicletrackpoint", ["geotag"], postgresql_using="gist")
+    op.execute(
+        """
+        INSERT INTO vehicletrackpoint (id, date_time, geotag, vehicle_id)
+        SELECT id, date_time, geotag, vehicle_id FROM vehicletrackpoint_partitioned
+        """
+    )
+    # drops the partitions as well
+    op.drop_table("vehicletrackpoint_partitioned")
@@ -0,0 +1,47 @@
+"""Trip detection state
+
+Revision ID: b4e9c2d7f813
+Revises: 7d1f3b9e2a60
+Create Date: 2026-10-18 19:21:44.806215
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "b4e9c2d7f813"
+down_revision: Union[str, None] = "7d1f3b9e2a60"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "vehicle_trip_detection_state",
+        sa.Column("vehicle_id", sa.BigInteger(), nullable=False),
+        sa.Column("last_date_time", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("last_long", sa.Float(), nullable=False),
+        sa.Column("last_lat", sa.Float(), nullable=False),
+        sa.Column("trip_id", sa.BigInteger(), nullable=True),
+        sa.Column("trip_start_date_time", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("trip_last_moving_date_time", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("trip_distance_km", sa.Float(), nullable=False),
+        sa.ForeignKeyConstraint(["trip_id"], ["trip.id"], ondelete="SET NULL"),
+        sa.ForeignKeyConstraint(["vehicle_id"], ["vehicle.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("vehicle_id"),
+    )
+    op.create_table(
+        "trip_detection_cursor",
+        sa.Column("shard", sa.Integer(), nullable=False),
+        sa.Column("shards", sa.Integer(), nullable=False),
+        sa.Column("last_point_id", sa.BigInteger(), nullable=False),
+        sa.PrimaryKeyConstraint("shard", "shards"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("trip_detection_cursor")
+    op.drop_table("vehicle_trip_detection_state")
@@ -0,0 +1,52 @@
+"""Geocoded address cache and gazetteer places
+
+Revision ID: c3e8a1f5b742
+Revises: 9b2d4f6a8c10
+Create Date: 2026-10-18 12:31:05.118842
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import geoalchemy2
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "c3e8a1f5b742"
+down_revision: Union[str, None] = "9b2d4f6a8c10"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "geocodedaddress",
+        sa.Column("id", sa.BigInteger(), nullable=False),
+        sa.Column("cell", sa.String(), nullable=False),
+        sa.Column("address", sa.String(), nullable=False),
+        sa.Column("provider", sa.String(), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.text("now()"), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(op.f("ix_geocodedaddress_cell"), "geocodedaddress", ["cell"], unique=True)
+    op.create_table(
+        "gazetteerplace",
+        sa.Column("id", sa.BigInteger(), nullable=False),
+        sa.Column("name", sa.String(), nullable=False),
+        sa.Column("address", sa.String(), nullable=False),
+        sa.Column(
+            "geotag",
+            geoalchemy2.types.Geometry(geometry_type="POINT", spatial_index=False, from_text="ST_GeomFromEWKT"),
+            nullable=False,
+        ),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("idx_gazetteerplace_geotag", "gazetteerplace", ["geotag"], postgresql_using="gist")
+
+
+def downgrade() -> None:
+    op.drop_index("idx_gazetteerplace_geotag", table_name="gazetteerplace", postgresql_using="gist")
+    op.drop_table("gazetteerplace")
+    op.drop_index(op.f("ix_geocodedaddress_cell"), table_name="geocodedaddress")
+    op.drop_table("geocodedaddress")
@@ -0,0 +1,35 @@
+"""Enterprise mileage report
+
+Revision ID: e5a9b3d17c28
+Revises: d71f0c2e9a43
+Create Date: 2026-10-18 14:20:41.512730
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "e5a9b3d17c28"
+down_revision: Union[str, None] = "d71f0c2e9a43"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "enterprisemileagereport",
+        sa.Column("id", sa.BigInteger(), nullable=False),
+        sa.ForeignKeyConstraint(["id"], ["report.id"]),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.alter_column("reportjob", "vehicle_id", existing_type=sa.BigInteger(), nullable=True)
+
+
+def downgrade() -> None:
+    op.execute("DELETE FROM reportjob WHERE vehicle_id IS NULL")
+    op.alter_column("reportjob", "vehicle_id", existing_type=sa.BigInteger(), nullable=False)
+    op.drop_table("enterprisemileagereport")
+    op.execute("DELETE FROM report WHERE type = 'enterprisemileagereport'")
@@ -0,0 +1,35 @@
+"""Vehicle daily mileage rollup
+
+Revision ID: f2c6d8e0a1b4
+Revises: e5a9b3d17c28
+Create Date: 2026-10-18 15:03:52.640187
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "f2c6d8e0a1b4"
+down_revision: Union[str, None] = "e5a9b3d17c28"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "vehicle_daily_mileage",
+        sa.Column("vehicle_id", sa.BigInteger(), nullable=False),
+        sa.Column("day", sa.Date(), nullable=False),
+        sa.Column("distance_km", sa.Float(), nullable=False),
+        sa.Column("points_count", sa.Integer(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(timezone=True), server_default=sa.text("now()"), nullable=False),
+        sa.ForeignKeyConstraint(["vehicle_id"], ["vehicle.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("vehicle_id", "day"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("vehicle_daily_mileage")
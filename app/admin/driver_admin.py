@@ -2,6 +2,7 @@ from typing import Any
 
 from sqladmin import ModelView
 from sqlalchemy import or_, update
+from sqlalchemy.orm import joinedload, selectinload
 from starlette.requests import Request
 
 from app.db.database import async_session_maker
@@ -14,6 +15,13 @@ class DriverAdmin(ModelView, model=Driver):
     column_details_list = ("id", "first_name", "last_name", "enterprise", "salary", "vehicles")
     form_excluded_columns = ("vehicles",)  # assignation of driver on vehicle should be processed in Drive Vehicle model
 
+    async def get_object_for_details(self, value: Any) -> Any:
+        # assignments are shown as "driver on vehicle", relationships are not loaded lazily
+        stmt = self._stmt_by_identifier(value).options(
+            joinedload(Driver.enterprise), selectinload(Driver.vehicles).joinedload(DriverVehicle.vehicle)
+        )
+        return await self._get_object_by_pk(stmt)
+
 
 class DriverVehicleAdmin(ModelView, model=DriverVehicle):
     column_list = [DriverVehicle.driver, DriverVehicle.vehicle, DriverVehicle.is_active_driver]
@@ -2,9 +2,10 @@ from typing import Any
 
 import pytz
 from sqladmin import ModelView
+from sqlalchemy.orm import joinedload, selectinload
 from starlette.requests import Request
 
-from app.db.models import Vehicle, VehicleBrand, VehicleModel, VehicleTrackPoint
+from app.db.models import DriverVehicle, Vehicle, VehicleBrand, VehicleModel, VehicleTrackPoint
 
 
 class VehicleAdmin(ModelView, model=Vehicle):
@@ -30,6 +31,15 @@ class VehicleAdmin(ModelView, model=Vehicle):
     )
     form_excluded_columns = ("drivers",)
 
+    async def get_object_for_details(self, value: Any) -> Any:
+        # assignments are shown as "driver on vehicle", relationships are not loaded lazily
+        stmt = self._stmt_by_identifier(value).options(
+            joinedload(Vehicle.brandmodel),
+            joinedload(Vehicle.enterprise),
+            selectinload(Vehicle.drivers).joinedload(DriverVehicle.driver),
+        )
+        return await self._get_object_by_pk(stmt)
+
     async def on_model_change(self, data: dict, model: Any, is_created: bool, request: Request) -> None:
         """Perform some actions before a model is created or updated.
         By default does nothing.
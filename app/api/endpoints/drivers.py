@@ -4,12 +4,12 @@ from app.api.endpoints.user import get_current_active_user
 from app.api.schemas.driver import DriverFromDB
 from app.services.driver_service import DriverService
 from app.utils.pagination import PagedResponseSchema, PageParams
-from app.utils.unitofwork import IUnitOfWork, UnitOfWork
+from app.utils.unitofwork import IUnitOfWork, get_uow
 
 driver_router = APIRouter(prefix="/driver", tags=["Driver"])
 
 
-async def get_driver_service(uow: IUnitOfWork = Depends(UnitOfWork)) -> DriverService:
+async def get_driver_service(uow: IUnitOfWork = Depends(get_uow)) -> DriverService:
     return DriverService(uow)
 
 
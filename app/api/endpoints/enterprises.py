@@ -11,12 +11,12 @@ from app.api.schemas.enterprise import (
 )
 from app.api.schemas.user import UserExtended
 from app.services.enterprise_service import EnterpriseService
-from app.utils.unitofwork import IUnitOfWork, UnitOfWork
+from app.utils.unitofwork import IUnitOfWork, get_uow
 
 enterprise_router = APIRouter(prefix="/enterprise", tags=["Enterprise"])
 
 
-async def get_enterprise_service(uow: IUnitOfWork = Depends(UnitOfWork)) -> EnterpriseService:
+async def get_enterprise_service(uow: IUnitOfWork = Depends(get_uow)) -> EnterpriseService:
     return EnterpriseService(uow)
 
 
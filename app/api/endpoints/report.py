@@ -1,15 +1,16 @@
 from typing import Annotated
 
-from fastapi import APIRouter, Body, Depends
+from fastapi import APIRouter, Body, Depends, Response, status
 
-from app.api.schemas.report import ReportFromDB, ReportCreateRequest
+from app.api.schemas.report import ReportCreateRequest, ReportFromDB, ReportJobFromDB
+from app.db.models.report import ReportJobStatusChoices
 from app.services.report_service import ReportService
-from app.utils.unitofwork import IUnitOfWork, UnitOfWork
+from app.utils.unitofwork import IUnitOfWork, get_uow
 
 report_router = APIRouter(prefix="/report", tags=["Report"])
 
 
-async def get_report_service(uow: IUnitOfWork = Depends(UnitOfWork)) -> ReportService:
+async def get_report_service(uow: IUnitOfWork = Depends(get_uow)) -> ReportService:
     return ReportService(uow)
 
 
@@ -22,19 +23,36 @@ async def get_reports(
     return await report_service.get_reports(enterprise_id, desc)
 
 
-@report_router.post("/reports/", response_model=ReportFromDB)
+@report_router.post("/reports/", response_model=ReportJobFromDB, status_code=status.HTTP_202_ACCEPTED)
 async def create_report(
     report_request_data: Annotated[ReportCreateRequest, Body()],
+    response: Response,
     report_service: ReportService = Depends(get_report_service),
-) -> ReportFromDB:
+) -> ReportJobFromDB:
+    """
+    Queues the report, poll `/report/jobs/{job_id}` until it is done and get the report by its report_id.
+    A still valid report of the same inputs is returned at once as a done job without id with status code 200.
+    """
     requset_dict = {
-        "vehicle_id": report_request_data.vehicle_id,
         "period": report_request_data.period,
         "from_date": report_request_data.from_date,
         "till_date": report_request_data.to_date,
         "enterprise_id": report_request_data.enterprise_id,
     }
-    return await report_service.create_report_by_vehicle(**requset_dict)
+    if report_request_data.type == "enterprisemileagereport":
+        return await report_service.enqueue_report_by_enterprise(**requset_dict)
+    job = await report_service.enqueue_report_by_vehicle(vehicle_id=report_request_data.vehicle_id, **requset_dict)
+    if job.status == ReportJobStatusChoices.DONE.value:
+        response.status_code = status.HTTP_200_OK
+    return job
+
+
+@report_router.get("/jobs/{job_id}", response_model=ReportJobFromDB)
+async def retrieve_report_job(
+    job_id: int,
+    report_service: ReportService = Depends(get_report_service),
+) -> ReportJobFromDB:
+    return await report_service.retrieve_report_job(job_id)
 
 
 @report_router.get("/reports/{report_id}", response_model=ReportFromDB)
@@ -1,9 +1,9 @@
 from datetime import datetime
 from typing import Annotated
 
-from fastapi import APIRouter, Body, Depends, HTTPException, status
+from fastapi import APIRouter, Body, Depends, HTTPException, Query, status
 from fastapi.exceptions import ValidationException
-from fastapi.responses import FileResponse
+from fastapi.responses import HTMLResponse
 from sqlalchemy.exc import NoResultFound
 
 from app.api.endpoints.user import get_current_active_user
@@ -17,14 +17,18 @@ from app.api.schemas.user import UserExtended
 from app.api.schemas.vehicle_track_point import (
     VehicleTrackPoint,
     VehicleTrackPointGeoJSON,
+    to_geojson_feature,
 )
+from app.core.config import settings
 from app.services.trip_service import TripService
-from app.utils.unitofwork import IUnitOfWork, UnitOfWork
+from app.utils.pagination import CursorParams
+from app.utils.streaming import StreamFormat, streaming_response
+from app.utils.unitofwork import IUnitOfWork, get_uow
 
 trip_router = APIRouter(prefix="/trip", tags=["Trip"])
 
 
-async def get_trip_service(uow: IUnitOfWork = Depends(UnitOfWork)) -> TripService:
+async def get_trip_service(uow: IUnitOfWork = Depends(get_uow)) -> TripService:
     return TripService(uow)
 
 
@@ -36,10 +40,12 @@ async def get_trips(
     vehicle_id: int = None,
     from_date: str = None,
     till_date: str = None,
+    cursor_params: CursorParams = Depends(),
 ):
+    """Trips ordered by (start_date_time, id), `size` limits a page, the next one starts after the last trip."""
     if current_user.role is None:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="You should have a role in a compmany.")
-    return await trip_service.get_trips(current_user, geojson, vehicle_id, from_date, till_date)
+    return await trip_service.get_trips(current_user, geojson, vehicle_id, from_date, till_date, cursor_params)
 
 
 @trip_router.get("/trips/with_track_by_vehicle/", response_model=list[VehicleTrackPoint | VehicleTrackPointGeoJSON])
@@ -50,10 +56,30 @@ async def get_trips_with_track_by_vehicle(
     from_date: datetime = None,
     till_date: datetime = None,
     geojson: bool = False,
+    output_format: Annotated[StreamFormat, Query(alias="format")] = "json",
+    simplify_tolerance: Annotated[float, Query(gt=0)] = None,
+    max_points: Annotated[int, Query(ge=2)] = None,
 ) -> list[VehicleTrackPoint | VehicleTrackPointGeoJSON]:
+    """
+    `format=ndjson` or `format=geojson` (FeatureCollection) stream the points instead of building a list.
+    `simplify_tolerance` (metres) and `max_points` return a simplified track, e.g. for a zoomed out map.
+    """
     if current_user.role is None:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="You should have a role in a compmany.")
-    return await trip_service.get_trips_points_by_vehicle(current_user, vehicle_id, from_date, till_date, geojson)
+    if output_format == "json":
+        return await trip_service.get_trips_points_by_vehicle(
+            current_user, vehicle_id, from_date, till_date, geojson, simplify_tolerance, max_points
+        )
+    track_points = await trip_service.stream_trips_points_by_vehicle(
+        current_user,
+        vehicle_id,
+        from_date,
+        till_date,
+        geojson or output_format == "geojson",
+        simplify_tolerance,
+        max_points,
+    )
+    return streaming_response(track_points, output_format, to_geojson_feature)
 
 
 @trip_router.get("/trips/by_vehicle/", response_model=list[TripFromDBWithExtraData])
@@ -70,16 +96,22 @@ async def get_trips_by_vehicle(
     return await trip_service.get_trips_by_vehicle(current_user, vehicle_id, from_date, till_date, geojson)
 
 
-@trip_router.post("/get_map_for_trip/{vehicle_id}", response_class=FileResponse, status_code=status.HTTP_200_OK)
+@trip_router.post("/get_map_for_trip/{vehicle_id}", response_class=HTMLResponse, status_code=status.HTTP_200_OK)
 async def create_map_for_trip(
-    response: FileResponse,
     trip_ids: Annotated[TripPointsForMap, Body()],
     trip_service: TripService = Depends(get_trip_service),
     vehicle_id: int = None,
+    simplify_tolerance: Annotated[float, Query(ge=0)] = settings.MAP_SIMPLIFY_TOLERANCE,
 ):
-    await trip_service.create_map(vehicle_id, trip_ids)
-    response.headers["X-Frame-Options"] = "SAMEORIGIN"
-    return "/code/map.html"
+    """
+    Rendered maps are cached, a repeated view of unchanged trips is sent from the cached file.
+    Tracks are simplified with `simplify_tolerance` metres, 0 renders all points.
+    """
+    try:
+        map_html = await trip_service.create_map(vehicle_id, trip_ids, simplify_tolerance)
+    except NoResultFound:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Trips with track points were not found.")
+    return HTMLResponse(map_html, headers={"X-Frame-Options": "SAMEORIGIN"})
 
 
 @trip_router.get("/trips/{trip_id}", response_model=TripFromDB)
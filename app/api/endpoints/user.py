@@ -13,12 +13,12 @@ from app.utils.auth import (
     oauth2_scheme,
     verify_password,
 )
-from app.utils.unitofwork import IUnitOfWork, UnitOfWork
+from app.utils.unitofwork import IUnitOfWork, get_uow
 
 user_router = APIRouter(prefix="", tags=["User"])
 
 
-async def get_user_service(uow: IUnitOfWork = Depends(UnitOfWork)) -> UserService:
+async def get_user_service(uow: IUnitOfWork = Depends(get_uow)) -> UserService:
     return UserService(uow)
 
 
@@ -40,7 +40,7 @@ async def get_current_user(
         raise credentials_exception
 
     try:
-        user = await user_service.get_user_by_username(token_data.username)
+        user = await user_service.get_principal(token_data.username)
     except NoResultFound:
         raise credentials_exception
     return user
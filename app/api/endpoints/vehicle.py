@@ -9,12 +9,12 @@ from app.api.schemas.user import UserExtended
 from app.api.schemas.vehicle import VehicleCreate, VehicleFromDB, VehiclePartialUpdate, VehicleNamesFromDB
 from app.services.vehicle_service import VehicleService
 from app.utils.pagination import PagedResponseSchema, PageParams
-from app.utils.unitofwork import IUnitOfWork, UnitOfWork
+from app.utils.unitofwork import IUnitOfWork, get_uow
 
 vehicle_router = APIRouter(prefix="/vehicle", tags=["Vehicle"])
 
 
-async def get_vehicle_service(uow: IUnitOfWork = Depends(UnitOfWork)) -> VehicleService:
+async def get_vehicle_service(uow: IUnitOfWork = Depends(get_uow)) -> VehicleService:
     return VehicleService(uow)
 
 
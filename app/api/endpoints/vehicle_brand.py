@@ -7,12 +7,12 @@ from app.api.schemas.vehicle_brand import (
     VehicleBrandPartialUpdate,
 )
 from app.services.vehicle_service import VehicleBrandService
-from app.utils.unitofwork import IUnitOfWork, UnitOfWork
+from app.utils.unitofwork import IUnitOfWork, get_uow
 
 vehicle_brand_router = APIRouter(prefix="/vehicle_brand", tags=["VehicleBrand"])
 
 
-async def get_vehicle_brand_service(uow: IUnitOfWork = Depends(UnitOfWork)) -> VehicleBrandService:
+async def get_vehicle_brand_service(uow: IUnitOfWork = Depends(get_uow)) -> VehicleBrandService:
     return VehicleBrandService(uow)
 
 
@@ -8,12 +8,12 @@ from app.api.schemas.vehicle_model import (
     VehicleModelPartialUpdate,
 )
 from app.services.vehicle_service import VehicleModelService
-from app.utils.unitofwork import IUnitOfWork, UnitOfWork
+from app.utils.unitofwork import IUnitOfWork, get_uow
 
 vehicle_model_router = APIRouter(prefix="/vehicle_model", tags=["VehicleModel"])
 
 
-async def get_vehicle_model_service(uow: IUnitOfWork = Depends(UnitOfWork)) -> VehicleModelService:
+async def get_vehicle_model_service(uow: IUnitOfWork = Depends(get_uow)) -> VehicleModelService:
     return VehicleModelService(uow)
 
 
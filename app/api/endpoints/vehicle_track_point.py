@@ -1,24 +1,39 @@
 from typing import Annotated
 
-from fastapi import APIRouter, Body, Depends, HTTPException, status
+from fastapi import APIRouter, Body, Depends, Header, HTTPException, Path, Query, Request, Response, status
 from fastapi.exceptions import ValidationException
+from pydantic import TypeAdapter
+from pydantic import ValidationError as PydanticValidationError
 from sqlalchemy.exc import NoResultFound
 
 from app.api.endpoints.user import get_current_active_user
 from app.api.schemas.user import UserExtended
 from app.api.schemas.vehicle_track_point import (
+    SpatialParams,
     VehicleCreateTrackPoint,
+    VehicleInPolygon,
+    VehiclesInPolygonQuery,
     VehicleTrackPoint,
+    VehicleTrackPointBulkResult,
     VehicleTrackPointGeoFromDB,
     VehicleTrackPointGeoJSON,
+    to_geojson_feature,
 )
+from app.core.config import settings
 from app.services.vehicle_service import VehicleTrackPointService
-from app.utils.unitofwork import IUnitOfWork, UnitOfWork
+from app.utils.ndjson import NDJSON_MEDIA_TYPE, parse_ndjson
+from app.utils.pagination import CursorParams
+from app.utils.streaming import StreamFormat, streaming_response
+from app.utils.unitofwork import IUnitOfWork, get_uow
 
 vehicle_track_point_router = APIRouter(prefix="/vehicle_track_point", tags=["VehicleTrackPoint"])
 
+track_points_list_adapter = TypeAdapter(list[VehicleCreateTrackPoint])
+track_point_schema_ref = {"$ref": "#/components/schemas/VehicleCreateTrackPoint"}
+MVT_MEDIA_TYPE = "application/vnd.mapbox-vector-tile"
 
-async def get_track_point_service(uow: IUnitOfWork = Depends(UnitOfWork)) -> VehicleTrackPointService:
+
+async def get_track_point_service(uow: IUnitOfWork = Depends(get_uow)) -> VehicleTrackPointService:
     return VehicleTrackPointService(uow)
 
 
@@ -30,12 +45,91 @@ async def get_vehicle_track_points(
     vehicle_id: int = None,
     from_date: str = None,
     till_date: str = None,
+    output_format: Annotated[StreamFormat, Query(alias="format")] = "json",
+    cursor_params: CursorParams = Depends(),
+    spatial_params: SpatialParams = Depends(),
 ):
+    """
+    `format=ndjson` or `format=geojson` (FeatureCollection) stream the points instead of building a list.
+    Points are ordered by (date_time, id), `size` limits a page, the next one starts after the last point.
+    `bbox` or `long`, `lat` and `radius` (metres) select points of an area.
+    """
     if current_user.role is None:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="You should have a role in a compmany.")
-    return await vehicle_track_point_service.get_vehicle_track_points(
-        current_user, geojson, vehicle_id, from_date, till_date
+    try:
+        spatial_filter_set = spatial_params.to_filter_set()
+    except ValidationException as exc:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=exc.errors())
+    if output_format == "json":
+        return await vehicle_track_point_service.get_vehicle_track_points(
+            current_user, geojson, vehicle_id, from_date, till_date, cursor_params, spatial_filter_set
+        )
+    track_points = await vehicle_track_point_service.stream_vehicle_track_points(
+        current_user,
+        geojson or output_format == "geojson",
+        vehicle_id,
+        from_date,
+        till_date,
+        cursor_params,
+        spatial_filter_set,
     )
+    return streaming_response(track_points, output_format, to_geojson_feature)
+
+
+@vehicle_track_point_router.post("/vehicles_in_polygon/", response_model=list[VehicleInPolygon])
+async def find_vehicles_in_polygon(
+    query: Annotated[VehiclesInPolygonQuery, Body()],
+    vehicle_track_point_service: VehicleTrackPointService = Depends(get_track_point_service),
+    current_user: UserExtended = Depends(get_current_active_user),
+):
+    """
+    Vehicles which were inside of the polygon between `from_date` and `till_date`, with their first and last
+    points there.
+    """
+    if current_user.role is None:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="You should have a role in a compmany.")
+    try:
+        return await vehicle_track_point_service.find_vehicles_in_polygon(current_user, query)
+    except ValidationException as exc:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=exc.errors())
+
+
+@vehicle_track_point_router.get(
+    "/tiles/{z}/{x}/{y}.mvt",
+    response_class=Response,
+    responses={200: {"content": {MVT_MEDIA_TYPE: {}}}, 304: {"description": "The tile of the ETag is not changed"}},
+)
+async def get_track_tile(
+    z: Annotated[int, Path(ge=0, le=settings.TILE_MAX_ZOOM)],
+    x: Annotated[int, Path(ge=0)],
+    y: Annotated[int, Path(ge=0)],
+    vehicle_track_point_service: VehicleTrackPointService = Depends(get_track_point_service),
+    current_user: UserExtended = Depends(get_current_active_user),
+    enterprise_id: int = None,
+    vehicle_id: int = None,
+    from_date: str = None,
+    till_date: str = None,
+    if_none_match: Annotated[str | None, Header()] = None,
+):
+    """
+    Mapbox vector tile of the tracks, layer `tracks` has lines with `vehicle_id`, `start` and `finish` (epoch
+    seconds) properties. Tiles carry an ETag, a request with a current `If-None-Match` is answered with 304.
+    """
+    if current_user.role is None:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="You should have a role in a compmany.")
+    if x >= 2**z or y >= 2**z:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Tile {z}/{x}/{y} does not exist.")
+    try:
+        etag, tile = await vehicle_track_point_service.get_track_tile(
+            current_user, z, x, y, enterprise_id, vehicle_id, from_date, till_date, if_none_match
+        )
+    except ValidationException as exc:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=exc.errors())
+    # clients keep tiles, but revalidate them, new points may arrive any time
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if tile is None:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(tile, media_type=MVT_MEDIA_TYPE, headers=headers)
 
 
 @vehicle_track_point_router.get("/tracks/{track_id}", response_model=VehicleTrackPoint | VehicleTrackPointGeoJSON)
@@ -70,3 +164,50 @@ async def create_vehicle_track_point(
         return res
     except ValidationException as exc:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=exc.errors())
+
+
+@vehicle_track_point_router.post(
+    "/tracks/bulk/",
+    response_model=VehicleTrackPointBulkResult,
+    status_code=status.HTTP_201_CREATED,
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "application/json": {"schema": {"type": "array", "items": track_point_schema_ref}},
+                NDJSON_MEDIA_TYPE: {"schema": track_point_schema_ref},
+            },
+        }
+    },
+)
+async def create_vehicle_track_points_bulk(
+    request: Request,
+    vehicle_track_point_service: VehicleTrackPointService = Depends(get_track_point_service),
+    current_user: UserExtended = Depends(get_current_active_user),
+):
+    """
+    Accepts a JSON array or newline delimited JSON of track points of any number of vehicles, at most
+    TRACK_POINTS_BULK_MAX_POINTS of them.
+    """
+    if current_user.role is None:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="You should have a role in a compmany.")
+    body = await request.body()
+    try:
+        if request.headers.get("content-type", "").startswith(NDJSON_MEDIA_TYPE):
+            vehicle_track_points_data = parse_ndjson(body, VehicleCreateTrackPoint)
+        else:
+            vehicle_track_points_data = track_points_list_adapter.validate_json(body)
+    except PydanticValidationError as exc:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=exc.errors(include_url=False, include_context=False),
+        )
+    if len(vehicle_track_points_data) > settings.TRACK_POINTS_BULK_MAX_POINTS:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"At most {settings.TRACK_POINTS_BULK_MAX_POINTS} track points are accepted per request.",
+        )
+    try:
+        return await vehicle_track_point_service.add_vehicle_track_points(vehicle_track_points_data, current_user)
+    except ValidationException as exc:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=exc.errors())
@@ -1,10 +1,10 @@
-from datetime import date
+from datetime import date, datetime
 
-from pydantic import BaseModel, ConfigDict
+from pydantic import BaseModel, ConfigDict, model_validator
 
 
 class ReportCreateRequest(BaseModel):
-    vehicle_id: int
+    vehicle_id: int | None = None
     title: str | None = None
     period: str
     from_date: date
@@ -12,6 +12,15 @@ class ReportCreateRequest(BaseModel):
     type: str
     enterprise_id: int | None = None
 
+    @model_validator(mode="after")
+    def check_report_subject(self):
+        # "enterprisemileagereport" covers all vehicles of the enterprise, other types are built for one vehicle
+        if self.type == "enterprisemileagereport" and self.enterprise_id is None:
+            raise ValueError("enterprise_id is required for enterprise report")
+        if self.type != "enterprisemileagereport" and self.vehicle_id is None:
+            raise ValueError("vehicle_id is required for vehicle report")
+        return self
+
 
 class ReportCreate(BaseModel):
     title: str | None = None
@@ -28,5 +37,30 @@ class ReportCreate(BaseModel):
 
 class ReportFromDB(ReportCreate):
     id: int
+    computed_at: datetime | None = None
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class ReportJobCreate(BaseModel):
+    title: str | None = None
+    period: str
+    from_date: date
+    to_date: date
+    type: str
+    vehicle_id: int | None = None
+    enterprise_id: int | None = None
+
+
+class ReportJobFromDB(ReportJobCreate):
+    # None for a done job made up for a cached report, it has nothing to poll
+    id: int | None = None
+    status: str
+    attempts: int
+    error: str | None = None
+    created_at: datetime
+    started_at: datetime | None = None
+    finished_at: datetime | None = None
+    report_id: int | None = None
 
     model_config = ConfigDict(from_attributes=True)
@@ -5,18 +5,19 @@ from pytz import timezone
 
 class SchemaMixin:
     @staticmethod
-    def set_user_timezone_to_datetime_fields(obj, tz="UTC"):
+    def to_user_timezone(value: datetime, tz="UTC") -> datetime:
         from main import SERVER_TIME_ZONE
 
+        if value.tzinfo is None:
+            return value.replace(tzinfo=timezone(SERVER_TIME_ZONE))
+        return value.astimezone(tz=timezone(tz))
+
+    @classmethod
+    def set_user_timezone_to_datetime_fields(cls, obj, tz="UTC"):
         for field, value in obj.__dict__.items():
-            match value:
-                case datetime(tzinfo=tzinfo) if tzinfo is None:
-                    new_value = value.replace(tzinfo=timezone(SERVER_TIME_ZONE))
-                case datetime(tzinfo=tzinfo) if tzinfo is not None:
-                    new_value = value.astimezone(tz=timezone(tz))
-                case _:
-                    continue
-            setattr(obj, field, new_value)
+            if not isinstance(value, datetime):
+                continue
+            setattr(obj, field, cls.to_user_timezone(value, tz))
         return obj
 
     def model_dump_with_tz_align(self, tz="UTC", **kwargs):
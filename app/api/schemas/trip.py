@@ -1,6 +1,5 @@
 from datetime import datetime
 
-from geopy.geocoders import Nominatim
 from pydantic import BaseModel, ConfigDict
 
 
@@ -29,14 +28,14 @@ class TripFromDBWithExtraData(BaseModel):
     finish_date_time: datetime
     start_point_geo: tuple[float, float]
     finish_point_geo: tuple[float, float]
-    start_address: str
-    finish_address: str
+    start_address: str | None = None
+    finish_address: str | None = None
+    points_count: int | None = None
+    distance_km: float | None = None
+    duration_seconds: float | None = None
+    max_speed_kmh: float | None = None
+    avg_speed_kmh: float | None = None
+    bbox: tuple[float, float, float, float] | None = None  # min lat, min long, max lat, max long
 
     class Config:
         from_attributes = True
-
-
-def get_address_by_point(point_coords: tuple):
-    geolocator = Nominatim(user_agent="FAPI_HPS")
-    location = geolocator.reverse(f"{point_coords[0]}, {point_coords[1]}")
-    return location.address
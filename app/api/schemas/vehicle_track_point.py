@@ -1,9 +1,10 @@
 from datetime import datetime
 from typing import Any
 
+from fastapi import Query
 from fastapi.exceptions import ValidationException
 from geoalchemy2 import Geometry, elements
-from pydantic import BaseModel, GetCoreSchemaHandler, GetJsonSchemaHandler
+from pydantic import BaseModel, Field, GetCoreSchemaHandler, GetJsonSchemaHandler, field_validator
 from pydantic.json_schema import JsonSchemaValue
 from pydantic_core import core_schema
 from typing_extensions import Annotated
@@ -146,6 +147,11 @@ class VehicleCreateTrackPoint(BaseModel):
         from_attributes = True
 
 
+class VehicleTrackPointBulkResult(BaseModel):
+    inserted: int
+    vehicle_ids: list[int]
+
+
 class VehicleTrackPoint(VehicleCreateTrackPoint):
     id: int
 
@@ -163,6 +169,75 @@ class VehicleTrackPointGeoJSON(BaseModel):
         from_attributes = False
 
 
+class SpatialParams(BaseModel):
+    """
+    Request query params of spatial filters of track points: bbox is "min_long,min_lat,max_long,max_lat",
+    long, lat and radius (metres) select points around a place.
+    """
+
+    bbox: str | None = Query(default=None, pattern=r"^-?\d+(\.\d+)?(,-?\d+(\.\d+)?){3}$")
+    long: float | None = Query(ge=-180, le=180, default=None)
+    lat: float | None = Query(ge=-90, le=90, default=None)
+    radius: float | None = Query(gt=0, le=1000000, default=None)
+
+    def to_filter_set(self) -> dict:
+        """Repository filters, ValidationException for inconsistent params."""
+        filter_set = {}
+        if self.bbox is not None:
+            min_long, min_lat, max_long, max_lat = map(float, self.bbox.split(","))
+            if min_long > max_long or min_lat > max_lat:
+                raise ValidationException({"bbox": "Minimums should not be greater than maximums"})
+            filter_set["bbox"] = (min_long, min_lat, max_long, max_lat)
+        place = (self.long, self.lat, self.radius)
+        if any(value is not None for value in place):
+            if any(value is None for value in place):
+                raise ValidationException({"radius": "long, lat and radius should be passed together"})
+            filter_set["within_radius"] = place
+        return filter_set
+
+
+class VehiclesInPolygonQuery(BaseModel):
+    """polygon is a ring of [long, lat] pairs, dates are local to the enterprises as in track point listings."""
+
+    polygon: list[tuple[float, float]] = Field(min_length=3)
+    from_date: str | None = None
+    till_date: str | None = None
+    enterprise_id: int | None = None
+
+    @field_validator("polygon")
+    @classmethod
+    def close_ring(cls, value: list[tuple[float, float]]) -> list[tuple[float, float]]:
+        for long, lat in value:
+            if not (-180 <= long <= 180 and -90 <= lat <= 90):
+                raise ValueError("Coordinates should be [long, lat] in degrees")
+        if value[0] != value[-1]:
+            value = [*value, value[0]]
+        if len(set(value)) < 3:
+            raise ValueError("Polygon should have at least 3 distinct points")
+        return value
+
+    @field_validator("from_date", "till_date")
+    @classmethod
+    def check_date_format(cls, value: str | None) -> str | None:
+        if value is not None:
+            try:
+                datetime.strptime(value, "%Y-%m-%d %H:%M:%S")
+            except ValueError:
+                raise ValueError("Dates should be in the format YYYY-MM-DD HH:MM:SS")
+        return value
+
+    @property
+    def polygon_wkt(self) -> str:
+        return "POLYGON(({}))".format(", ".join(f"{long} {lat}" for long, lat in self.polygon))
+
+
+class VehicleInPolygon(BaseModel):
+    vehicle_id: int
+    first_date_time: datetime
+    last_date_time: datetime
+    points_count: int
+
+
 class VehicleTrackPointGeoFromDB(BaseModel, SchemaMixin):
     id: int
     date_time: datetime
@@ -179,36 +254,38 @@ class VehicleTrackPointGeoFromDB(BaseModel, SchemaMixin):
         return cls.model_validate(obj)
 
 
+def _get_coordinates(track_point) -> tuple[float, float]:
+    if track_point.long is None or track_point.lat is None:
+        raise ValidationException({"geom": "Wrong data of POINT type"})
+    return track_point.long, track_point.lat
+
+
 def from_geo_point_to_lat_long(track_point, *, tz="UTC"):
-    tp_json = VehicleTrackPointGeoFromDB.model_validate_datetime_with_tz(track_point, tz).model_dump()
-    match tp_json["geotag"].replace("(", "").replace(")", "").split():
-        case ["POINT", long, lat] if long is not None and lat is not None:
-            pass
-        case _:
-            raise ValidationException({"geom": "Wrong data of POINT type"})
-    tp = VehicleTrackPoint(
-        id=tp_json["id"],
-        date_time=tp_json["date_time"],
+    long, lat = _get_coordinates(track_point)
+    # values come typed from the database, validation would only repeat the work
+    return VehicleTrackPoint.model_construct(
+        id=track_point.id,
+        date_time=SchemaMixin.to_user_timezone(track_point.date_time, tz),
         long=long,
         lat=lat,
-        vehicle_id=tp_json["vehicle_id"],
+        vehicle_id=track_point.vehicle_id,
     )
-    return tp
 
 
 def from_geo_point_to_geojson(track_point, *, tz="UTC"):
-    from geojson import Point
-
-    tp_json = VehicleTrackPointGeoFromDB.model_validate_datetime_with_tz(track_point, tz).model_dump()
-    match tp_json["geotag"].replace("(", "").replace(")", "").split():
-        case ["POINT", long, lat] if long is not None and lat is not None:
-            point = Point((float(long), float(lat)))
-        case _:
-            raise ValidationException({"geom": "Wrong data of POINT type"})
-    tp = VehicleTrackPointGeoJSON(
-        id=tp_json["id"],
-        date_time=tp_json["date_time"],
-        geometry=point,
-        vehicle_id=tp_json["vehicle_id"],
+    long, lat = _get_coordinates(track_point)
+    return VehicleTrackPointGeoJSON.model_construct(
+        id=track_point.id,
+        date_time=SchemaMixin.to_user_timezone(track_point.date_time, tz),
+        geometry={"type": "Point", "coordinates": [long, lat]},
+        vehicle_id=track_point.vehicle_id,
     )
-    return tp
+
+
+def to_geojson_feature(track_point: VehicleTrackPointGeoJSON) -> dict:
+    return {
+        "type": "Feature",
+        "id": track_point.id,
+        "geometry": track_point.geometry,
+        "properties": {"date_time": track_point.date_time.isoformat(), "vehicle_id": track_point.vehicle_id},
+    }
@@ -8,6 +8,87 @@ class Settings(BaseSettings):
     POSTGRES_PASSWORD: str
     POSTGRES_NAME: str
 
+    # connection pool of the API engine, per worker process
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30.0
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_PRE_PING: bool = True
+    DB_PREPARED_STATEMENT_CACHE_SIZE: int = 100
+    # set when connecting through pgbouncer in transaction mode, disables asyncpg prepared statement caches
+    DB_PGBOUNCER: bool = False
+    # postgresql+asyncpg:// URLs of streaming replicas, picked round-robin by read only units of work;
+    # a replica lagging more than DB_REPLICA_MAX_LAG seconds or unreachable is skipped for the primary
+    DB_REPLICA_URLS: list[str] = []
+    DB_REPLICA_MAX_LAG: float = 5.0
+    DB_REPLICA_CHECK_INTERVAL: float = 5.0
+    DB_REPLICA_CHECK_TIMEOUT: float = 1.0
+    # one session per HTTP request shared by all its dependencies instead of one per service call
+    DB_REQUEST_SCOPED_SESSION: bool = False
+
+    # track points accepted by one request of /tracks/bulk/, larger payloads are rejected with 413
+    TRACK_POINTS_BULK_MAX_POINTS: int = 10000
+
+    # reverse geocoding of trip start/finish points: "nominatim" or offline "gazetteer"
+    GEOCODER_PROVIDER: str = "nominatim"
+    GEOCODER_USER_AGENT: str = "FAPI_HPS"
+    GEOCODER_CELL_PRECISION: int = 4  # decimal places of lat/long, ~11 m
+    GEOCODER_LRU_SIZE: int = 10000
+
+    # mileage reports: "python" sums segments with NumPy, "postgis" aggregates them in the database
+    REPORT_MILEAGE_ENGINE: str = "python"
+    # closed days are summed from vehicle_daily_mileage, only the current day is read from track points
+    REPORT_USE_DAILY_ROLLUP: bool = True
+    # points the python mileage engine reads and sums at once
+    REPORT_POINTS_CHUNK_SIZE: int = 100000
+    # report jobs: idle poll interval of a worker, seconds after which a running job is taken over, retries
+    REPORT_JOB_POLL_INTERVAL: float = 1.0
+    REPORT_JOB_STALE_AFTER: int = 600
+    REPORT_JOB_MAX_ATTEMPTS: int = 3
+
+    # trip detection from track points: a trip starts with a segment faster than MIN_SPEED, ends after STOP_DWELL
+    # seconds slower than it or a GAP without points; shorter trips are dropped; seconds, km/h and km
+    TRIP_DETECTION_MIN_SPEED_KMH: float = 5.0
+    TRIP_DETECTION_STOP_DWELL: float = 300.0
+    TRIP_DETECTION_MAX_GAP: float = 900.0
+    TRIP_DETECTION_MIN_DURATION: float = 120.0
+    TRIP_DETECTION_MIN_DISTANCE_KM: float = 0.5
+    TRIP_DETECTION_BATCH_SIZE: int = 5000
+    TRIP_DETECTION_POLL_INTERVAL: float = 1.0
+    # ids are taken from a sequence before commit, so this many ids before the cursor are read again to catch
+    # points committed late; points already seen by the vehicle state are skipped
+    TRIP_DETECTION_ID_OVERLAP: int = 1000
+
+    # rendered trip maps, files of least recently viewed maps are removed above MAP_CACHE_MAX_BYTES
+    MAP_CACHE_DIR: str = "map_cache"
+    MAP_CACHE_MAX_BYTES: int = 200 * 1024 * 1024
+    MAP_RENDER_WORKERS: int = 2
+    # metres, points closer to the simplified track of a rendered map are dropped, 0 renders all points
+    MAP_SIMPLIFY_TOLERANCE: float = 2.0
+
+    # vector tiles of tracks, EXTENT and BUFFER are in tile units, lines are broken at gaps longer than
+    # TILE_TRACK_MAX_GAP seconds; files of least recently requested tiles are removed above TILE_CACHE_MAX_BYTES
+    TILE_EXTENT: int = 4096
+    TILE_BUFFER: int = 64
+    TILE_MAX_ZOOM: int = 22
+    TILE_TRACK_MAX_GAP: float = 300.0
+    TILE_CACHE_DIR: str = "tile_cache"
+    TILE_CACHE_MAX_BYTES: int = 200 * 1024 * 1024
+    # seconds the data version of tiles is reused, new points show up on the map after it at the latest
+    TILE_VERSION_CACHE_TTL: float = 5.0
+
+    # authenticated principals are cached per token subject for this many seconds, per worker
+    AUTH_PRINCIPAL_CACHE_TTL: float = 30.0
+    AUTH_PRINCIPAL_CACHE_SIZE: int = 10000
+
+    # listing counts are cached for this many seconds, an unfiltered count of a table bigger than
+    # PAGINATION_ESTIMATE_COUNT_FROM rows is taken from the planner statistics
+    PAGINATION_COUNT_CACHE_TTL: float = 10.0
+    PAGINATION_ESTIMATE_COUNT_FROM: int = 100000
+
+    # adds X-Query-Count header to responses, used by `manage.py check-query-budget`
+    QUERY_COUNT_HEADER: bool = False
+
     @property
     def ASYNC_DATABASE_URL(self):
         return f"postgresql+asyncpg://{self.POSTGRES_USER}:{self.POSTGRES_PASSWORD}@{self.POSTGRES_HOST}:{self.POSTGRES_PORT}/{self.POSTGRES_NAME}"  # noqa E501
@@ -1,10 +1,41 @@
-from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from uuid import uuid4
+
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import DeclarativeBase
 
 from app.core.config import settings
 
-engine = create_async_engine(settings.ASYNC_DATABASE_URL, echo=False)  # создали движок БД
+
+def _connect_args() -> dict:
+    if not settings.DB_PGBOUNCER:
+        return {"prepared_statement_cache_size": settings.DB_PREPARED_STATEMENT_CACHE_SIZE}
+    # pgbouncer in transaction mode hands the next transaction to any server connection, so statements can not
+    # be cached on a connection and their names must be unique across clients
+    return {
+        "statement_cache_size": 0,
+        "prepared_statement_cache_size": 0,
+        "prepared_statement_name_func": lambda: f"__asyncpg_{uuid4()}__",
+    }
+
+
+def _create_engine(url: str) -> AsyncEngine:
+    return create_async_engine(
+        url,
+        echo=False,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+        pool_pre_ping=settings.DB_POOL_PRE_PING,
+        pool_use_lifo=True,  # idle connections above the load are left to be recycled
+        connect_args=_connect_args(),
+    )
+
+
+engine = _create_engine(settings.ASYNC_DATABASE_URL)  # создали движок БД
 async_session_maker = async_sessionmaker(engine, class_=AsyncSession)  # передали наш движок в создатель сессий
+# streaming replicas of the database, used by read only units of work
+replica_engines = [_create_engine(url) for url in settings.DB_REPLICA_URLS]
 
 
 class Base(DeclarativeBase):
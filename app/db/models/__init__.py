@@ -1,7 +1,15 @@
 from .associations import user_enterprise_association_table
 from .company import Enterprise
 from .driver import Driver, DriverVehicle
-from .report import Report, VehicleMileageReport
-from .trip import Trip
+from .geocoding import GazetteerPlace, GeocodedAddress
+from .report import EnterpriseMileageReport, Report, ReportJob, VehicleMileageReport
+from .trip import Trip, TripDetectionCursor, TripSummary, VehicleTripDetectionState
 from .user import User
-from .vehilce import Vehicle, VehicleBrand, VehicleModel, VehicleTrackPoint
+from .vehilce import (
+    Vehicle,
+    VehicleBrand,
+    VehicleDailyMileage,
+    VehicleDayWatermark,
+    VehicleModel,
+    VehicleTrackPoint,
+)
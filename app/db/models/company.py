@@ -22,18 +22,18 @@ class Enterprise(Base):
     )
 
     vehicles: Mapped[list["Vehicle"]] = relationship(  # noqa F821 # type: ignore
-        "Vehicle", back_populates="enterprise", lazy="immediate"
+        "Vehicle", back_populates="enterprise", lazy="raise_on_sql"
     )
     drivers: Mapped[list["Driver"]] = relationship(  # noqa F821 # type: ignore
-        "Driver", back_populates="enterprise", uselist=True, lazy="immediate"
+        "Driver", back_populates="enterprise", uselist=True, lazy="raise_on_sql"
     )
 
     users: Mapped[list["User"]] = relationship(  # noqa F821 # type: ignore
-        "User", secondary=user_enterprise_association_table, back_populates="enterprises", lazy="immediate"
+        "User", secondary=user_enterprise_association_table, back_populates="enterprises", lazy="raise_on_sql"
     )
 
     reports: Mapped[list["Report"]] = relationship(  # noqa F821 # type: ignore
-        "Report", back_populates="enterprise", lazy="immediate"
+        "Report", back_populates="enterprise", lazy="raise_on_sql"
     )
 
     def __str__(self):
@@ -16,9 +16,13 @@ class Driver(Base):
     salary: Mapped[int] = mapped_column(BigInteger, nullable=True)
 
     enterprise_id: Mapped[int] = mapped_column(ForeignKey("enterprise.id", ondelete="SET NULL"), nullable=True)
-    enterprise: Mapped["Enterprise"] = relationship("Enterprise", back_populates="drivers")  # noqa F821 # type: ignore
+    enterprise: Mapped["Enterprise"] = relationship(  # noqa F821 # type: ignore
+        "Enterprise", back_populates="drivers", lazy="raise_on_sql"
+    )
 
-    vehicles: Mapped[list["DriverVehicle"]] = relationship("DriverVehicle", back_populates="driver", lazy="immediate")
+    vehicles: Mapped[list["DriverVehicle"]] = relationship(
+        "DriverVehicle", back_populates="driver", lazy="raise_on_sql"
+    )
 
     def __str__(self):
         return self.get_full_name
@@ -34,11 +38,11 @@ class DriverVehicle(Base):
     is_active_driver: Mapped[bool] = mapped_column(default=False)
 
     driver_id: Mapped[int] = mapped_column(ForeignKey("driver.id", ondelete="CASCADE"), primary_key=True)
-    driver: Mapped["Driver"] = relationship("Driver", back_populates="vehicles", lazy="immediate")
+    driver: Mapped["Driver"] = relationship("Driver", back_populates="vehicles", lazy="raise_on_sql")
 
     vehicle_id: Mapped[int] = mapped_column(ForeignKey("vehicle.id", ondelete="CASCADE"), primary_key=True)
     vehicle: Mapped["Vehicle"] = relationship(  # noqa F821 # type: ignore
-        "Vehicle", back_populates="drivers", lazy="immediate"
+        "Vehicle", back_populates="drivers", lazy="raise_on_sql"
     )
 
     def __str__(self) -> str:
@@ -0,0 +1,30 @@
+from datetime import datetime
+
+from geoalchemy2 import Geometry
+from sqlalchemy import BigInteger, DateTime, func
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.db.database import Base
+
+
+class GeocodedAddress(Base):
+    """Reverse geocoding result stored per rounded coordinate cell."""
+
+    __tablename__ = "geocodedaddress"
+
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    cell: Mapped[str] = mapped_column(nullable=False, unique=True, index=True)
+    address: Mapped[str] = mapped_column(nullable=False)
+    provider: Mapped[str] = mapped_column(nullable=False)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False, server_default=func.now())
+
+
+class GazetteerPlace(Base):
+    """Place imported from a gazetteer file, used by the offline geocoder."""
+
+    __tablename__ = "gazetteerplace"
+
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    name: Mapped[str] = mapped_column(nullable=False)
+    address: Mapped[str] = mapped_column(nullable=False)
+    geotag: Mapped[list[float]] = mapped_column(Geometry("POINT"))
@@ -1,7 +1,7 @@
-from datetime import date
+from datetime import date, datetime
 from enum import Enum
 
-from sqlalchemy import BigInteger, Date, ForeignKey
+from sqlalchemy import BigInteger, Date, DateTime, ForeignKey, Index, Text, func
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from sqlalchemy.types import JSON
 
@@ -18,6 +18,16 @@ ReportPeriodChoices = Enum(
     },
 )
 
+ReportJobStatusChoices = Enum(
+    "ReportJobStatusChoices",
+    {
+        "PENDING": "pending",
+        "RUNNING": "running",
+        "DONE": "done",
+        "FAILED": "failed",
+    },
+)
+
 
 class Report(Base):
     __tablename__ = "report"
@@ -28,17 +38,23 @@ class Report(Base):
     from_date: Mapped[date] = mapped_column(Date())
     to_date: Mapped[date] = mapped_column(Date())
     report_result: Mapped[dict] = mapped_column(type_=JSON)
+    # transaction start of the computation
+    computed_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    # pg_current_snapshot() taken before points were read, cached reports are valid while every transaction that
+    # added points to the range (day watermarks) is visible in it
+    computed_snapshot: Mapped[str | None] = mapped_column(nullable=True)
 
     type: Mapped[str]
 
     enterprise_id: Mapped[int] = mapped_column(ForeignKey("enterprise.id", ondelete="CASCADE"), nullable=True)
     enterprise: Mapped["Enterprise"] = relationship(  # noqa F821 # type: ignore
-        "Enterprise", back_populates="reports", lazy="joined"
+        "Enterprise", back_populates="reports", lazy="raise_on_sql"
     )
 
     __mapper_args__ = {
         "polymorphic_identity": "report",
         "polymorphic_on": "type",
+        "eager_defaults": True,
     }
 
     def __repr__(self):
@@ -49,7 +65,45 @@ class VehicleMileageReport(Report):
     __tablename__ = "vehiclemileagereport"
 
     id: Mapped[int] = mapped_column(ForeignKey("report.id"), primary_key=True)
+    vehicle_id: Mapped[int] = mapped_column(ForeignKey("vehicle.id", ondelete="CASCADE"), nullable=True, index=True)
 
     __mapper_args__ = {
         "polymorphic_identity": "vehiclemileagereport",
     }
+
+
+class EnterpriseMileageReport(Report):
+    """Mileage of every vehicle of the enterprise, report_result is {"total": {...}, "vehicles": {id: {...}}}."""
+
+    __tablename__ = "enterprisemileagereport"
+
+    id: Mapped[int] = mapped_column(ForeignKey("report.id"), primary_key=True)
+
+    __mapper_args__ = {
+        "polymorphic_identity": "enterprisemileagereport",
+    }
+
+
+class ReportJob(Base):
+    """Queued report request, picked by `manage.py report-worker` processes."""
+
+    __tablename__ = "reportjob"
+    __table_args__ = (Index("ix_reportjob_status_id", "status", "id"),)
+
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    status: Mapped[str] = mapped_column(nullable=False, default=ReportJobStatusChoices.PENDING.value)
+    title: Mapped[str] = mapped_column(nullable=True)
+    period: Mapped[str] = mapped_column(nullable=False)
+    from_date: Mapped[date] = mapped_column(Date())
+    to_date: Mapped[date] = mapped_column(Date())
+    type: Mapped[str] = mapped_column(nullable=False)
+    attempts: Mapped[int] = mapped_column(nullable=False, default=0)
+    error: Mapped[str] = mapped_column(Text, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    started_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=True)
+    finished_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=True)
+
+    # enterprise reports have no vehicle
+    vehicle_id: Mapped[int] = mapped_column(ForeignKey("vehicle.id", ondelete="CASCADE"), nullable=True)
+    enterprise_id: Mapped[int] = mapped_column(ForeignKey("enterprise.id", ondelete="CASCADE"), nullable=True)
+    report_id: Mapped[int] = mapped_column(ForeignKey("report.id", ondelete="SET NULL"), nullable=True)
@@ -1,17 +1,78 @@
 from datetime import datetime
+from typing import Optional
 
-from sqlalchemy import BigInteger, DateTime, ForeignKey
-from sqlalchemy.orm import Mapped, mapped_column, relationship
+from geoalchemy2 import Geometry
+from sqlalchemy import BigInteger, DateTime, ForeignKey, Index, func
+from sqlalchemy.orm import Mapped, column_property, mapped_column, relationship
 
 from app.db.database import Base
 
 
 class Trip(Base):
     __tablename__ = "trip"
+    # trips of a vehicle are listed by (start_date_time, id) cursor
+    __table_args__ = (Index("ix_trip_vehicle_id_start_date_time", "vehicle_id", "start_date_time"),)
 
     id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
     start_date_time: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
     finish_date_time: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
 
     vehicle_id: Mapped[int] = mapped_column(ForeignKey("vehicle.id", ondelete="SET NULL"))
-    vehicle: Mapped["Vehicle"] = relationship(back_populates="trips")  # noqa F821 # type: ignore
+    vehicle: Mapped["Vehicle"] = relationship(back_populates="trips", lazy="raise_on_sql")  # noqa F821 # type: ignore
+    summary: Mapped[Optional["TripSummary"]] = relationship(back_populates="trip", lazy="raise_on_sql")
+
+
+class TripSummary(Base):
+    """
+    Statistics of a trip computed from its track points by TRIP_SUMMARY_UPSERT_SQL, a missing row means the trip
+    was not summarized yet or got new points. Trips without points have points_count 0 and no geometries.
+    """
+
+    __tablename__ = "trip_summary"
+
+    trip_id: Mapped[int] = mapped_column(ForeignKey("trip.id", ondelete="CASCADE"), primary_key=True)
+    points_count: Mapped[int] = mapped_column(nullable=False)
+    distance_km: Mapped[float] = mapped_column(nullable=False)
+    duration_seconds: Mapped[float] = mapped_column(nullable=False)
+    max_speed_kmh: Mapped[float] = mapped_column(nullable=False)
+    avg_speed_kmh: Mapped[float] = mapped_column(nullable=False)
+    bbox: Mapped[list[float]] = mapped_column(Geometry("POLYGON"), nullable=True)
+    start_point: Mapped[list[float]] = mapped_column(Geometry("POINT", spatial_index=False), nullable=True)
+    finish_point: Mapped[list[float]] = mapped_column(Geometry("POINT", spatial_index=False), nullable=True)
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    # coordinates are extracted by the database like VehicleTrackPoint.long and lat
+    start_long: Mapped[float] = column_property(func.ST_X(start_point))
+    start_lat: Mapped[float] = column_property(func.ST_Y(start_point))
+    finish_long: Mapped[float] = column_property(func.ST_X(finish_point))
+    finish_lat: Mapped[float] = column_property(func.ST_Y(finish_point))
+    bbox_min_long: Mapped[float] = column_property(func.ST_XMin(bbox))
+    bbox_min_lat: Mapped[float] = column_property(func.ST_YMin(bbox))
+    bbox_max_long: Mapped[float] = column_property(func.ST_XMax(bbox))
+    bbox_max_lat: Mapped[float] = column_property(func.ST_YMax(bbox))
+
+    trip: Mapped["Trip"] = relationship(back_populates="summary", lazy="raise_on_sql")
+
+
+class VehicleTripDetectionState(Base):
+    """State of TripSegmenter for a vehicle, saved by `manage.py trip-detector` after every batch of points."""
+
+    __tablename__ = "vehicle_trip_detection_state"
+
+    vehicle_id: Mapped[int] = mapped_column(ForeignKey("vehicle.id", ondelete="CASCADE"), primary_key=True)
+    last_date_time: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+    last_long: Mapped[float] = mapped_column(nullable=False)
+    last_lat: Mapped[float] = mapped_column(nullable=False)
+    trip_id: Mapped[int] = mapped_column(ForeignKey("trip.id", ondelete="SET NULL"), nullable=True)
+    trip_start_date_time: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=True)
+    trip_last_moving_date_time: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=True)
+    trip_distance_km: Mapped[float] = mapped_column(nullable=False)
+
+
+class TripDetectionCursor(Base):
+    """Last track point id read by a trip detector shard (vehicles with vehicle_id % shards == shard)."""
+
+    __tablename__ = "trip_detection_cursor"
+
+    shard: Mapped[int] = mapped_column(primary_key=True, autoincrement=False)
+    shards: Mapped[int] = mapped_column(primary_key=True, autoincrement=False)
+    last_point_id: Mapped[int] = mapped_column(BigInteger, nullable=False)
@@ -32,7 +32,7 @@ class User(Base):
     role: Mapped[str] = mapped_column(default="manager", nullable=True)
 
     enterprises: Mapped[list["Enterprise"]] = relationship(  # noqa F821 # type: ignore
-        "Enterprise", secondary=user_enterprise_association_table, back_populates="users", lazy="immediate"
+        "Enterprise", secondary=user_enterprise_association_table, back_populates="users", lazy="raise_on_sql"
     )
 
     def __str__(self):
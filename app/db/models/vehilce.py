@@ -1,9 +1,9 @@
-from datetime import datetime
+from datetime import date, datetime
 from typing import Optional
 
 from geoalchemy2 import Geometry
-from sqlalchemy import BigInteger, DateTime, ForeignKey, Text
-from sqlalchemy.orm import Mapped, mapped_column, relationship
+from sqlalchemy import BigInteger, Date, DateTime, ForeignKey, Index, Text, func
+from sqlalchemy.orm import Mapped, column_property, mapped_column, relationship
 
 from app.db.database import Base
 
@@ -15,7 +15,7 @@ class VehicleBrand(Base):
     brand_name: Mapped[str] = mapped_column(nullable=False)
     original_country: Mapped[str] = mapped_column(nullable=False)
 
-    models: Mapped[list["VehicleModel"]] = relationship(back_populates="brand")
+    models: Mapped[list["VehicleModel"]] = relationship(back_populates="brand", lazy="raise_on_sql")
 
     def __str__(self):
         return self.brand_name
@@ -32,9 +32,11 @@ class VehicleModel(Base):
     fuel_capacity: Mapped[int] = mapped_column(nullable=False)
 
     brand_id: Mapped[int] = mapped_column(ForeignKey("vehiclebrand.id", ondelete="CASCADE"))
+    # other relationships are lazy="raise_on_sql" and loaded by repositories, the brand is a part of every
+    # representation of a model (and of its __str__), so it is always joined
     brand: Mapped[Optional["VehicleBrand"]] = relationship(back_populates="models", lazy="joined")
 
-    vehicles: Mapped[list["Vehicle"]] = relationship(back_populates="brandmodel")
+    vehicles: Mapped[list["Vehicle"]] = relationship(back_populates="brandmodel", lazy="raise_on_sql")
 
     def __str__(self):
         return f"{self.brand.brand_name} {self.exact_model_name}"
@@ -53,20 +55,22 @@ class Vehicle(Base):
     created_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, default=datetime.now)
 
     brandmodel_id: Mapped[int] = mapped_column(ForeignKey("vehiclemodel.id", ondelete="SET NULL"), nullable=True)
-    brandmodel: Mapped[Optional["VehicleModel"]] = relationship(back_populates="vehicles", lazy="immediate")
+    brandmodel: Mapped[Optional["VehicleModel"]] = relationship(back_populates="vehicles", lazy="raise_on_sql")
 
     enterprise_id: Mapped[int] = mapped_column(ForeignKey("enterprise.id", ondelete="SET NULL"), nullable=True)
     enterprise: Mapped["Enterprise"] = relationship(  # noqa F821 # type: ignore
-        "Enterprise", back_populates="vehicles", lazy="joined"
+        "Enterprise", back_populates="vehicles", lazy="raise_on_sql"
     )
 
     drivers: Mapped[list["DriverVehicle"]] = relationship(  # noqa F821 # type: ignore
-        "DriverVehicle", back_populates="vehicle"
+        "DriverVehicle", back_populates="vehicle", lazy="raise_on_sql"
     )
 
-    trackpoints: Mapped[list["VehicleTrackPoint"]] = relationship(back_populates="vehicle")
+    trackpoints: Mapped[list["VehicleTrackPoint"]] = relationship(back_populates="vehicle", lazy="raise_on_sql")
 
-    trips: Mapped[list["Trip"]] = relationship(back_populates="vehicle")  # noqa F821 # type: ignore
+    trips: Mapped[list["Trip"]] = relationship(
+        back_populates="vehicle", lazy="raise_on_sql"
+    )  # noqa F821 # type: ignore
 
     def __str__(self) -> str:
         return f"{self.id} {'OK' if self.is_in_work else 'NOK'}"
@@ -74,14 +78,47 @@ class Vehicle(Base):
 
 class VehicleTrackPoint(Base):
     __tablename__ = "vehicletrackpoint"
+    __table_args__ = (
+        Index("ix_vehicletrackpoint_vehicle_id_date_time", "vehicle_id", "date_time"),
+        # monthly partitions are created by migration 9b2d4f6a8c10 and `manage.py create-track-point-partitions`
+        {"postgresql_partition_by": "RANGE (date_time)"},
+    )
 
+    # the table primary key is (id, date_time) as required by partitioning, id alone stays unique
     id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
     date_time: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
     geotag: Mapped[list[float]] = mapped_column(Geometry("POINT"))
+    # coordinates are extracted by the database, so serializers do not have to decode WKB
+    long: Mapped[float] = column_property(func.ST_X(geotag))
+    lat: Mapped[float] = column_property(func.ST_Y(geotag))
 
     vehicle_id: Mapped[int] = mapped_column(ForeignKey("vehicle.id", ondelete="CASCADE"), nullable=False)
-    vehicle: Mapped[Optional["Vehicle"]] = relationship(back_populates="trackpoints", lazy="immediate")
+    vehicle: Mapped[Optional["Vehicle"]] = relationship(back_populates="trackpoints", lazy="raise_on_sql")
 
     @property
     def repr_geotag(self) -> str:
-        return "To be implemented..."
+        return f"POINT({self.long} {self.lat})"
+
+
+class VehicleDailyMileage(Base):
+    """Mileage of a vehicle per closed day of its enterprise timezone, maintained by `manage.py rollup`."""
+
+    __tablename__ = "vehicle_daily_mileage"
+
+    vehicle_id: Mapped[int] = mapped_column(ForeignKey("vehicle.id", ondelete="CASCADE"), primary_key=True)
+    day: Mapped[date] = mapped_column(Date(), primary_key=True)
+    distance_km: Mapped[float] = mapped_column(nullable=False)
+    points_count: Mapped[int] = mapped_column(nullable=False)
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False, server_default=func.now())
+
+
+class VehicleDayWatermark(Base):
+    """Last time track points of a vehicle were added for a day of its enterprise timezone."""
+
+    __tablename__ = "vehicle_day_watermark"
+
+    vehicle_id: Mapped[int] = mapped_column(ForeignKey("vehicle.id", ondelete="CASCADE"), primary_key=True)
+    day: Mapped[date] = mapped_column(Date(), primary_key=True)
+    modified_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    # pg_current_xact_id() of the last transaction that added points, compared with snapshots of reports
+    modified_xid: Mapped[int | None] = mapped_column(BigInteger, nullable=True)
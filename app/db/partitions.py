@@ -0,0 +1,53 @@
+from datetime import date
+
+TRACK_POINT_TABLE = "vehicletrackpoint"
+TRACK_POINT_DEFAULT_PARTITION = f"{TRACK_POINT_TABLE}_default"
+
+
+def month_start(day: date) -> date:
+    return day.replace(day=1)
+
+
+def add_months(day: date, months: int) -> date:
+    month_index = day.month - 1 + months
+    return date(day.year + month_index // 12, month_index % 12 + 1, 1)
+
+
+def track_point_partition_name(month: date) -> str:
+    return f"{TRACK_POINT_TABLE}_y{month.year}m{month.month:02d}"
+
+
+def create_track_point_partition_sql(month: date) -> str:
+    """DDL for the monthly partition holding points with date_time in [month, next month) UTC."""
+    month = month_start(month)
+    return (
+        f"CREATE TABLE IF NOT EXISTS {track_point_partition_name(month)} PARTITION OF {TRACK_POINT_TABLE} "
+        f"FOR VALUES FROM ('{month} 00:00:00+00') TO ('{add_months(month, 1)} 00:00:00+00')"
+    )
+
+
+def track_point_partition_exists_sql(month: date) -> str:
+    return f"SELECT to_regclass('{track_point_partition_name(month_start(month))}') IS NOT NULL"
+
+
+def create_track_point_partition_statements(month: date) -> list[str]:
+    """
+    Statements creating a missing monthly partition in one transaction. A partition can not be created while the
+    default partition holds rows of its range, such rows are moved aside, the partition is created and the rows
+    are inserted again, now into it. The table is locked so that no point of the range arrives in the default
+    partition in between.
+    """
+    month = month_start(month)
+    moved_table = f"{TRACK_POINT_TABLE}_moved"
+    return [
+        f"LOCK TABLE {TRACK_POINT_TABLE} IN ACCESS EXCLUSIVE MODE",
+        f"CREATE TEMPORARY TABLE {moved_table} (LIKE {TRACK_POINT_TABLE})",
+        (
+            f"WITH moved AS (DELETE FROM {TRACK_POINT_DEFAULT_PARTITION} WHERE date_time >= '{month} 00:00:00+00' "
+            f"AND date_time < '{add_months(month, 1)} 00:00:00+00' RETURNING *) "
+            f"INSERT INTO {moved_table} SELECT * FROM moved"
+        ),
+        create_track_point_partition_sql(month),
+        f"INSERT INTO {TRACK_POINT_TABLE} SELECT * FROM {moved_table}",
+        f"DROP TABLE {moved_table}",
+    ]
@@ -0,0 +1,72 @@
+import asyncio
+import itertools
+import time
+
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker
+
+from app.core.config import settings
+from app.db.database import replica_engines
+
+# seconds the replica is behind the primary: 0 when it is not in recovery or streams from the primary and replayed
+# everything it received (an idle primary sends nothing to replay); otherwise the age of the last replayed
+# transaction, infinite before the first one, so a replica with a disconnected WAL receiver counts as lagging
+REPLICA_LAG_SQL = text(
+    "SELECT CASE "
+    "WHEN NOT pg_is_in_recovery() THEN 0 "
+    "WHEN EXISTS (SELECT 1 FROM pg_stat_wal_receiver WHERE status = 'streaming') "
+    "AND pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE COALESCE("
+    "CAST(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) AS double precision), "
+    "CAST('Infinity' AS double precision)) END"
+)
+
+
+class ReplicaRouter:
+    """
+    Round-robin choice of a replica for read only sessions. Lag of a replica is checked at most once per
+    check_interval, a replica lagging more than max_lag seconds or failing the check is skipped until the next one.
+    """
+
+    def __init__(self, engines: list[AsyncEngine], max_lag: float, check_interval: float, check_timeout: float):
+        self.engines = engines
+        self.session_makers = [async_sessionmaker(engine, class_=AsyncSession) for engine in engines]
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.check_timeout = check_timeout
+        self._order = itertools.cycle(range(len(engines)))
+        self._checks: dict[int, tuple[float, bool]] = {}  # engine index: (monotonic time of the check, usable)
+
+    async def get_session_maker(self) -> async_sessionmaker | None:
+        """Session maker of the next usable replica, None when all of them lag or are down."""
+        for _ in range(len(self.engines)):
+            index = next(self._order)
+            if await self._is_usable(index):
+                return self.session_makers[index]
+        return None
+
+    async def get_lag(self, index: int) -> float:
+        async with self.engines[index].connect() as connection:
+            return float((await connection.execute(REPLICA_LAG_SQL)).scalar_one())
+
+    async def _is_usable(self, index: int) -> bool:
+        now = time.monotonic()
+        checked_at, usable = self._checks.get(index, (None, False))
+        if checked_at is not None and now - checked_at < self.check_interval:
+            return usable
+
+        # concurrent requests use the last result while the check runs
+        self._checks[index] = (now, usable if checked_at is not None else False)
+        try:
+            lag = await asyncio.wait_for(self.get_lag(index), timeout=self.check_timeout)
+            usable = lag <= self.max_lag
+        except (OSError, asyncio.TimeoutError, SQLAlchemyError):
+            usable = False
+        self._checks[index] = (time.monotonic(), usable)
+        return usable
+
+
+replica_router = ReplicaRouter(
+    replica_engines, settings.DB_REPLICA_MAX_LAG, settings.DB_REPLICA_CHECK_INTERVAL, settings.DB_REPLICA_CHECK_TIMEOUT
+)
@@ -0,0 +1,142 @@
+from collections import defaultdict
+from datetime import date, timedelta
+
+DAILY_MILEAGE_TABLE = "vehicle_daily_mileage"
+
+# local day of a point in its enterprise timezone, vehicles without enterprise are counted in UTC
+_LOCAL_TZ = "COALESCE(CAST(enterprise.company_timezone AS text), 'UTC')"
+_VEHICLES_FILTER = "(CAST(:vehicle_ids AS bigint[]) IS NULL OR vehicle.id = ANY(CAST(:vehicle_ids AS bigint[])))"
+
+# a segment belongs to the day of its end point, points of two extra days around the range feed LAG() and
+# cover any timezone offset, only closed (before local today) days are stored
+DAILY_MILEAGE_UPSERT_SQL = f"""
+WITH segments AS (
+    SELECT
+        vehicletrackpoint.vehicle_id,
+        CAST(timezone({_LOCAL_TZ}, vehicletrackpoint.date_time) AS date) AS day,
+        CAST(timezone({_LOCAL_TZ}, now()) AS date) AS today,
+        ST_DistanceSphere(
+            vehicletrackpoint.geotag,
+            LAG(vehicletrackpoint.geotag) OVER (
+                PARTITION BY vehicletrackpoint.vehicle_id
+                ORDER BY vehicletrackpoint.date_time, vehicletrackpoint.id
+            )
+        ) AS segment_m
+    FROM vehicletrackpoint
+    JOIN vehicle ON vehicle.id = vehicletrackpoint.vehicle_id
+    LEFT JOIN enterprise ON enterprise.id = vehicle.enterprise_id
+    WHERE vehicletrackpoint.date_time >= CAST(:from_day AS date) - INTERVAL '2 days'
+        AND vehicletrackpoint.date_time < CAST(:till_day AS date) + INTERVAL '2 days'
+        AND {_VEHICLES_FILTER}
+)
+INSERT INTO {DAILY_MILEAGE_TABLE} (vehicle_id, day, distance_km, points_count, updated_at)
+SELECT vehicle_id, day, COALESCE(SUM(segment_m), 0) / 1000, COUNT(*), now()
+FROM segments
+WHERE day BETWEEN CAST(:from_day AS date) AND CAST(:till_day AS date) AND day < today
+GROUP BY vehicle_id, day
+ON CONFLICT (vehicle_id, day) DO UPDATE SET
+    distance_km = EXCLUDED.distance_km,
+    points_count = EXCLUDED.points_count,
+    updated_at = EXCLUDED.updated_at
+"""
+
+# closed days without points get empty rows, so a missing row always means "not rolled up yet"
+DAILY_MILEAGE_EMPTY_DAYS_SQL = f"""
+INSERT INTO {DAILY_MILEAGE_TABLE} (vehicle_id, day, distance_km, points_count, updated_at)
+SELECT vehicle.id, CAST(days.day AS date), 0, 0, now()
+FROM vehicle
+LEFT JOIN enterprise ON enterprise.id = vehicle.enterprise_id
+CROSS JOIN generate_series(CAST(:from_day AS date), CAST(:till_day AS date), INTERVAL '1 day') AS days (day)
+WHERE CAST(days.day AS date) < CAST(timezone({_LOCAL_TZ}, now()) AS date) AND {_VEHICLES_FILTER}
+ON CONFLICT (vehicle_id, day) DO NOTHING
+"""
+
+
+def daily_mileage_rollup_params(from_day: date, till_day: date, vehicle_ids: list = None) -> dict:
+    return {"from_day": from_day, "till_day": till_day, "vehicle_ids": vehicle_ids}
+
+
+def missing_day_spans(vehicle_ids: list, from_day: date, till_day: date, present_days: set) -> dict[tuple, list]:
+    """
+    {(span_from, span_till): vehicle_ids} of consecutive days of the range without (vehicle_id, day) in
+    present_days, vehicles missing the same span share one rollup.
+    """
+    spans = defaultdict(list)
+    for vehicle_id in vehicle_ids:
+        span_from = None
+        day = from_day
+        while day <= till_day + timedelta(days=1):
+            missing = day <= till_day and (vehicle_id, day) not in present_days
+            if missing and span_from is None:
+                span_from = day
+            elif not missing and span_from is not None:
+                spans[(span_from, day - timedelta(days=1))].append(vehicle_id)
+                span_from = None
+            day += timedelta(days=1)
+    return dict(spans)
+
+
+TRIP_SUMMARY_TABLE = "trip_summary"
+
+_TRIPS_FILTER = "(CAST(:trip_ids AS bigint[]) IS NULL OR trip.id = ANY(CAST(:trip_ids AS bigint[])))"
+_MISSING_FILTER = (
+    f"(NOT CAST(:only_missing AS boolean) OR NOT EXISTS "
+    f"(SELECT 1 FROM {TRIP_SUMMARY_TABLE} WHERE {TRIP_SUMMARY_TABLE}.trip_id = trip.id))"
+)
+
+# points of a trip are the points of its vehicle between start and finish, trips without points get a row with
+# zero counters; speeds are km/h, the average one is over the whole trip duration
+TRIP_SUMMARY_UPSERT_SQL = f"""
+WITH points AS (
+    SELECT
+        trip.id AS trip_id,
+        trip.start_date_time,
+        trip.finish_date_time,
+        vehicletrackpoint.id,
+        vehicletrackpoint.date_time,
+        vehicletrackpoint.geotag,
+        ST_DistanceSphere(vehicletrackpoint.geotag, LAG(vehicletrackpoint.geotag) OVER segment) AS segment_m,
+        EXTRACT(EPOCH FROM vehicletrackpoint.date_time - LAG(vehicletrackpoint.date_time) OVER segment) AS segment_s
+    FROM trip
+    LEFT JOIN vehicletrackpoint ON vehicletrackpoint.vehicle_id = trip.vehicle_id
+        AND vehicletrackpoint.date_time BETWEEN trip.start_date_time AND trip.finish_date_time
+    WHERE {_TRIPS_FILTER} AND {_MISSING_FILTER}
+    WINDOW segment AS (PARTITION BY trip.id ORDER BY vehicletrackpoint.date_time, vehicletrackpoint.id)
+),
+summaries AS (
+    SELECT
+        trip_id,
+        COUNT(id) AS points_count,
+        COALESCE(SUM(segment_m), 0) / 1000 AS distance_km,
+        EXTRACT(EPOCH FROM MAX(finish_date_time) - MAX(start_date_time)) AS duration_seconds,
+        COALESCE(MAX(segment_m / NULLIF(segment_s, 0)), 0) * 3.6 AS max_speed_kmh,
+        ST_MakeEnvelope(MIN(ST_X(geotag)), MIN(ST_Y(geotag)), MAX(ST_X(geotag)), MAX(ST_Y(geotag))) AS bbox,
+        (ARRAY_AGG(geotag ORDER BY date_time, id) FILTER (WHERE id IS NOT NULL))[1] AS start_point,
+        (ARRAY_AGG(geotag ORDER BY date_time DESC, id DESC) FILTER (WHERE id IS NOT NULL))[1] AS finish_point
+    FROM points
+    GROUP BY trip_id
+)
+INSERT INTO {TRIP_SUMMARY_TABLE} (
+    trip_id, points_count, distance_km, duration_seconds, max_speed_kmh, avg_speed_kmh,
+    bbox, start_point, finish_point, updated_at
+)
+SELECT
+    trip_id, points_count, distance_km, duration_seconds, max_speed_kmh,
+    COALESCE(distance_km / NULLIF(duration_seconds, 0) * 3600, 0),
+    bbox, start_point, finish_point, now()
+FROM summaries
+ON CONFLICT (trip_id) DO UPDATE SET
+    points_count = EXCLUDED.points_count,
+    distance_km = EXCLUDED.distance_km,
+    duration_seconds = EXCLUDED.duration_seconds,
+    max_speed_kmh = EXCLUDED.max_speed_kmh,
+    avg_speed_kmh = EXCLUDED.avg_speed_kmh,
+    bbox = EXCLUDED.bbox,
+    start_point = EXCLUDED.start_point,
+    finish_point = EXCLUDED.finish_point,
+    updated_at = EXCLUDED.updated_at
+"""
+
+
+def trip_summary_params(trip_ids: list = None, only_missing: bool = False) -> dict:
+    return {"trip_ids": trip_ids, "only_missing": only_missing}
@@ -1,8 +1,10 @@
 from abc import ABC, abstractmethod
 
-from sqlalchemy import delete, insert, select, update
+from sqlalchemy import delete, func, insert, select, text, tuple_, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.utils.pagination import CursorParams, PageParams
+
 
 class AbstractRepository(ABC):
     @abstractmethod
@@ -16,46 +18,103 @@ class AbstractRepository(ABC):
 
 class Repository(AbstractRepository):
     model = None
+    # relationships are lazy="raise_on_sql", these options load what the FromDB schema of the model serializes
+    load_options: tuple = ()
 
     def __init__(self, session: AsyncSession):
         self.session = session
 
-    async def add_one(self, data: dict):
-        query = insert(self.model).values(**data).returning(self.model)
+    def _with_relations(self, stmt, with_relations: bool = True):
+        return stmt.options(*self.load_options) if with_relations and self.load_options else stmt
+
+    def _paginate(self, stmt, page_params: PageParams = None, desc: bool = False):
+        """LIMIT and OFFSET of the page, or the keyset condition on id when page_params.after_id is set."""
+        if page_params is None:
+            return stmt
+        if page_params.after_id is not None:
+            after_id_condition = self.model.id < page_params.after_id if desc else self.model.id > page_params.after_id
+            stmt = stmt.where(after_id_condition)
+        else:
+            stmt = stmt.offset(page_params.page * page_params.size)
+        return stmt.limit(page_params.size)
+
+    def _paginate_by_cursor(self, stmt, date_time_column, cursor_params: CursorParams = None):
+        """Orders by (date_time_column, id) and starts after the cursor of cursor_params."""
+        stmt = stmt.order_by(date_time_column, self.model.id)
+        if cursor_params is None:
+            return stmt
+        if cursor_params.after_date_time is not None and cursor_params.after_id is not None:
+            stmt = stmt.where(
+                # the plain condition lets the planner use the date_time indexes and prune partitions
+                date_time_column >= cursor_params.after_date_time,
+                tuple_(date_time_column, self.model.id) > tuple_(cursor_params.after_date_time, cursor_params.after_id),
+            )
+        if cursor_params.size is not None:
+            stmt = stmt.limit(cursor_params.size)
+        return stmt
+
+    async def _count(self, stmt) -> int:
+        # the same FROM and WHERE, loader options and ordering are dropped; FROM of the replaced entity is kept,
+        # an unfiltered select(model) would count nothing without it
+        result = await self.session.execute(
+            stmt.with_only_columns(func.count(), maintain_column_froms=True).order_by(None)
+        )
+        return result.scalar_one()
+
+    def _filter_by_enterprise_stmt(self, filter_set: dict = None):
+        stmt = select(self.model)
+        if filter_set is not None:
+            stmt = stmt.where(self.model.enterprise_id.in_(filter_set.get("enterprise_id")))
+        return stmt
+
+    async def count_filter_by_enterprise(self, filter_set: dict = None) -> int:
+        return await self._count(self._filter_by_enterprise_stmt(filter_set))
+
+    async def estimate_count(self) -> int:
+        """Rows of the whole table by the planner statistics, -1 when the table was never analyzed."""
+        result = await self.session.execute(
+            text("SELECT reltuples::bigint FROM pg_class WHERE oid = CAST(:table_name AS regclass)"),
+            {"table_name": self.model.__tablename__},
+        )
+        return result.scalar_one()
+
+    async def add_one(self, data: dict, with_relations: bool = True):
+        query = self._with_relations(insert(self.model).values(**data).returning(self.model), with_relations)
         res = await self.session.execute(query)
         return res.scalar_one()
 
-    async def find_all(self):
-        stmt = select(self.model).order_by(self.model.id)
+    async def find_all(self, with_relations: bool = True, page_params: PageParams = None):
+        stmt = self._paginate(select(self.model).order_by(self.model.id), page_params)
+        stmt = self._with_relations(stmt, with_relations)
         result = await self.session.execute(stmt)
         return result.scalars().all()
 
-    async def find_all_filter_by_enterprise(self, filter_set: dict = None):
-        order_column = self.model.id
-        if filter_set.get("desc") is True:
-            order_column = order_column.desc()
-        stmt = (
-            select(self.model)
-            .where(self.model.enterprise_id.in_(filter_set.get("enterprise_id")))
-            .order_by(order_column)
-        )
-        result = await self.session.execute(stmt)
+    async def find_all_filter_by_enterprise(
+        self, filter_set: dict = None, with_relations: bool = True, page_params: PageParams = None
+    ):
+        desc = filter_set.get("desc") is True
+        order_column = self.model.id.desc() if desc else self.model.id
+        stmt = self._filter_by_enterprise_stmt(filter_set).order_by(order_column)
+        stmt = self._paginate(stmt, page_params, desc)
+        result = await self.session.execute(self._with_relations(stmt, with_relations))
         return result.scalars().all()
 
-    async def find_all_filter_by_id(self, ids: list = None):
-        result = await self.session.execute(select(self.model).where(self.model.id.in_(ids)))
+    async def find_all_filter_by_id(self, ids: list = None, with_relations: bool = True):
+        stmt = self._with_relations(select(self.model).where(self.model.id.in_(ids)), with_relations)
+        result = await self.session.execute(stmt)
         return result.scalars().all()
 
-    async def find_one(self, item_id: int):
-        result = await self.session.execute(select(self.model).where(self.model.id == item_id))
+    async def find_one(self, item_id: int, with_relations: bool = True):
+        stmt = self._with_relations(select(self.model).where(self.model.id == item_id), with_relations)
+        result = await self.session.execute(stmt)
         return result.scalar_one()
 
-    async def update_one(self, item_id: int, data: dict):
+    async def update_one(self, item_id: int, data: dict, with_relations: bool = True):
         query = update(self.model).where(self.model.id == item_id).values(**data).returning(self.model)
-        result = await self.session.execute(query)
+        result = await self.session.execute(self._with_relations(query, with_relations))
         return result.scalar_one()
 
-    async def delete_one(self, item_id: int):
+    async def delete_one(self, item_id: int, with_relations: bool = True):
         query = delete(self.model).where(self.model.id == item_id).returning(self.model)
-        result = await self.session.execute(query)
+        result = await self.session.execute(self._with_relations(query, with_relations))
         return result.scalar_one()
@@ -1,6 +1,9 @@
+from sqlalchemy.orm import selectinload
+
 from app.db.models import Driver
 from app.repositories.base_repository import Repository
 
 
 class DriverRepository(Repository):
     model = Driver
+    load_options = (selectinload(Driver.vehicles),)
@@ -1,14 +1,29 @@
 from sqlalchemy import select
+from sqlalchemy.orm import joinedload, selectinload
 
-from app.db.models import Enterprise
+from app.db.models import Driver, Enterprise, Vehicle
 from app.repositories.base_repository import Repository
 
 
 class EnterpriseRepository(Repository):
     model = Enterprise
+    # vehicles get their enterprise from the identity map, the parent enterprise is already loaded
+    load_options = (
+        selectinload(Enterprise.vehicles).joinedload(Vehicle.brandmodel),
+        selectinload(Enterprise.drivers).selectinload(Driver.vehicles),
+        selectinload(Enterprise.users),
+    )
 
-    async def find_all_filter_by_enterprise(self, filter_set: dict = None):
-        result = await self.session.execute(
-            select(self.model).where(self.model.id.in_(filter_set.get("enterprise_id")))
-        )
+    async def find_all_filter_by_enterprise(self, filter_set: dict = None, with_relations: bool = True):
+        stmt = select(self.model).where(self.model.id.in_(filter_set.get("enterprise_id")))
+        result = await self.session.execute(self._with_relations(stmt, with_relations))
         return result.scalars().all()
+
+    async def find_timezones(self, enterprise_ids: list = None, vehicle_id: int = None) -> dict:
+        stmt = select(self.model.id, self.model.company_timezone)
+        if enterprise_ids is not None:
+            stmt = stmt.where(self.model.id.in_(enterprise_ids))
+        if vehicle_id is not None:
+            stmt = stmt.join(Vehicle, Vehicle.enterprise_id == self.model.id).where(Vehicle.id == vehicle_id)
+        result = await self.session.execute(stmt)
+        return {enterprise_id: company_timezone.value for enterprise_id, company_timezone in result.all()}
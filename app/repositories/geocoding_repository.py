@@ -0,0 +1,34 @@
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import insert
+
+from app.db.models import GazetteerPlace, GeocodedAddress
+from app.repositories.base_repository import Repository
+
+
+class GeocodedAddressRepository(Repository):
+    model = GeocodedAddress
+
+    async def find_by_cells(self, cells: list) -> dict:
+        result = await self.session.execute(
+            select(self.model.cell, self.model.address).where(self.model.cell.in_(cells))
+        )
+        return dict(result.all())
+
+    async def add_many(self, data: list[dict]):
+        # concurrent requests may resolve the same cell, the first stored address wins
+        query = insert(self.model).values(data).on_conflict_do_nothing(index_elements=[self.model.cell])
+        await self.session.execute(query)
+
+
+class GazetteerPlaceRepository(Repository):
+    model = GazetteerPlace
+
+    async def find_nearest(self, long: float, lat: float):
+        # `<->` ordering is answered by the GiST index on geotag
+        stmt = (
+            select(self.model)
+            .order_by(self.model.geotag.op("<->")(func.ST_GeomFromText(f"POINT({long} {lat})")))
+            .limit(1)
+        )
+        result = await self.session.execute(stmt)
+        return result.scalar_one_or_none()
@@ -1,13 +1,77 @@
-from sqlalchemy import and_, select
+from datetime import date, datetime
 
-from app.db.models import Vehicle
-from app.db.models import Report
+from sqlalchemy import Text, and_, cast, exists, func, or_, select, update
+from sqlalchemy.types import UserDefinedType
+
+from app.db.models import Vehicle, VehicleDayWatermark
+from app.db.models import Report, ReportJob, VehicleMileageReport
+from app.db.models.report import ReportJobStatusChoices
 from app.repositories.base_repository import Repository
 
 
+class _PostgresType(UserDefinedType):
+    """Type name for casts to PostgreSQL types SQLAlchemy has no class for."""
+
+    cache_ok = True
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def get_col_spec(self, **kw) -> str:
+        return self.name
+
+
+XID8 = _PostgresType("xid8")
+PG_SNAPSHOT = _PostgresType("pg_snapshot")
+
+
 class ReportRepository(Repository):
     model = Report
 
+    async def add_one(self, data: dict):
+        # the ORM inserts the row of the report subclass table (by "type") together with the report row
+        report_class = self.model.__mapper__.polymorphic_map[data["type"]].class_
+        report = report_class(**data)
+        self.session.add(report)
+        await self.session.flush()
+        return report
+
+    async def find_cached_by_vehicle(
+        self, vehicle_id: int, period: str, from_date: date, to_date: date, enterprise_id: int = None
+    ):
+        """
+        The latest report with the same inputs whose snapshot saw every transaction that added track points
+        of the vehicle inside of the range.
+        """
+        points_added_since = exists().where(
+            VehicleDayWatermark.vehicle_id == vehicle_id,
+            VehicleDayWatermark.day.between(from_date, to_date),
+            # watermarks without xid were set before reports had snapshots
+            VehicleDayWatermark.modified_xid.is_not(None),
+            ~func.pg_visible_in_snapshot(
+                cast(cast(VehicleDayWatermark.modified_xid, Text), XID8),
+                cast(VehicleMileageReport.computed_snapshot, PG_SNAPSHOT),
+            ),
+        )
+        stmt = (
+            select(VehicleMileageReport)
+            .where(VehicleMileageReport.vehicle_id == vehicle_id)
+            .where(VehicleMileageReport.period == period)
+            .where(VehicleMileageReport.from_date == from_date, VehicleMileageReport.to_date == to_date)
+            .where(VehicleMileageReport.enterprise_id.is_not_distinct_from(enterprise_id))
+            .where(VehicleMileageReport.computed_snapshot.is_not(None))
+            .where(~points_added_since)
+            .order_by(VehicleMileageReport.computed_at.desc())
+            .limit(1)
+        )
+        result = await self.session.execute(stmt)
+        return result.scalars().first()
+
+    async def get_current_snapshot(self) -> str:
+        """pg_current_snapshot() as text, taken before the points of a report are read."""
+        result = await self.session.execute(select(cast(func.pg_current_snapshot(), Text)))
+        return result.scalar_one()
+
     async def find_all_with_filters(self, filter_set: dict, allowed_objects: dict = None):
         filters_list = []
         if allowed_objects is not None:
@@ -30,3 +94,61 @@ class ReportRepository(Repository):
         )
         result = await self.session.execute(stmt)
         return result.scalars().all()
+
+
+class ReportJobRepository(Repository):
+    model = ReportJob
+
+    async def acquire_next(self, stale_before: datetime):
+        """
+        Locks the oldest pending job (or a running one whose worker died before stale_before) and marks it running.
+        SKIP LOCKED lets several workers take different jobs at the same time, commit right after.
+        """
+        stmt = (
+            select(self.model.id)
+            .where(
+                or_(
+                    self.model.status == ReportJobStatusChoices.PENDING.value,
+                    and_(
+                        self.model.status == ReportJobStatusChoices.RUNNING.value,
+                        self.model.started_at < stale_before,
+                    ),
+                )
+            )
+            .order_by(self.model.id)
+            .limit(1)
+            .with_for_update(skip_locked=True)
+        )
+        job_id = (await self.session.execute(stmt)).scalar_one_or_none()
+        if job_id is None:
+            return None
+        query = (
+            update(self.model)
+            .where(self.model.id == job_id)
+            .values(
+                status=ReportJobStatusChoices.RUNNING.value,
+                started_at=func.now(),
+                attempts=self.model.attempts + 1,
+            )
+            .returning(self.model)
+        )
+        result = await self.session.execute(query)
+        return result.scalar_one()
+
+    async def finish(self, job_id: int, attempts: int, data: dict) -> bool:
+        """
+        Updates the running job by data only while it is the attempt the worker acquired. False means the job was
+        taken over by another worker (or finished by it), the result of this attempt has to be discarded.
+        """
+        query = (
+            update(self.model)
+            .where(
+                self.model.id == job_id,
+                self.model.attempts == attempts,
+                self.model.status == ReportJobStatusChoices.RUNNING.value,
+            )
+            .values(**data)
+            .returning(self.model.id)
+        )
+        result = await self.session.execute(query)
+        return result.scalar_one_or_none() is not None
@@ -1,13 +1,70 @@
-from sqlalchemy import and_, select
+from datetime import datetime
 
-from app.db.models import Trip, Vehicle
+from sqlalchemy import and_, delete, false, insert, or_, select, text, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import contains_eager
+
+from app.db.models import Trip, TripDetectionCursor, TripSummary, Vehicle, VehicleTripDetectionState
+from app.db.rollup import TRIP_SUMMARY_UPSERT_SQL, trip_summary_params
 from app.repositories.base_repository import Repository
+from app.utils.pagination import CursorParams
 
 
 class TripRepository(Repository):
     model = Trip
 
-    async def find_all_with_filters(self, filter_set: dict, allowed_objects: dict = None):
+    async def find_all_with_filters(
+        self, filter_set: dict, allowed_objects: dict = None, cursor_params: CursorParams = None
+    ):
+        stmt = self._with_filters_stmt(filter_set, allowed_objects)
+        stmt = self._paginate_by_cursor(stmt, self.model.start_date_time, cursor_params)
+        result = await self.session.execute(stmt)
+        return result.scalars().all()
+
+    async def find_all_with_summary(self, filter_set: dict, allowed_objects: dict = None):
+        """Same as find_all_with_filters, Trip.summary is loaded by the same query and is None if not computed."""
+        stmt = (
+            self._with_filters_stmt(filter_set, allowed_objects)
+            .outerjoin(TripSummary, TripSummary.trip_id == self.model.id)
+            .options(contains_eager(self.model.summary))
+            .order_by(self.model.start_date_time, self.model.id)
+        )
+        result = await self.session.execute(stmt)
+        return result.scalars().all()
+
+    async def add_many(self, data: list[dict]) -> list[int]:
+        """Inserts trips, returns their ids in the order of data."""
+        if not data:
+            return []
+        result = await self.session.execute(
+            insert(self.model).returning(self.model.id, sort_by_parameter_order=True), data
+        )
+        return result.scalars().all()
+
+    async def update_finishes(self, trips_finishes: dict[int, datetime]):
+        if not trips_finishes:
+            return
+        await self.session.execute(
+            update(self.model),
+            [{"id": trip_id, "finish_date_time": finish} for trip_id, finish in trips_finishes.items()],
+        )
+
+    async def delete_many(self, trip_ids: list):
+        if not trip_ids:
+            return
+        await self.session.execute(delete(self.model).where(self.model.id.in_(trip_ids)))
+
+    async def delete_by_vehicle_between(self, vehicle_id: int, from_date_time: datetime, till_date_time: datetime):
+        """Drops trips of the vehicle starting in [from_date_time, till_date_time)."""
+        await self.session.execute(
+            delete(self.model).where(
+                self.model.vehicle_id == vehicle_id,
+                self.model.start_date_time >= from_date_time,
+                self.model.start_date_time < till_date_time,
+            )
+        )
+
+    def _with_filters_stmt(self, filter_set: dict, allowed_objects: dict = None):
         filters_list = []
         if allowed_objects is not None:
             filters_list.append(Vehicle.enterprise_id.in_(allowed_objects.get("enterprise_id")))
@@ -21,11 +78,96 @@ class TripRepository(Repository):
                     filters_list.append(self.model.finish_date_time <= filter_value)
                 case "trip_ids", value if value is not None and isinstance(value, list):
                     filters_list.append(self.model.id.in_(value))
-        stmt = (
-            select(self.model)
-            .join(Vehicle, self.model.vehicle_id == Vehicle.id)
-            .where(and_(*filters_list))
-            .order_by(self.model.id)
+                case "date_time_by_enterprise", value if value is not None:
+                    # windows are already resolved to server time per enterprise timezone
+                    filters_list.append(
+                        or_(
+                            false(),
+                            *(
+                                and_(
+                                    Vehicle.enterprise_id == enterprise_id,
+                                    self.model.start_date_time >= from_date_time,
+                                    self.model.finish_date_time <= till_date_time,
+                                )
+                                for enterprise_id, (from_date_time, till_date_time) in value.items()
+                            ),
+                        )
+                    )
+        return select(self.model).join(Vehicle, self.model.vehicle_id == Vehicle.id).where(and_(*filters_list))
+
+
+class TripSummaryRepository(Repository):
+    model = TripSummary
+
+    async def summarize(self, trip_ids: list = None, only_missing: bool = False):
+        """Computes summaries of the trips from their track points, all trips when trip_ids is None."""
+        await self.session.execute(text(TRIP_SUMMARY_UPSERT_SQL), trip_summary_params(trip_ids, only_missing))
+
+    async def delete_by_trips(self, trip_ids: list):
+        if not trip_ids:
+            return
+        await self.session.execute(delete(self.model).where(self.model.trip_id.in_(trip_ids)))
+
+    async def delete_by_vehicles_ranges(self, vehicles_ranges: dict[int, tuple[datetime, datetime]]):
+        """
+        Drops summaries of trips overlapping {vehicle_id: (first date_time, last date_time)} of new track points,
+        they are computed again on the next read.
+        """
+        if not vehicles_ranges:
+            return
+        trip_ids = select(Trip.id).where(
+            or_(
+                *(
+                    and_(
+                        Trip.vehicle_id == vehicle_id,
+                        Trip.start_date_time <= last_date_time,
+                        Trip.finish_date_time >= first_date_time,
+                    )
+                    for vehicle_id, (first_date_time, last_date_time) in vehicles_ranges.items()
+                )
+            )
         )
-        result = await self.session.execute(stmt)
+        await self.session.execute(delete(self.model).where(self.model.trip_id.in_(trip_ids)))
+
+
+class VehicleTripDetectionStateRepository(Repository):
+    model = VehicleTripDetectionState
+
+    async def find_by_shard(self, shard: int = 0, shards: int = 1) -> list:
+        result = await self.session.execute(select(self.model).where(self.model.vehicle_id % shards == shard))
+        return result.scalars().all()
+
+    async def find_by_vehicles(self, vehicle_ids: list) -> list:
+        result = await self.session.execute(select(self.model).where(self.model.vehicle_id.in_(vehicle_ids)))
         return result.scalars().all()
+
+    async def upsert_many(self, data: list[dict]):
+        if not data:
+            return
+        query = pg_insert(self.model)
+        query = query.on_conflict_do_update(
+            index_elements=[self.model.vehicle_id],
+            set_={
+                column.name: query.excluded[column.name]
+                for column in self.model.__table__.columns
+                if column.name != "vehicle_id"
+            },
+        )
+        await self.session.execute(query, data)
+
+
+class TripDetectionCursorRepository(Repository):
+    model = TripDetectionCursor
+
+    async def get_last_point_id(self, shard: int = 0, shards: int = 1) -> int | None:
+        """Last read track point id of the shard, None before the first batch."""
+        stmt = select(self.model.last_point_id).where(self.model.shard == shard, self.model.shards == shards)
+        result = await self.session.execute(stmt)
+        return result.scalar_one_or_none()
+
+    async def set_last_point_id(self, last_point_id: int, shard: int = 0, shards: int = 1):
+        query = pg_insert(self.model).values(shard=shard, shards=shards, last_point_id=last_point_id)
+        query = query.on_conflict_do_update(
+            index_elements=[self.model.shard, self.model.shards], set_={"last_point_id": query.excluded.last_point_id}
+        )
+        await self.session.execute(query)
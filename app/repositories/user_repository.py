@@ -1,6 +1,7 @@
 from sqlalchemy import select
+from sqlalchemy.orm import selectinload
 
-from app.db.models import User
+from app.db.models import Enterprise, User
 from app.repositories.base_repository import Repository
 
 
@@ -10,3 +11,17 @@ class UserRepository(Repository):
     async def find_one_by_username(self, username: str):
         result = await self.session.execute(select(self.model).where(self.model.username == username))
         return result.scalar_one()
+
+    async def find_principal_by_username(self, username: str):
+        """Loads the user with the short data of its enterprises only, nothing below them."""
+        stmt = (
+            select(self.model)
+            .where(self.model.username == username)
+            .options(
+                selectinload(self.model.enterprises).load_only(
+                    Enterprise.id, Enterprise.company_name, Enterprise.company_address, Enterprise.contact_email
+                )
+            )
+        )
+        result = await self.session.execute(stmt)
+        return result.scalar_one()
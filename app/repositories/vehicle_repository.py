@@ -1,13 +1,34 @@
-from sqlalchemy import and_, insert, or_, select
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import BigInteger, Text, and_, case, cast, delete, false, func, insert, or_, select, text, tuple_
+from sqlalchemy.dialects.postgresql import aggregate_order_by
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import aliased, contains_eager, joinedload
 
 from app.db.models import (
     Enterprise,
     Vehicle,
     VehicleBrand,
+    VehicleDailyMileage,
+    VehicleDayWatermark,
     VehicleModel,
     VehicleTrackPoint,
 )
+from app.db.models.report import ReportPeriodChoices
+from app.db.rollup import DAILY_MILEAGE_EMPTY_DAYS_SQL, DAILY_MILEAGE_UPSERT_SQL, daily_mileage_rollup_params
 from app.repositories.base_repository import Repository
+from app.utils.geo_distance import radius_degrees
+from app.utils.pagination import CursorParams, PageParams
+
+# half of the side of the Web Mercator (EPSG:3857) square, in metres
+TILE_WORLD_HALF_SIZE = 20037508.342789244
+
+DATE_TRUNC_UNITS = {
+    ReportPeriodChoices.DAILY.value: "day",
+    ReportPeriodChoices.MONTHLY.value: "month",
+    ReportPeriodChoices.QUARTERLY.value: "quarter",
+    ReportPeriodChoices.ANNUALLY.value: "year",
+}
 
 
 class VehicleBrandRepository(Repository):
@@ -18,62 +39,100 @@ class VehicleModelRepository(Repository):
     model = VehicleModel
 
     async def find_all_brandmodels(self):
-        stmt = select(self.model).join(VehicleBrand, VehicleModel.brand_id == VehicleBrand.id).order_by(self.model.id)
+        stmt = (
+            select(self.model)
+            .join(VehicleBrand, VehicleModel.brand_id == VehicleBrand.id)
+            .options(contains_eager(VehicleModel.brand))
+            .order_by(self.model.id)
+        )
         result = await self.session.execute(stmt)
         return result.scalars().all()
 
 
 class VehicleRepository(Repository):
     model = Vehicle
+    load_options = (joinedload(Vehicle.brandmodel), joinedload(Vehicle.enterprise))
 
-    async def find_all_with_brandmodel(self):
-        stmt = (
+    def _with_brandmodel_stmt(self):
+        # VehicleFromDB is filled from the joined rows, no additional queries are made
+        return (
             select(self.model)
             .join(VehicleModel, Vehicle.brandmodel_id == VehicleModel.id)
             .join(VehicleBrand, VehicleModel.brand_id == VehicleBrand.id)
             .join(Enterprise, Vehicle.enterprise_id == Enterprise.id, isouter=True)
-            .order_by(self.model.id)
+            .options(
+                contains_eager(Vehicle.brandmodel).contains_eager(VehicleModel.brand),
+                contains_eager(Vehicle.enterprise),
+            )
         )
+
+    async def find_all_with_brandmodel(self):
+        stmt = self._with_brandmodel_stmt().order_by(self.model.id)
         result = await self.session.execute(stmt)
         return result.scalars().all()
 
-    async def find_all_with_brandmodel_filter_by_enterprise(self, filter_set: dict = None):
-        stmt = (
-            select(self.model)
-            .join(VehicleModel, Vehicle.brandmodel_id == VehicleModel.id)
-            .join(VehicleBrand, VehicleModel.brand_id == VehicleBrand.id)
-            .join(Enterprise, Vehicle.enterprise_id == Enterprise.id, isouter=True)
-        )
+    def _with_brandmodel_filter_by_enterprise_stmt(self, filter_set: dict = None):
+        stmt = self._with_brandmodel_stmt()
         if filter_set is not None:
             stmt = stmt.where(self.model.enterprise_id.in_(filter_set.get("enterprise_id")))
-        stmt = stmt.order_by(self.model.id)
-        result = await self.session.execute(stmt)
+        return stmt
+
+    async def find_all_with_brandmodel_filter_by_enterprise(
+        self, filter_set: dict = None, page_params: PageParams = None
+    ):
+        stmt = self._with_brandmodel_filter_by_enterprise_stmt(filter_set).order_by(self.model.id)
+        result = await self.session.execute(self._paginate(stmt, page_params))
         return result.scalars().all()
 
-    async def add_one(self, data: dict):
+    async def count_filter_by_enterprise(self, filter_set: dict = None) -> int:
+        # vehicles are listed joined to their models, the count matches the listing
+        return await self._count(self._with_brandmodel_filter_by_enterprise_stmt(filter_set))
+
+    async def add_one(self, data: dict, with_relations: bool = True):
         query = insert(self.model).values(**data).returning(self.model.id)
         res = await self.session.execute(query)
         return res.scalar_one()
 
-    async def find_one(self, item_id: int):
+    async def find_one(self, item_id: int, with_relations: bool = True):
+        if not with_relations:
+            return await super().find_one(item_id, with_relations=False)
+        result = await self.session.execute(self._with_brandmodel_stmt().where(self.model.id == item_id))
+        return result.scalar_one()
+
+    async def find_ids_by_enterprise(self, enterprise_id: int) -> list:
         result = await self.session.execute(
-            select(self.model)
-            .where(self.model.id == item_id)
-            .join(VehicleModel, Vehicle.brandmodel_id == VehicleModel.id)
-            .join(VehicleBrand, VehicleModel.brand_id == VehicleBrand.id)
-            .join(Enterprise, Vehicle.enterprise_id == Enterprise.id, isouter=True)
+            select(self.model.id).where(self.model.enterprise_id == enterprise_id).order_by(self.model.id)
         )
-        return result.scalar_one()
+        return result.scalars().all()
+
+    async def find_enterprise_ids(self, vehicle_ids: list) -> dict:
+        result = await self.session.execute(
+            select(self.model.id, self.model.enterprise_id).where(self.model.id.in_(vehicle_ids))
+        )
+        return dict(result.all())
 
 
 class VehicleTrackPointRepository(Repository):
     model = VehicleTrackPoint
+    # serializers convert date_time to the timezone of the vehicle enterprise
+    load_options = (joinedload(VehicleTrackPoint.vehicle).joinedload(Vehicle.enterprise),)
+    # the same for statements which are already joined to the vehicle
+    joined_vehicle_options = (contains_eager(VehicleTrackPoint.vehicle).joinedload(Vehicle.enterprise),)
+    stream_batch_size = 1000
+    # rows of a multi-row INSERT, three parameters each stay below the 32767 parameters of a statement
+    insert_batch_size = 5000
+
+    async def add_many(self, data: list[dict]):
+        # asyncpg runs executemany as one statement per row, so rows are sent as multi-row INSERTs instead
+        for start in range(0, len(data), self.insert_batch_size):
+            await self.session.execute(insert(self.model).values(data[start : start + self.insert_batch_size]))
 
     async def find_all_filter_by_enterprise(self, filter_set: dict = None):
         stmt = (
             select(self.model)
             .join(Vehicle, self.model.vehicle_id == Vehicle.id)
             .where(Vehicle.enterprise_id.in_(filter_set.get("enterprise_id")))
+            .options(*self.joined_vehicle_options)
             .order_by(self.model.id)
         )
         result = await self.session.execute(stmt)
@@ -85,11 +144,13 @@ class VehicleTrackPointRepository(Repository):
             .join(Vehicle, self.model.vehicle_id == Vehicle.id)
             .where(Vehicle.enterprise_id.in_(filter_set.get("enterprise_id")))
             .where(self.model.id == item_id)
+            .options(*self.joined_vehicle_options)
         )
         result = await self.session.execute(stmt)
         return result.scalar_one()
 
-    async def find_all_with_filters(self, filter_set: dict, allowed_objects: dict = None):
+    def _filters_list(self, filter_set: dict, allowed_objects: dict = None) -> list:
+        """Filters of statements joined to the vehicle."""
         filters_list = []
         if allowed_objects is not None:
             filters_list.append(Vehicle.enterprise_id.in_(allowed_objects.get("enterprise_id")))
@@ -97,16 +158,54 @@ class VehicleTrackPointRepository(Repository):
             match filter_name, filter_value:
                 case "vehicle_id", value if value is not None:
                     filters_list.append(self.model.vehicle_id == filter_value)
+                case "enterprise_id", value if value is not None:
+                    filters_list.append(Vehicle.enterprise_id == filter_value)
+                case "bbox", value if value is not None:
+                    filters_list.append(func.ST_Intersects(self.model.geotag, func.ST_MakeEnvelope(*value)))
+                case "within_radius", (long, lat, radius):
+                    place = func.ST_MakePoint(long, lat)
+                    # degrees select candidates by the GiST index, the distance on the sphere is exact
+                    filters_list.append(func.ST_DWithin(self.model.geotag, place, radius_degrees(lat, radius)))
+                    filters_list.append(func.ST_DistanceSphere(self.model.geotag, place) <= radius)
+                case "polygon", value if value is not None:
+                    filters_list.append(
+                        func.ST_Intersects(self.model.geotag, func.ST_MakeValid(func.ST_GeomFromText(value)))
+                    )
+                case "date_time_by_enterprise", value if value is not None:
+                    # windows are already resolved to server time per enterprise timezone
+                    filters_list.append(
+                        or_(
+                            false(),
+                            *(
+                                and_(Vehicle.enterprise_id == enterprise_id, self.model.date_time.between(*window))
+                                for enterprise_id, window in value.items()
+                            ),
+                        )
+                    )
+        return filters_list
+
+    def _with_filters_stmt(self, filter_set: dict, allowed_objects: dict = None, cursor_params: CursorParams = None):
         stmt = (
             select(self.model)
             .join(Vehicle, self.model.vehicle_id == Vehicle.id)
-            .where(and_(*filters_list))
-            .order_by(self.model.id)
+            .where(and_(*self._filters_list(filter_set, allowed_objects)))
+            .options(*self.joined_vehicle_options)
         )
-        result = await self.session.execute(stmt)
+        return self._paginate_by_cursor(stmt, self.model.date_time, cursor_params)
+
+    async def find_all_with_filters(
+        self, filter_set: dict, allowed_objects: dict = None, cursor_params: CursorParams = None
+    ):
+        result = await self.session.execute(self._with_filters_stmt(filter_set, allowed_objects, cursor_params))
         return result.scalars().all()
 
-    async def find_all_between_datetimes(self, filter_set: dict, allowed_objects: dict = None):
+    async def stream_all_with_filters(
+        self, filter_set: dict, allowed_objects: dict = None, cursor_params: CursorParams = None
+    ):
+        async for track_point in self._stream(self._with_filters_stmt(filter_set, allowed_objects, cursor_params)):
+            yield track_point
+
+    def _between_datetimes_stmt(self, filter_set: dict, allowed_objects: dict = None):
         def check_for_int(prop_int: str):
             try:
                 int(prop_int)
@@ -125,11 +224,310 @@ class VehicleTrackPointRepository(Repository):
                 case ["date", "time", prop_id], value if value is not None and check_for_int(prop_id):
                     or_filters.append(self.model.date_time.between(*value))
         filters_list.append(or_(*or_filters))
-        stmt = (
+        return (
             select(self.model)
             .join(Vehicle, self.model.vehicle_id == Vehicle.id)
             .where(and_(*filters_list))
             .order_by(self.model.id)
         )
-        result = await self.session.execute(stmt)
+
+    async def find_all_between_datetimes(self, filter_set: dict, allowed_objects: dict = None):
+        result = await self.session.execute(self._between_datetimes_stmt(filter_set, allowed_objects))
         return result.scalars().all()
+
+    async def stream_all_between_datetimes(self, filter_set: dict, allowed_objects: dict = None):
+        async for track_point in self._stream(self._between_datetimes_stmt(filter_set, allowed_objects)):
+            yield track_point
+
+    async def stream_coordinates_by_vehicles(
+        self,
+        vehicle_ids: list,
+        from_date_time: datetime,
+        till_date_time: datetime,
+        tz: str = "UTC",
+        chunk_size: int = 100000,
+    ):
+        """
+        Lists of at most chunk_size rows of (vehicle_id, date_time, long, lat) ordered by vehicle and time, read
+        through a server side cursor, used by distance calculations. date_time is converted to local time of tz by
+        the database.
+        """
+        stmt = (
+            select(
+                self.model.vehicle_id,
+                func.timezone(tz, self.model.date_time).label("date_time"),
+                self.model.long,
+                self.model.lat,
+            )
+            .where(self.model.vehicle_id.in_(vehicle_ids))
+            .where(self.model.date_time >= from_date_time, self.model.date_time < till_date_time)
+            .order_by(self.model.vehicle_id, self.model.date_time, self.model.id)
+            .execution_options(yield_per=chunk_size)
+        )
+        result = await self.session.stream(stmt)
+        async for rows in result.partitions():
+            yield rows
+
+    async def find_coordinates_after_id(self, after_id: int, limit: int, shard: int = 0, shards: int = 1) -> list:
+        """Rows of (id, vehicle_id, date_time, long, lat) with id greater than after_id in the order of ids."""
+        stmt = (
+            select(self.model.id, self.model.vehicle_id, self.model.date_time, self.model.long, self.model.lat)
+            .where(self.model.id > after_id)
+            .order_by(self.model.id)
+            .limit(limit)
+        )
+        if shards > 1:
+            stmt = stmt.where(self.model.vehicle_id % shards == shard)
+        result = await self.session.execute(stmt)
+        return result.all()
+
+    async def get_max_id(self) -> int:
+        """Id of the last added track point, 0 for an empty table."""
+        result = await self.session.execute(select(func.coalesce(func.max(self.model.id), 0)))
+        return result.scalar_one()
+
+    async def stream_coordinates_by_vehicle(
+        self, vehicle_id: int, from_date_time: datetime, till_date_time: datetime, till_id: int = None
+    ):
+        """
+        Rows of (date_time, long, lat) of the vehicle in time order, read through a server side cursor.
+        till_id excludes points added after it.
+        """
+        stmt = (
+            select(self.model.date_time, self.model.long, self.model.lat)
+            .where(self.model.vehicle_id == vehicle_id)
+            .where(self.model.date_time >= from_date_time, self.model.date_time < till_date_time)
+            .order_by(self.model.date_time, self.model.id)
+            .execution_options(yield_per=self.stream_batch_size)
+        )
+        if till_id is not None:
+            stmt = stmt.where(self.model.id <= till_id)
+        result = await self.session.stream(stmt)
+        async for row in result:
+            yield row
+
+    async def find_mileage_by_period(
+        self, vehicle_ids: list, from_date_time: datetime, till_date_time: datetime, period: str, tz: str = "UTC"
+    ) -> list:
+        """
+        Rows of (vehicle_id, period_start, distance_m) aggregated by PostGIS, period_start is local time of tz.
+        Like the python engine, a segment belongs to the period of its end point.
+        """
+        segment_m = func.ST_DistanceSphere(
+            self.model.geotag,
+            func.lag(self.model.geotag).over(
+                partition_by=self.model.vehicle_id, order_by=(self.model.date_time, self.model.id)
+            ),
+        )
+        segments = (
+            select(
+                self.model.vehicle_id,
+                func.date_trunc(DATE_TRUNC_UNITS[period.lower()], func.timezone(tz, self.model.date_time)).label(
+                    "period_start"
+                ),
+                segment_m.label("segment_m"),
+            )
+            .where(self.model.vehicle_id.in_(vehicle_ids))
+            .where(self.model.date_time >= from_date_time, self.model.date_time < till_date_time)
+            .subquery()
+        )
+        stmt = (
+            select(
+                segments.c.vehicle_id,
+                segments.c.period_start,
+                func.coalesce(func.sum(segments.c.segment_m), 0.0).label("distance_m"),
+            )
+            .group_by(segments.c.vehicle_id, segments.c.period_start)
+            .order_by(segments.c.vehicle_id, segments.c.period_start)
+        )
+        result = await self.session.execute(stmt)
+        return result.all()
+
+    async def find_vehicles_by_filters(self, filter_set: dict, allowed_objects: dict = None) -> list:
+        """
+        Rows of (vehicle_id, first_date_time, last_date_time, points_count, company_timezone) of vehicles having
+        filtered points, e.g. inside of a polygon, ordered by the first point.
+        """
+        first_date_time = func.min(self.model.date_time)
+        stmt = (
+            select(
+                self.model.vehicle_id,
+                first_date_time.label("first_date_time"),
+                func.max(self.model.date_time).label("last_date_time"),
+                func.count().label("points_count"),
+                Enterprise.company_timezone,
+            )
+            .join(Vehicle, self.model.vehicle_id == Vehicle.id)
+            .outerjoin(Enterprise, Vehicle.enterprise_id == Enterprise.id)
+            .where(and_(*self._filters_list(filter_set, allowed_objects)))
+            .group_by(self.model.vehicle_id, Enterprise.company_timezone)
+            .order_by(first_date_time, self.model.vehicle_id)
+        )
+        result = await self.session.execute(stmt)
+        return result.all()
+
+    async def find_tile(
+        self,
+        z: int,
+        x: int,
+        y: int,
+        filter_set: dict,
+        allowed_objects: dict = None,
+        extent: int = 4096,
+        buffer: int = 64,
+        max_gap: timedelta = timedelta(minutes=5),
+    ) -> bytes:
+        """
+        Mapbox vector tile (ST_AsMVT) of the filtered points inside of the tile z/x/y, layer "tracks" has a line per
+        vehicle and part of its track without gaps longer than max_gap, with vehicle_id, start and finish (epoch
+        seconds) properties. extent and buffer are in tile units. A part ends where the track leaves the tile
+        buffer, so a vehicle coming back is not joined by a chord across the tile; single points are not drawn.
+        """
+        envelope = func.ST_TileEnvelope(z, x, y)
+        margin = (2 * TILE_WORLD_HALF_SIZE / 2**z) * buffer / extent
+        # geotag has no SRID, the bounds are brought to degrees so the GiST index on geotag answers "&&"
+        bounds = func.ST_SetSRID(func.ST_Transform(func.ST_Expand(envelope, margin), 4326), 0)
+        previous_in_tile = func.lag(self.model.date_time).over(
+            partition_by=self.model.vehicle_id, order_by=(self.model.date_time, self.model.id)
+        )
+        # the previous point of the whole track, found by the (vehicle_id, date_time) index for points of the tile
+        # only; when it is not the previous point of the tile, the track was outside in between
+        previous_point = aliased(VehicleTrackPoint)
+        previous_in_track = (
+            select(func.max(previous_point.date_time))
+            .where(previous_point.vehicle_id == self.model.vehicle_id)
+            .where(previous_point.date_time < self.model.date_time)
+            .scalar_subquery()
+        )
+        gap = case(
+            (
+                or_(
+                    previous_in_tile.is_distinct_from(previous_in_track),
+                    self.model.date_time - previous_in_tile > max_gap,
+                ),
+                1,
+            ),
+            else_=0,
+        )
+        points = (
+            select(
+                self.model.id,
+                self.model.vehicle_id,
+                self.model.date_time,
+                func.ST_Transform(func.ST_SetSRID(self.model.geotag, 4326), 3857).label("geom"),
+                gap.label("gap"),
+            )
+            .join(Vehicle, self.model.vehicle_id == Vehicle.id)
+            .where(and_(*self._filters_list(filter_set, allowed_objects)))
+            .where(self.model.geotag.op("&&")(bounds))
+            .subquery("points")
+        )
+        parts = select(
+            points,
+            func.sum(points.c.gap)
+            .over(partition_by=points.c.vehicle_id, order_by=(points.c.date_time, points.c.id))
+            .label("part"),
+        ).subquery("parts")
+        lines = (
+            select(
+                parts.c.vehicle_id,
+                cast(func.extract("epoch", func.min(parts.c.date_time)), BigInteger).label("start"),
+                cast(func.extract("epoch", func.max(parts.c.date_time)), BigInteger).label("finish"),
+                func.ST_AsMVTGeom(
+                    func.ST_MakeLine(aggregate_order_by(parts.c.geom, parts.c.date_time, parts.c.id)),
+                    envelope,
+                    extent,
+                    buffer,
+                    True,
+                ).label("geom"),
+            )
+            .group_by(parts.c.vehicle_id, parts.c.part)
+            .having(func.count() > 1)
+            .subquery("lines")
+        )
+        tracks = select(lines).where(lines.c.geom.is_not(None)).subquery("tracks")
+        stmt = select(func.ST_AsMVT(tracks.table_valued(), "tracks", extent, "geom"))
+        result = await self.session.execute(stmt)
+        return result.scalar() or b""
+
+    async def _stream(self, stmt):
+        # server side cursor, rows are fetched and converted by batches
+        result = await self.session.stream_scalars(stmt.execution_options(yield_per=self.stream_batch_size))
+        async for track_point in result:
+            yield track_point
+
+
+class VehicleDailyMileageRepository(Repository):
+    model = VehicleDailyMileage
+
+    async def rollup(self, from_day: date, till_day: date, vehicle_ids: list = None):
+        """Recomputes closed days of the range from track points, all vehicles when vehicle_ids is None."""
+        params = daily_mileage_rollup_params(from_day, till_day, vehicle_ids)
+        await self.session.execute(text(DAILY_MILEAGE_UPSERT_SQL), params)
+        await self.session.execute(text(DAILY_MILEAGE_EMPTY_DAYS_SQL), params)
+
+    async def find_by_vehicles(self, vehicle_ids: list, from_day: date, till_day: date) -> list:
+        stmt = (
+            select(self.model.vehicle_id, self.model.day, self.model.distance_km, self.model.points_count)
+            .where(self.model.vehicle_id.in_(vehicle_ids))
+            .where(self.model.day.between(from_day, till_day))
+            .order_by(self.model.vehicle_id, self.model.day)
+        )
+        result = await self.session.execute(stmt)
+        return result.all()
+
+    async def delete_days(self, vehicle_days: set):
+        """Drops rows of (vehicle_id, day) pairs, they are rolled up again on the next report."""
+        if not vehicle_days:
+            return
+        await self.session.execute(
+            delete(self.model).where(tuple_(self.model.vehicle_id, self.model.day).in_(list(vehicle_days)))
+        )
+
+
+class VehicleDayWatermarkRepository(Repository):
+    model = VehicleDayWatermark
+
+    async def find_last_modified_by_vehicles(
+        self, from_day: date = None, till_day: date = None, enterprise_ids: list = None, vehicle_id: int = None
+    ) -> list:
+        """
+        Rows of (vehicle_id, modified_at) of the vehicles of the enterprises (all when enterprise_ids is None),
+        modified_at is the last time points were added in the days range or None.
+        """
+        days_filters = []
+        if from_day is not None:
+            days_filters.append(self.model.day >= from_day)
+        if till_day is not None:
+            days_filters.append(self.model.day <= till_day)
+        stmt = (
+            select(Vehicle.id, func.max(self.model.modified_at))
+            .outerjoin(self.model, and_(self.model.vehicle_id == Vehicle.id, *days_filters))
+            .group_by(Vehicle.id)
+            .order_by(Vehicle.id)
+        )
+        if enterprise_ids is not None:
+            stmt = stmt.where(Vehicle.enterprise_id.in_(enterprise_ids))
+        if vehicle_id is not None:
+            stmt = stmt.where(Vehicle.id == vehicle_id)
+        result = await self.session.execute(stmt)
+        return result.all()
+
+    async def touch(self, vehicle_days: set):
+        """Sets modified_at of (vehicle_id, day) pairs to the current time."""
+        if not vehicle_days:
+            return
+        # reports compare the transaction id with their snapshots, a time taken before the commit could be older
+        # than a report which did not see the points yet
+        current_xid = cast(cast(func.pg_current_xact_id(), Text), BigInteger)
+        query = pg_insert(self.model).values(
+            [
+                {"vehicle_id": vehicle_id, "day": day, "modified_xid": current_xid}
+                for vehicle_id, day in sorted(vehicle_days)
+            ]
+        )
+        query = query.on_conflict_do_update(
+            index_elements=[self.model.vehicle_id, self.model.day],
+            set_={"modified_at": func.clock_timestamp(), "modified_xid": query.excluded.modified_xid},
+        )
+        await self.session.execute(query)
@@ -1,11 +1,9 @@
-import math
-
 from fastapi.exceptions import ValidationException
 
 from app.api.schemas.driver import DriverFromDB
 from app.api.schemas.user import UserExtended
 from app.utils.auth import get_users_enterpises
-from app.utils.pagination import PagedResponseSchema, PageParams
+from app.utils.pagination import PagedResponseSchema, PageParams, count_total, get_paged_response
 from app.utils.unitofwork import IUnitOfWork
 
 
@@ -22,16 +20,15 @@ class DriverService:
         allowed_objects = get_users_enterpises(current_user)
         async with self.uow:
             if current_user.role == "manager" and allowed_objects.get("enterprise_id"):
-                drivers: list = await self.uow.driver.find_all_filter_by_enterprise(allowed_objects)
+                drivers: list = await self.uow.driver.find_all_filter_by_enterprise(
+                    allowed_objects, page_params=page_params
+                )
             elif current_user.role == "admin":
-                drivers: list = await self.uow.driver.find_all()
+                allowed_objects = None
+                drivers: list = await self.uow.driver.find_all(page_params=page_params)
             else:
                 raise ValidationException({"enterprise_id": "You are not allowed to get drivers for this enterprise"})
-            from_index = page_params.page * page_params.size
-            to_index = (page_params.page + 1) * page_params.size
-            return PagedResponseSchema(
-                total=math.ceil(len(drivers) / page_params.size) - 1,
-                page=page_params.page,
-                size=page_params.size,
-                results=[DriverFromDB.model_validate(driver) for driver in drivers[from_index:to_index]],
+            total_count = await count_total(self.uow.driver, allowed_objects)
+            return get_paged_response(
+                [DriverFromDB.model_validate(driver) for driver in drivers], page_params, total_count
             )
@@ -7,7 +7,7 @@ from app.api.schemas.enterprise import (
     EnterpriseShort,
 )
 from app.api.schemas.user import UserExtended
-from app.utils.auth import get_users_enterpises
+from app.utils.auth import get_users_enterpises, invalidate_principals
 from app.utils.unitofwork import IUnitOfWork
 
 
@@ -42,9 +42,11 @@ class EnterpriseService:
         allowed_objects = get_users_enterpises(current_user)
         async with self.uow:
             if current_user.role == "manager" and allowed_objects.get("enterprise_id"):
-                enterprises: list = await self.uow.enterprise.find_all_filter_by_enterprise(allowed_objects)
+                enterprises: list = await self.uow.enterprise.find_all_filter_by_enterprise(
+                    allowed_objects, with_relations=False
+                )
             elif current_user.role == "admin":
-                enterprises: list = await self.uow.enterprise.find_all()
+                enterprises: list = await self.uow.enterprise.find_all(with_relations=False)
             else:
                 raise ValidationException({"enterprise_id": "You are not allowed to get enterprises."})
             return [EnterpriseShort.model_validate(enterprise) for enterprise in enterprises]
@@ -69,6 +71,7 @@ class EnterpriseService:
             enterprise_to_return = EnterpriseFromDB.model_validate(enterprise_from_db)
 
             await self.uow.commit()
+            invalidate_principals()
 
             return enterprise_to_return
 
@@ -111,6 +114,7 @@ class EnterpriseService:
             enterprise_to_return = EnterpriseFromDB.model_validate(enterprise_from_db)
 
             await self.uow.commit()
+            invalidate_principals()
             return enterprise_to_return
 
     async def partial_update_enterprise(
@@ -143,6 +147,7 @@ class EnterpriseService:
             enterprise_to_return = EnterpriseFromDB.model_validate(enterprise_from_db)
 
             await self.uow.commit()
+            invalidate_principals()
             return enterprise_to_return
 
     async def delete_enterprise(
@@ -166,4 +171,5 @@ class EnterpriseService:
             enterprise_to_return = EnterpriseFromDB.model_validate(enterprise_from_db)
 
             await self.uow.commit()
+            invalidate_principals()
             return enterprise_to_return
@@ -0,0 +1,117 @@
+import asyncio
+from abc import ABC, abstractmethod
+
+from geopy.exc import GeopyError
+from geopy.geocoders import Nominatim
+
+from app.core.config import settings
+from app.utils.lru import LRUCache
+from app.utils.unitofwork import IUnitOfWork
+
+address_cache = LRUCache(maxsize=settings.GEOCODER_LRU_SIZE)
+
+
+def get_cell_key(point_coords: tuple, precision: int = None) -> str:
+    """Rounds (lat, long) to a cell, points of the same cell share one address."""
+    precision = settings.GEOCODER_CELL_PRECISION if precision is None else precision
+    lat, long = point_coords
+    return f"{lat:.{precision}f}:{long:.{precision}f}"
+
+
+class Geocoder(ABC):
+    name: str
+
+    @abstractmethod
+    async def reverse(self, point_coords: tuple) -> str | None: ...
+
+
+class NominatimGeocoder(Geocoder):
+    name = "nominatim"
+    _client = None
+
+    @classmethod
+    def get_client(cls) -> Nominatim:
+        if cls._client is None:
+            cls._client = Nominatim(user_agent=settings.GEOCODER_USER_AGENT)
+        return cls._client
+
+    def _reverse(self, point_coords: tuple) -> str | None:
+        try:
+            location = self.get_client().reverse(f"{point_coords[0]}, {point_coords[1]}")
+        except GeopyError:
+            return None
+        return location.address if location else None
+
+    async def reverse(self, point_coords: tuple) -> str | None:
+        # geopy client is blocking, keep it off the event loop
+        return await asyncio.to_thread(self._reverse, point_coords)
+
+
+class GazetteerGeocoder(Geocoder):
+    """Offline geocoder resolving to the nearest place imported by `manage.py import-gazetteer`."""
+
+    name = "gazetteer"
+
+    def __init__(self, uow: IUnitOfWork):
+        self.uow = uow
+
+    async def reverse(self, point_coords: tuple) -> str | None:
+        async with self.uow:
+            place = await self.uow.gazetteerplace.find_nearest(long=point_coords[1], lat=point_coords[0])
+        return place.address if place else None
+
+
+def get_geocoder(uow: IUnitOfWork) -> Geocoder:
+    match settings.GEOCODER_PROVIDER:
+        case GazetteerGeocoder.name:
+            return GazetteerGeocoder(uow)
+        case NominatimGeocoder.name:
+            return NominatimGeocoder()
+        case provider:
+            raise ValueError(f"Unknown geocoder provider {provider}")
+
+
+class GeocodingService:
+    def __init__(self, uow: IUnitOfWork):
+        self.uow = uow
+
+    async def get_addresses(self, points: list[tuple]) -> dict[tuple, str | None]:
+        """
+        Resolves (lat, long) points to addresses looking up the in-process LRU, then the
+        geocodedaddress table and only then the configured geocoder.
+        """
+        point_cells = {point: get_cell_key(point) for point in points}
+        cell_addresses = {}
+        missing_cells = {}
+        for point, cell in point_cells.items():
+            address = address_cache.get(cell)
+            if address is not None:
+                cell_addresses[cell] = address
+            else:
+                missing_cells[cell] = point
+
+        if missing_cells:
+            async with self.uow:
+                cell_addresses.update(await self.uow.geocodedaddress.find_by_cells(list(missing_cells)))
+
+            # the session is released while the geocoder is waited for, it can take seconds per point
+            geocoder = get_geocoder(self.uow)
+            resolved = []
+            for cell, point in missing_cells.items():
+                if cell in cell_addresses:
+                    continue
+                address = await geocoder.reverse(point)
+                if address is None:
+                    continue
+                cell_addresses[cell] = address
+                resolved.append({"cell": cell, "address": address, "provider": geocoder.name})
+            if resolved:
+                async with self.uow:
+                    await self.uow.geocodedaddress.add_many(resolved)
+                    await self.uow.commit()
+
+            for cell in missing_cells:
+                if cell in cell_addresses:
+                    address_cache.set(cell, cell_addresses[cell])
+
+        return {point: cell_addresses.get(cell) for point, cell in point_cells.items()}
@@ -1,11 +1,23 @@
-from datetime import date, timedelta
+import asyncio
 from collections import defaultdict
-from geopy import distance
+from datetime import date, datetime, time, timedelta
 
-from app.api.schemas.report import ReportFromDB, ReportCreate
-from app.api.schemas.vehicle_track_point import from_geo_point_to_lat_long
+import numpy as np
+from pytz import timezone
+from sqlalchemy import func
+
+from app.api.schemas.report import ReportCreate, ReportFromDB, ReportJobCreate, ReportJobFromDB
+from app.core.config import settings
+from app.db.models.report import ReportJobStatusChoices
+from app.db.rollup import missing_day_spans
+from app.utils.datetime_utils import localize_datetime
+from app.utils.geo_distance import (
+    get_period_keys,
+    get_period_labels,
+    sum_segments_by_group_and_period,
+    sum_values_by_period,
+)
 from app.utils.unitofwork import IUnitOfWork
-from app.utils.datetime_utils import get_period_from_datetime, get_str_key
 
 
 class ReportService:
@@ -13,7 +25,7 @@ class ReportService:
         self.uow = uow
 
     async def get_reports(self, enterprise_id: int = None, desc: bool = False) -> list[ReportFromDB]:
-        async with self.uow:
+        async with self.uow.read_only():
             if enterprise_id:
                 reports = await self.uow.report.find_all_filter_by_enterprise(
                     {"enterprise_id": [enterprise_id], "desc": desc}
@@ -37,48 +49,368 @@ class ReportService:
         enterprise_id: int,
     ) -> ReportFromDB:
         async with self.uow:
-            trackpoints_date_dict = {
-                "vehicle_id": vehicle_id,
-                f"date_time_{vehicle_id}": (from_date, till_date + timedelta(days=1)),
-            }
-            track_points = await self.uow.vehicletrackpoint.find_all_between_datetimes(trackpoints_date_dict)
-
-            geo_points_dict = defaultdict(list)
-            serializer = from_geo_point_to_lat_long
-            for tp_db in track_points:
-                tp = serializer(tp_db)
-                geo_points_dict[get_period_from_datetime(tp_db.date_time, period)].append([tp.long, tp.lat])
-
-            result_value = {}
-            for tp_date, points_list in geo_points_dict.items():
-                if len(points_list) < 2:
-                    result_value[tp_date] = 0
-                    continue
-                distance_list = []
-                start_point = points_list[0]
-                for point in points_list[1::]:
-                    distance_list.append(distance.distance(start_point, point).km)
-                result_value[tp_date] = round(sum(distance_list))
-
-            dict_to_store = {}
-            for key, value in sorted(result_value.items()):
-                key_elems = []
-                for elem in key:
-                    key_elems.append(str(elem))
-                dict_to_store[get_str_key(key_elems, period)] = value
-
-            report_data = ReportCreate(
-                title=f"{period} report for vehicle {vehicle_id} from {from_date} to {till_date}",
+            report_from_db = await self._get_or_add_report_by_vehicle(
+                vehicle_id=vehicle_id,
                 period=period,
                 from_date=from_date,
-                to_date=till_date,
-                report_result=dict_to_store,
-                type="vehiclemileagereport",
+                till_date=till_date,
                 enterprise_id=enterprise_id,
             )
-            report_dict: dict = report_data.model_dump()
-            report_from_db = await self.uow.report.add_one(report_dict)
             report_to_return = ReportFromDB.model_validate(report_from_db)
 
             await self.uow.commit()
             return report_to_return
+
+    async def _get_or_add_report_by_vehicle(
+        self,
+        *,
+        vehicle_id: int,
+        period: str,
+        from_date: date,
+        till_date: date,
+        enterprise_id: int,
+    ):
+        """
+        Returns the cached report of the same inputs if no points were added to its range since,
+        otherwise computes mileage and adds the report. Should be awaited inside of the uow block.
+        """
+        cached_report = await self.uow.report.find_cached_by_vehicle(
+            vehicle_id, period, from_date, till_date, enterprise_id
+        )
+        if cached_report is not None:
+            return cached_report
+
+        computed_snapshot = await self.uow.report.get_current_snapshot()
+        result_value = await self._get_mileage_by_period(vehicle_id, period, from_date, till_date)
+        dict_to_store = {key: round(value) for key, value in result_value.items()}
+
+        report_data = ReportCreate(
+            title=f"{period} report for vehicle {vehicle_id} from {from_date} to {till_date}",
+            period=period,
+            from_date=from_date,
+            to_date=till_date,
+            report_result=dict_to_store,
+            type="vehiclemileagereport",
+            enterprise_id=enterprise_id,
+        )
+        report_dict: dict = report_data.model_dump()
+        report_dict["vehicle_id"] = vehicle_id
+        report_dict["computed_snapshot"] = computed_snapshot
+        return await self.uow.report.add_one(report_dict)
+
+    async def _add_report_by_enterprise(
+        self,
+        *,
+        enterprise_id: int,
+        period: str,
+        from_date: date,
+        till_date: date,
+    ):
+        """
+        Computes mileage of every vehicle of the enterprise with one scan and adds one report,
+        should be awaited inside of the uow block.
+        """
+        vehicle_ids = await self.uow.vehicle.find_ids_by_enterprise(enterprise_id)
+        enterprise_timezones = await self.uow.enterprise.find_timezones([enterprise_id])
+        tz = enterprise_timezones.get(enterprise_id, "UTC")
+        vehicles_mileage = await self._get_vehicles_mileage_by_period(vehicle_ids, period, from_date, till_date, tz)
+
+        total_mileage = defaultdict(float)
+        for mileage in vehicles_mileage.values():
+            for key, value in mileage.items():
+                total_mileage[key] += value
+        dict_to_store = {
+            "total": {key: round(value) for key, value in sorted(total_mileage.items())},
+            "vehicles": {
+                str(vehicle_id): {key: round(value) for key, value in vehicles_mileage.get(vehicle_id, {}).items()}
+                for vehicle_id in vehicle_ids
+            },
+        }
+
+        report_data = ReportCreate(
+            title=f"{period} report for enterprise {enterprise_id} from {from_date} to {till_date}",
+            period=period,
+            from_date=from_date,
+            to_date=till_date,
+            report_result=dict_to_store,
+            type="enterprisemileagereport",
+            enterprise_id=enterprise_id,
+        )
+        report_dict: dict = report_data.model_dump()
+        return await self.uow.report.add_one(report_dict)
+
+    async def enqueue_report_by_vehicle(
+        self,
+        *,
+        vehicle_id: int,
+        period: str,
+        from_date: date,
+        till_date: date,
+        enterprise_id: int,
+    ) -> ReportJobFromDB:
+        job_data = ReportJobCreate(
+            period=period,
+            from_date=from_date,
+            to_date=till_date,
+            type="vehiclemileagereport",
+            vehicle_id=vehicle_id,
+            enterprise_id=enterprise_id,
+        )
+        async with self.uow:
+            cached_report = await self.uow.report.find_cached_by_vehicle(
+                vehicle_id, period, from_date, till_date, enterprise_id
+            )
+            if cached_report is not None:
+                # refreshing dashboards get the stored report without a worker round trip, the done job is not stored
+                now = datetime.now(tz=timezone("UTC"))
+                return ReportJobFromDB(
+                    **job_data.model_dump(),
+                    status=ReportJobStatusChoices.DONE.value,
+                    attempts=0,
+                    created_at=now,
+                    started_at=now,
+                    finished_at=now,
+                    report_id=cached_report.id,
+                )
+            job_from_db = await self.uow.reportjob.add_one(job_data.model_dump())
+            job_to_return = ReportJobFromDB.model_validate(job_from_db)
+
+            await self.uow.commit()
+            return job_to_return
+
+    async def enqueue_report_by_enterprise(
+        self,
+        *,
+        period: str,
+        from_date: date,
+        till_date: date,
+        enterprise_id: int,
+    ) -> ReportJobFromDB:
+        job_data = ReportJobCreate(
+            period=period,
+            from_date=from_date,
+            to_date=till_date,
+            type="enterprisemileagereport",
+            enterprise_id=enterprise_id,
+        )
+        async with self.uow:
+            job_from_db = await self.uow.reportjob.add_one(job_data.model_dump())
+            job_to_return = ReportJobFromDB.model_validate(job_from_db)
+
+            await self.uow.commit()
+            return job_to_return
+
+    async def retrieve_report_job(self, job_id: int) -> ReportJobFromDB:
+        async with self.uow:
+            job = await self.uow.reportjob.find_one(job_id)
+            return ReportJobFromDB.model_validate(job)
+
+    async def process_next_job(self) -> bool:
+        """Computes one queued report, returns False when there is nothing to do."""
+        stale_before = datetime.now(tz=timezone("UTC")) - timedelta(seconds=settings.REPORT_JOB_STALE_AFTER)
+        async with self.uow:
+            job = await self.uow.reportjob.acquire_next(stale_before)
+            if job is None:
+                return False
+            job_data = ReportJobFromDB.model_validate(job)
+            await self.uow.commit()
+
+        if job_data.attempts > settings.REPORT_JOB_MAX_ATTEMPTS:
+            # the job was taken over from workers that died on it too many times
+            await self._fail_job(job_data.id, job_data.attempts, "Report job exceeded the number of attempts")
+            return True
+
+        try:
+            async with self.uow:
+                match job_data.type:
+                    case "enterprisemileagereport":
+                        report_from_db = await self._add_report_by_enterprise(
+                            enterprise_id=job_data.enterprise_id,
+                            period=job_data.period,
+                            from_date=job_data.from_date,
+                            till_date=job_data.to_date,
+                        )
+                    case _:
+                        report_from_db = await self._get_or_add_report_by_vehicle(
+                            vehicle_id=job_data.vehicle_id,
+                            period=job_data.period,
+                            from_date=job_data.from_date,
+                            till_date=job_data.to_date,
+                            enterprise_id=job_data.enterprise_id,
+                        )
+                finished = await self.uow.reportjob.finish(
+                    job_data.id,
+                    job_data.attempts,
+                    {
+                        "status": ReportJobStatusChoices.DONE.value,
+                        "report_id": report_from_db.id,
+                        "finished_at": func.now(),
+                    },
+                )
+                if finished:
+                    await self.uow.commit()
+                # otherwise the job was taken over as stale, the report of this attempt is rolled back with the block
+        except Exception as exc:
+            await self._fail_job(job_data.id, job_data.attempts, repr(exc))
+        return True
+
+    async def _fail_job(self, job_id: int, attempts: int, error: str) -> None:
+        async with self.uow:
+            finished = await self.uow.reportjob.finish(
+                job_id,
+                attempts,
+                {"status": ReportJobStatusChoices.FAILED.value, "error": error, "finished_at": func.now()},
+            )
+            if finished:
+                await self.uow.commit()
+
+    async def get_mileage_by_period(
+        self,
+        vehicle_id: int,
+        period: str,
+        from_date: date,
+        till_date: date,
+        engine: str = None,
+        use_rollup: bool = None,
+    ) -> dict[str, float]:
+        async with self.uow:
+            return await self._get_mileage_by_period(vehicle_id, period, from_date, till_date, engine, use_rollup)
+
+    async def _get_mileage_by_period(
+        self,
+        vehicle_id: int,
+        period: str,
+        from_date: date,
+        till_date: date,
+        engine: str = None,
+        use_rollup: bool = None,
+    ) -> dict[str, float]:
+        """Kilometers by period labels, should be awaited inside of the uow block."""
+        enterprise_timezones = await self.uow.enterprise.find_timezones(vehicle_id=vehicle_id)
+        tz = next(iter(enterprise_timezones.values()), "UTC")
+        vehicles_mileage = await self._get_vehicles_mileage_by_period(
+            [vehicle_id], period, from_date, till_date, tz, engine, use_rollup
+        )
+        return vehicles_mileage.get(vehicle_id, {})
+
+    async def _get_vehicles_mileage_by_period(
+        self,
+        vehicle_ids: list,
+        period: str,
+        from_date: date,
+        till_date: date,
+        tz: str,
+        engine: str = None,
+        use_rollup: bool = None,
+    ) -> dict[int, dict[str, float]]:
+        """{vehicle_id: {period label: km}}, vehicles without points are omitted. Await inside of the uow block."""
+        if not vehicle_ids:
+            return {}
+        if settings.REPORT_USE_DAILY_ROLLUP if use_rollup is None else use_rollup:
+            return await self._get_mileage_with_rollup(vehicle_ids, period, from_date, till_date, tz, engine)
+        return await self._get_raw_mileage(vehicle_ids, period, from_date, till_date, tz, engine)
+
+    async def _get_mileage_with_rollup(
+        self, vehicle_ids: list, period: str, from_date: date, till_date: date, tz: str, engine: str = None
+    ) -> dict[int, dict[str, float]]:
+        """Closed days come from vehicle_daily_mileage, the open current day is computed from track points."""
+        today = datetime.now(tz=timezone(tz)).date()
+        closed_till_date = min(till_date, today - timedelta(days=1))
+        vehicles_daily_mileage = defaultdict(dict)
+
+        if from_date <= closed_till_date:
+            days_rows = await self.uow.vehicledailymileage.find_by_vehicles(vehicle_ids, from_date, closed_till_date)
+            missing_spans = missing_day_spans(
+                vehicle_ids, from_date, closed_till_date, {(row.vehicle_id, row.day) for row in days_rows}
+            )
+            if missing_spans:
+                # days never rolled up or invalidated by late points are computed now and kept for next reports,
+                # only the missing spans of the vehicles missing them
+                for (span_from, span_till), span_vehicle_ids in missing_spans.items():
+                    await self.uow.vehicledailymileage.rollup(span_from, span_till, span_vehicle_ids)
+                days_rows = await self.uow.vehicledailymileage.find_by_vehicles(
+                    vehicle_ids, from_date, closed_till_date
+                )
+            for day_row in days_rows:
+                if day_row.points_count:
+                    vehicles_daily_mileage[day_row.vehicle_id][day_row.day] = day_row.distance_km
+
+        if till_date >= today:
+            open_from_date = max(from_date, today)
+            # points of the day before are read too, so the segment from its last point to the first point of the
+            # open day is counted, as LAG() of the rollup counts it for closed days; the day itself is dropped
+            open_mileage = await self._get_raw_mileage(
+                vehicle_ids, "daily", open_from_date - timedelta(days=1), till_date, tz, engine
+            )
+            for vehicle_id, mileage in open_mileage.items():
+                for day_label, value in mileage.items():
+                    day = date.fromisoformat(day_label)
+                    if day >= open_from_date:
+                        vehicles_daily_mileage[vehicle_id][day] = value
+
+        return {
+            vehicle_id: sum_values_by_period(
+                np.array(list(daily_mileage.keys()), dtype="datetime64[D]"), list(daily_mileage.values()), period
+            )
+            for vehicle_id, daily_mileage in vehicles_daily_mileage.items()
+        }
+
+    async def _get_raw_mileage(
+        self, vehicle_ids: list, period: str, from_date: date, till_date: date, tz: str, engine: str = None
+    ) -> dict[int, dict[str, float]]:
+        """Computes mileage from track points with REPORT_MILEAGE_ENGINE."""
+        # report dates are days of the enterprise, the window is [from_date 00:00, till_date + 1 day 00:00)
+        from_date_time = localize_datetime(datetime.combine(from_date, time()), tz)
+        till_date_time = localize_datetime(datetime.combine(till_date + timedelta(days=1), time()), tz)
+
+        match engine or settings.REPORT_MILEAGE_ENGINE:
+            case "postgis":
+                return await self._get_mileage_postgis(vehicle_ids, from_date_time, till_date_time, period, tz)
+            case _:
+                return await self._get_mileage_python(vehicle_ids, from_date_time, till_date_time, period, tz)
+
+    async def _get_mileage_python(
+        self, vehicle_ids: list, from_date_time: datetime, till_date_time: datetime, period: str, tz: str
+    ) -> dict[int, dict[str, float]]:
+        """
+        Reads coordinates of all vehicles in one query by chunks of REPORT_POINTS_CHUNK_SIZE points and sums
+        segments of every chunk with NumPy, so memory does not grow with the fleet and the range.
+        """
+        vehicles_mileage = defaultdict(lambda: defaultdict(float))
+        last_point = None
+        async for track_points in self.uow.vehicletrackpoint.stream_coordinates_by_vehicles(
+            vehicle_ids, from_date_time, till_date_time, tz, settings.REPORT_POINTS_CHUNK_SIZE
+        ):
+            if last_point is not None:
+                # the segment ending at the first point of the chunk starts in the previous one
+                track_points = [last_point, *track_points]
+            last_point = track_points[-1]
+            point_vehicle_ids, date_times, longs, lats = zip(*track_points)
+            # NumPy releases the GIL, other requests and report jobs are served while a big fleet is computed
+            chunk_mileage = await asyncio.to_thread(
+                sum_segments_by_group_and_period,
+                np.array(point_vehicle_ids, dtype=np.int64),
+                np.array(date_times, dtype="datetime64[us]"),
+                np.array(longs, dtype=np.float64),
+                np.array(lats, dtype=np.float64),
+                period,
+            )
+            for vehicle_id, mileage in chunk_mileage.items():
+                for label, value in mileage.items():
+                    vehicles_mileage[vehicle_id][label] += value
+        return {vehicle_id: dict(mileage) for vehicle_id, mileage in vehicles_mileage.items()}
+
+    async def _get_mileage_postgis(
+        self, vehicle_ids: list, from_date_time: datetime, till_date_time: datetime, period: str, tz: str
+    ) -> dict[int, dict[str, float]]:
+        """Lets PostGIS sum segments per vehicle and period."""
+        rows = await self.uow.vehicletrackpoint.find_mileage_by_period(
+            vehicle_ids, from_date_time, till_date_time, period, tz
+        )
+        if not rows:
+            return {}
+        period_keys = get_period_keys([row.period_start for row in rows], period)
+        vehicles_mileage = {}
+        for label, row in zip(get_period_labels(period_keys, period), rows):
+            vehicles_mileage.setdefault(row.vehicle_id, {})[label] = row.distance_m / 1000
+        return vehicles_mileage
@@ -0,0 +1,211 @@
+from datetime import datetime, timedelta, timezone
+
+from app.core.config import settings
+from app.utils.trip_segmentation import TRIP_CLOSED, TRIP_DISCARDED, TRIP_OPENED, TripSegmenter, VehicleTripState
+from app.utils.unitofwork import IUnitOfWork
+
+
+def get_trip_segmenter() -> TripSegmenter:
+    return TripSegmenter(
+        min_speed_kmh=settings.TRIP_DETECTION_MIN_SPEED_KMH,
+        stop_dwell_seconds=settings.TRIP_DETECTION_STOP_DWELL,
+        max_gap_seconds=settings.TRIP_DETECTION_MAX_GAP,
+        min_duration_seconds=settings.TRIP_DETECTION_MIN_DURATION,
+        min_distance_km=settings.TRIP_DETECTION_MIN_DISTANCE_KM,
+    )
+
+
+class TripDetectionService:
+    """
+    Opens and closes trips of the vehicles of a shard (vehicle_id % shards == shard) from new track points.
+    States of the vehicles are kept in memory between batches, only one detector may run per shard (see
+    manage/trip_detector.py). Trips of vehicles without points for TRIP_DETECTION_MAX_GAP are closed by every batch.
+    The first batch of a shard starts after from_point_id, by default after the last point added so far,
+    history before it is left to backfill.
+    """
+
+    def __init__(self, uow: IUnitOfWork, shard: int = 0, shards: int = 1, from_point_id: int = None):
+        self.uow = uow
+        self.shard = shard
+        self.shards = shards
+        self.from_point_id = from_point_id
+        # points up to the start point belong to backfill, the id overlap does not read them again
+        self.start_point_id = 0
+        self.segmenter = get_trip_segmenter()
+        self.states: dict[int, VehicleTripState] | None = None  # loaded by the first batch
+
+    async def process_next_batch(self, batch_size: int = None) -> int:
+        """Feeds the next track points to the segmenter and saves trips, returns how many new points were read."""
+        batch_size = batch_size or settings.TRIP_DETECTION_BATCH_SIZE
+        try:
+            async with self.uow:
+                if self.states is None:
+                    self.states = {
+                        state_db.vehicle_id: VehicleTripState(
+                            **{name: getattr(state_db, name) for name in VehicleTripState.__slots__}
+                        )
+                        for state_db in await self.uow.vehicletripdetectionstate.find_by_shard(self.shard, self.shards)
+                    }
+                last_point_id = await self.uow.tripdetectioncursor.get_last_point_id(self.shard, self.shards)
+                if last_point_id is None:
+                    last_point_id = self.start_point_id = await self.get_start_point_id()
+                    await self.uow.tripdetectioncursor.set_last_point_id(last_point_id, self.shard, self.shards)
+                    await self.uow.commit()
+                points = await self.uow.vehicletrackpoint.find_coordinates_after_id(
+                    max(last_point_id - settings.TRIP_DETECTION_ID_OVERLAP, self.start_point_id),
+                    batch_size + settings.TRIP_DETECTION_ID_OVERLAP,
+                    self.shard,
+                    self.shards,
+                )
+                new_points_count = sum(point.id > last_point_id for point in points)
+                if not new_points_count:
+                    points = []
+
+                changed_states = {}
+                events = []
+                for point in points:
+                    state = self.states.get(point.vehicle_id)
+                    if state is None:
+                        state = self.states[point.vehicle_id] = VehicleTripState(point.vehicle_id)
+                    last_date_time = state.last_date_time
+                    event = self.segmenter.feed(state, point.date_time, point.long, point.lat)
+                    if state.last_date_time is not last_date_time:
+                        changed_states[state.vehicle_id] = state
+                    if event is not None:
+                        events.append((state.vehicle_id, event))
+                if new_points_count < batch_size:
+                    # the detector is not behind, vehicles without points in the batch have no unread ones either
+                    self._close_idle_trips(changed_states, events)
+                if not points and not changed_states:
+                    return 0
+
+                await self._save_trips(events, changed_states.values())
+                await self.uow.vehicletripdetectionstate.upsert_many(
+                    [state.as_dict() for state in changed_states.values()]
+                )
+                if points:
+                    await self.uow.tripdetectioncursor.set_last_point_id(points[-1].id, self.shard, self.shards)
+                await self.uow.commit()
+        except Exception:
+            # states in memory may be ahead of the rolled back ones
+            self.states = None
+            raise
+        return new_points_count
+
+    def _close_idle_trips(self, changed_states: dict, events: list) -> None:
+        """
+        Closes open trips of vehicles without points for longer than TRIP_DETECTION_MAX_GAP, a vehicle which stopped
+        sending points would keep its trip open until its next point otherwise.
+        """
+        idle_before = datetime.now(tz=timezone.utc) - timedelta(seconds=settings.TRIP_DETECTION_MAX_GAP)
+        for state in self.states.values():
+            if state.has_open_trip and state.last_date_time < idle_before:
+                events.append((state.vehicle_id, self.segmenter.close(state)))
+                changed_states[state.vehicle_id] = state
+
+    async def get_start_point_id(self) -> int:
+        """Point id the first batch of the shard starts after, should be awaited inside of the uow block."""
+        if self.from_point_id is not None:
+            return self.from_point_id
+        return await self.uow.vehicletrackpoint.get_max_id()
+
+    async def _save_trips(self, events: list[tuple], changed_states) -> None:
+        """
+        Inserts new trips, moves finishes of open ones and drops discarded ones, should be awaited inside of the uow
+        block. Summaries are computed for closed trips and dropped for open ones, they change with every batch.
+        """
+        new_trips = []
+        new_trips_states = []
+        trips_finishes = {}
+        closed_trip_ids = []
+        discarded_trip_ids = []
+        for vehicle_id, (kind, trip_id, start_date_time, finish_date_time) in events:
+            if kind == TRIP_OPENED:
+                continue  # saved with the other open trips below
+            if kind == TRIP_DISCARDED:
+                if trip_id is not None:
+                    discarded_trip_ids.append(trip_id)
+            elif trip_id is None:
+                # opened and closed by the same batch
+                new_trips.append(
+                    {"vehicle_id": vehicle_id, "start_date_time": start_date_time, "finish_date_time": finish_date_time}
+                )
+                new_trips_states.append(None)
+            else:
+                trips_finishes[trip_id] = finish_date_time
+                closed_trip_ids.append(trip_id)
+
+        open_trip_ids = []
+        for state in changed_states:
+            if not state.has_open_trip:
+                continue
+            if state.trip_id is None:
+                new_trips.append(
+                    {
+                        "vehicle_id": state.vehicle_id,
+                        "start_date_time": state.trip_start_date_time,
+                        "finish_date_time": state.trip_last_moving_date_time,
+                    }
+                )
+                new_trips_states.append(state)
+            else:
+                trips_finishes[state.trip_id] = state.trip_last_moving_date_time
+                open_trip_ids.append(state.trip_id)
+
+        for trip_id, state in zip(await self.uow.trip.add_many(new_trips), new_trips_states):
+            if state is None:
+                closed_trip_ids.append(trip_id)
+            else:
+                state.trip_id = trip_id
+        await self.uow.trip.update_finishes(trips_finishes)
+        await self.uow.trip.delete_many(discarded_trip_ids)
+        await self.uow.tripsummary.delete_by_trips(open_trip_ids)
+        if closed_trip_ids:
+            await self.uow.tripsummary.summarize(closed_trip_ids)
+
+    async def backfill(
+        self,
+        from_date_time: datetime,
+        till_date_time: datetime,
+        vehicle_ids: list = None,
+        replace: bool = False,
+        till_point_id: int = None,
+    ) -> int:
+        """
+        Detects trips of the vehicles (all when vehicle_ids is None) from their points in the range, a trip open at
+        the end of the range is closed there. With replace trips starting in the range are removed first. Returns the
+        number of saved trips. Intended for history before the live detector was started, points after its start
+        point (till_point_id) are left to the detector.
+        """
+        if vehicle_ids is None:
+            async with self.uow:
+                vehicle_ids = [vehicle.id for vehicle in await self.uow.vehicle.find_all(with_relations=False)]
+
+        trips_count = 0
+        for vehicle_id in vehicle_ids:
+            async with self.uow:
+                if replace:
+                    await self.uow.trip.delete_by_vehicle_between(vehicle_id, from_date_time, till_date_time)
+                state = VehicleTripState(vehicle_id)
+                events = []
+                async for point in self.uow.vehicletrackpoint.stream_coordinates_by_vehicle(
+                    vehicle_id, from_date_time, till_date_time, till_point_id
+                ):
+                    event = self.segmenter.feed(state, point.date_time, point.long, point.lat)
+                    if event is not None:
+                        events.append(event)
+                if state.has_open_trip:
+                    events.append(self.segmenter.close(state))
+
+                trip_ids = await self.uow.trip.add_many(
+                    [
+                        {"vehicle_id": vehicle_id, "start_date_time": start, "finish_date_time": finish}
+                        for kind, _, start, finish in events
+                        if kind == TRIP_CLOSED
+                    ]
+                )
+                if trip_ids:
+                    await self.uow.tripsummary.summarize(trip_ids)
+                await self.uow.commit()
+            trips_count += len(trip_ids)
+        return trips_count
@@ -1,14 +1,17 @@
+import asyncio
 from datetime import datetime
+from pathlib import Path
+from typing import AsyncIterator, Callable
 
 import folium
 from fastapi.exceptions import ValidationException
+from sqlalchemy.exc import NoResultFound
 
 from app.api.schemas.trip import (
     TripCreate,
     TripFromDB,
     TripFromDBWithExtraData,
     TripPointsForMap,
-    get_address_by_point,
 )
 from app.api.schemas.user import UserExtended
 from app.api.schemas.vehicle import VehicleFromDB
@@ -18,8 +21,13 @@ from app.api.schemas.vehicle_track_point import (
     from_geo_point_to_geojson,
     from_geo_point_to_lat_long,
 )
+from app.services.geocoding_service import GeocodingService
+from app.services.vehicle_service import VehicleTrackPointService
 from app.utils.auth import get_users_enterpises
-from app.utils.unitofwork import IUnitOfWork
+from app.utils.map_cache import map_cache, map_cache_key, render_executor
+from app.utils.pagination import CursorParams
+from app.utils.track_simplification import simplify_track_mask, simplify_track_points
+from app.utils.unitofwork import IUnitOfWork, UnitOfWork
 
 
 class TripService:
@@ -52,6 +60,7 @@ class TripService:
         async with self.uow:
             trip_from_db = await self.uow.trip.add_one(trip_dict)
             trip_to_return = TripFromDB.model_validate(trip_from_db)
+            await self.uow.tripsummary.summarize([trip_to_return.id])
 
             await self.uow.commit()
             return trip_to_return
@@ -61,11 +70,19 @@ class TripService:
         current_user: UserExtended = None,
         geojson: bool = False,
         vehicle_id: int = None,
-        from_date=None,
-        till_date=None,
+        from_date: str = None,
+        till_date: str = None,
+        cursor_params: CursorParams = None,
     ) -> list[TripFromDB]:
-        async with self.uow:
-            trips: list = await self.uow.trip.find_all()
+        if not current_user:
+            return None
+
+        async with self.uow.read_only():
+            # trips are filtered like track points: local dates of the enterprise of each vehicle
+            filter_set, allowed_objects = await VehicleTrackPointService(self.uow).get_track_points_filters(
+                current_user, vehicle_id, from_date, till_date
+            )
+            trips: list = await self.uow.trip.find_all_with_filters(filter_set, allowed_objects, cursor_params)
             return [TripFromDB.model_validate(trip) for trip in trips]
 
     async def retrieve_trip(
@@ -80,37 +97,70 @@ class TripService:
             trip = await self.uow.trip.find_one(trip_id)
             return TripFromDB.model_validate(trip)
 
-    async def get_trips_points_by_vehicle(
+    async def _get_trips_points_filters(
         self,
         current_user: UserExtended,
         vehicle_id: int,
         from_date: datetime,
         till_date: datetime,
-        geojson: bool = False,
-    ) -> list[VehicleTrackPoint | VehicleTrackPointGeoJSON]:
-        if not current_user:
-            return None
-
+    ) -> dict:
+        """Finds allowed trips of the vehicle, should be awaited inside of the uow block."""
         allowed_objects = get_users_enterpises(current_user)
         filter_set = {
             "vehicle_id": vehicle_id,
             "from_date": from_date,
             "till_date": till_date,
         }
-        async with self.uow:
-            if current_user.role == "manager" and allowed_objects.get("enterprise_id"):
-                trips: list = await self.uow.trip.find_all_with_filters(
-                    allowed_objects=allowed_objects, filter_set=filter_set
-                )
-            elif current_user.role == "admin":
-                trips: list = await self.uow.trip.find_all_with_filters(filter_set=filter_set)
-            else:
-                raise ValidationException({"enterprise_id": "You are not allowed to get objects for this enterprise"})
-            trips_date_time_dict = {"vehicle_id": vehicle_id}
-            for trip in trips:
-                trips_date_time_dict[f"date_time_{trip.id}"] = (trip.start_date_time, trip.finish_date_time)
-
-            track_points = await self.uow.vehicletrackpoint.find_all_between_datetimes(trips_date_time_dict)
+        if current_user.role == "manager" and allowed_objects.get("enterprise_id"):
+            trips: list = await self.uow.trip.find_all_with_filters(
+                allowed_objects=allowed_objects, filter_set=filter_set
+            )
+        elif current_user.role == "admin":
+            trips: list = await self.uow.trip.find_all_with_filters(filter_set=filter_set)
+        else:
+            raise ValidationException({"enterprise_id": "You are not allowed to get objects for this enterprise"})
+        trips_date_time_dict = {"vehicle_id": vehicle_id}
+        for trip in trips:
+            trips_date_time_dict[f"date_time_{trip.id}"] = (trip.start_date_time, trip.finish_date_time)
+        return trips_date_time_dict
+
+    async def _find_track_points(
+        self, trips_date_time_dict: dict, simplify_tolerance: float = None, max_points: int = None
+    ) -> list:
+        """
+        Track points of the trips, simplified per trip when a tolerance or max_points is given, should be awaited
+        inside of the uow block.
+        """
+        track_points = await self.uow.vehicletrackpoint.find_all_between_datetimes(trips_date_time_dict)
+        if simplify_tolerance is None and max_points is None:
+            return track_points
+        trips_starts = [
+            date_times[0] for name, date_times in trips_date_time_dict.items() if name.startswith("date_time_")
+        ]
+        return await asyncio.to_thread(
+            simplify_track_points, track_points, trips_starts, simplify_tolerance, max_points
+        )
+
+    async def get_trips_points_by_vehicle(
+        self,
+        current_user: UserExtended,
+        vehicle_id: int,
+        from_date: datetime,
+        till_date: datetime,
+        geojson: bool = False,
+        simplify_tolerance: float = None,
+        max_points: int = None,
+    ) -> list[VehicleTrackPoint | VehicleTrackPointGeoJSON]:
+        """
+        Tracks of the trips are simplified with simplify_tolerance metres and max_points points of all trips, the
+        first and the last points of every trip are kept.
+        """
+        if not current_user:
+            return None
+
+        async with self.uow.read_only():
+            trips_date_time_dict = await self._get_trips_points_filters(current_user, vehicle_id, from_date, till_date)
+            track_points = await self._find_track_points(trips_date_time_dict, simplify_tolerance, max_points)
 
             list_to_return = []
             serializer = from_geo_point_to_lat_long if not geojson else from_geo_point_to_geojson
@@ -119,6 +169,40 @@ class TripService:
                 list_to_return.append(tp)
             return list_to_return
 
+    async def stream_trips_points_by_vehicle(
+        self,
+        current_user: UserExtended,
+        vehicle_id: int,
+        from_date: datetime,
+        till_date: datetime,
+        geojson: bool = False,
+        simplify_tolerance: float = None,
+        max_points: int = None,
+    ) -> AsyncIterator[VehicleTrackPoint | VehicleTrackPointGeoJSON]:
+        """
+        Streaming variant of get_trips_points_by_vehicle, access is checked before the iterator is returned.
+        A simplified track needs all points of a trip, so they are loaded before the first one is sent.
+        """
+        if not current_user:
+            return None
+
+        async with self.uow.read_only():
+            trips_date_time_dict = await self._get_trips_points_filters(current_user, vehicle_id, from_date, till_date)
+
+        serializer = from_geo_point_to_lat_long if not geojson else from_geo_point_to_geojson
+
+        async def track_points_stream():
+            async with self.uow.read_only():
+                if simplify_tolerance is not None or max_points is not None:
+                    track_points = await self._find_track_points(trips_date_time_dict, simplify_tolerance, max_points)
+                    for tp_db in track_points:
+                        yield serializer(tp_db)
+                    return
+                async for tp_db in self.uow.vehicletrackpoint.stream_all_between_datetimes(trips_date_time_dict):
+                    yield serializer(tp_db)
+
+        return track_points_stream()
+
     async def get_trips_by_vehicle(
         self,
         current_user: UserExtended,
@@ -136,70 +220,117 @@ class TripService:
             "from_date": from_date,
             "till_date": till_date,
         }
-        async with self.uow:
-            if current_user.role == "manager" and allowed_objects.get("enterprise_id"):
-                trips: list = await self.uow.trip.find_all_with_filters(
-                    allowed_objects=allowed_objects, filter_set=filter_set
-                )
-            elif current_user.role == "admin":
-                trips: list = await self.uow.trip.find_all_with_filters(filter_set=filter_set)
-            else:
-                raise ValidationException({"enterprise_id": "You are not allowed to get objects for this enterprise"})
-            trips_start_finish_dict = {}
-            for trip in trips:
-                trip_points = await self.uow.vehicletrackpoint.find_all_between_datetimes(
-                    {f"date_time_{trip.id}": (trip.start_date_time, trip.finish_date_time)}
-                )
-                trips_start_finish_dict[trip.id] = (trip_points[0], trip_points[-1]) if trip_points else ()
+        if current_user.role == "admin":
+            allowed_objects = None
+        elif current_user.role != "manager" or not allowed_objects.get("enterprise_id"):
+            raise ValidationException({"enterprise_id": "You are not allowed to get objects for this enterprise"})
 
-            list_to_return = []
-            for trip_db in trips:
-
-                start_point_ser = from_geo_point_to_lat_long(trips_start_finish_dict[trip_db.id][0])
-                start_point_coords = (start_point_ser.lat, start_point_ser.long)
-                finish_point_ser = from_geo_point_to_lat_long(trips_start_finish_dict[trip_db.id][1])
-                finish_point_coords = (finish_point_ser.lat, finish_point_ser.long)
-
-                trip_to_represent = TripFromDBWithExtraData(
-                    id=trip_db.id,
-                    start_date_time=trip_db.start_date_time,
-                    finish_date_time=trip_db.finish_date_time,
-                    start_point_geo=start_point_coords,
-                    finish_point_geo=finish_point_coords,
-                    start_address=get_address_by_point(start_point_coords),
-                    finish_address=get_address_by_point(finish_point_coords),
-                )
-                list_to_return.append(trip_to_represent)
-            return list_to_return
+        trips_to_represent = await self._find_summarized_trips(
+            filter_set, allowed_objects, self._trip_with_summary_to_represent
+        )
+
+        # trips without points are not shown
+        trips_to_represent = sorted(
+            (trip for trip in trips_to_represent if trip is not None), key=lambda trip: (trip.start_date_time, trip.id)
+        )
+
+        # addresses are resolved after the session is released, geocoding may be slow
+        points_coords = [trip.start_point_geo for trip in trips_to_represent]
+        points_coords += [trip.finish_point_geo for trip in trips_to_represent]
+        addresses = await GeocodingService(self.uow).get_addresses(points_coords)
+        for trip_to_represent in trips_to_represent:
+            trip_to_represent.start_address = addresses[trip_to_represent.start_point_geo]
+            trip_to_represent.finish_address = addresses[trip_to_represent.finish_point_geo]
+        return trips_to_represent
+
+    async def _find_summarized_trips(self, filter_set: dict, allowed_objects: dict, convert: Callable) -> list:
+        """
+        convert(trip_db) of the filtered trips, trip_db.summary is loaded. Trips created before summaries existed or
+        whose summaries were dropped by late points are summarized on the primary first.
+        """
+        async with self.uow.read_only():
+            trips: list = await self.uow.trip.find_all_with_summary(filter_set, allowed_objects)
+            not_summarized_trip_ids = [trip_db.id for trip_db in trips if trip_db.summary is None]
+            converted = [convert(trip_db) for trip_db in trips if trip_db.summary is not None]
+
+        if not_summarized_trip_ids:
+            async with self.uow:
+                await self.uow.tripsummary.summarize(not_summarized_trip_ids)
+                await self.uow.commit()
+                trips = await self.uow.trip.find_all_with_summary({"trip_ids": not_summarized_trip_ids})
+                converted += [convert(trip_db) for trip_db in trips]
+        return converted
+
+    @staticmethod
+    def _trip_with_summary_to_represent(trip_db) -> TripFromDBWithExtraData | None:
+        """None for trips not summarized yet or without track points."""
+        summary = trip_db.summary
+        if summary is None or not summary.points_count:
+            return None
+        return TripFromDBWithExtraData(
+            id=trip_db.id,
+            start_date_time=trip_db.start_date_time,
+            finish_date_time=trip_db.finish_date_time,
+            start_point_geo=(summary.start_lat, summary.start_long),
+            finish_point_geo=(summary.finish_lat, summary.finish_long),
+            points_count=summary.points_count,
+            distance_km=summary.distance_km,
+            duration_seconds=summary.duration_seconds,
+            max_speed_kmh=summary.max_speed_kmh,
+            avg_speed_kmh=summary.avg_speed_kmh,
+            bbox=(summary.bbox_min_lat, summary.bbox_min_long, summary.bbox_max_lat, summary.bbox_max_long),
+        )
 
-    async def create_map(self, vehicle_id: int, trip_ids: TripPointsForMap) -> None:
+    async def create_map(self, vehicle_id: int, trip_ids: TripPointsForMap, simplify_tolerance: float = None) -> bytes:
+        """
+        HTML of the rendered map of the trips. Files are keyed by the trips and the times their summaries were
+        computed, summaries are recomputed when trips get new points, so a repeated view is served from the file.
+        Tracks are simplified with simplify_tolerance metres before rendering.
+        """
         filter_set = {
             "vehicle_id": vehicle_id,
             "trip_ids": list(map(int, trip_ids.trip_ids)),
         }
-        async with self.uow:
-            trips = await self.uow.trip.find_all_with_filters(filter_set)
-            points_lists = []
-            for trip in trips:
-                trips_date_time_dict = {"vehicle_id": vehicle_id}
-                trips_date_time_dict[f"date_time_{trip.id}"] = (trip.start_date_time, trip.finish_date_time)
-                track_points = await self.uow.vehicletrackpoint.find_all_between_datetimes(trips_date_time_dict)
-                serializer = from_geo_point_to_lat_long
-                points_list = []
-                for tp_db in track_points:
-                    tp = serializer(tp_db)
-                    points_list.append(tp)
-                points_lists.append(points_list)
-
-        route_map = folium.Map(location=[points_lists[0][0].lat, points_lists[0][0].long], zoom_start=15)
-        all_coords = []
-        for points in points_lists:
-            coords = []
-            for point in points:
-                coords.append([point.lat, point.long])
-            all_coords.append(coords)
-        folium.PolyLine(locations=all_coords, radius=5, color="red", weight=5, opacity=1).add_to(route_map)
-        f = open("map.html", "w")
-        f.close()
-        route_map.save("/code/map.html")
-        return route_map
+        trips = await self._find_summarized_trips(
+            filter_set,
+            None,
+            lambda trip_db: (
+                trip_db.id,
+                trip_db.start_date_time,
+                trip_db.finish_date_time,
+                trip_db.summary.points_count,
+                trip_db.summary.updated_at,
+            ),
+        )
+        trips = sorted(trip for trip in trips if trip[3])
+        if not trips:
+            raise NoResultFound("Trips with track points were not found")
+
+        async def render(path: Path) -> None:
+            # the rendering is shared with other requests and outlives this one, it must not use the request session
+            uow = UnitOfWork()
+            async with uow.read_only():
+                coords_lists = []
+                for trip_id, start_date_time, finish_date_time, *_ in trips:
+                    trips_date_time_dict = {"vehicle_id": vehicle_id}
+                    trips_date_time_dict[f"date_time_{trip_id}"] = (start_date_time, finish_date_time)
+                    track_points = await uow.vehicletrackpoint.find_all_between_datetimes(trips_date_time_dict)
+                    coords_lists.append([[tp_db.lat, tp_db.long] for tp_db in track_points])
+            await asyncio.get_running_loop().run_in_executor(
+                render_executor, _render_route_map, coords_lists, path, simplify_tolerance
+            )
+
+        return await map_cache.read_or_create(map_cache_key("trip_map", vehicle_id, simplify_tolerance, *trips), render)
+
+
+def _render_route_map(coords_lists: list[list], path: Path, simplify_tolerance: float = None) -> None:
+    if simplify_tolerance:
+        simplified_coords_lists = []
+        for coords_list in coords_lists:
+            lats, longs = zip(*coords_list) if coords_list else ((), ())
+            keep = simplify_track_mask(longs, lats, simplify_tolerance)
+            simplified_coords_lists.append([coords for coords, kept in zip(coords_list, keep) if kept])
+        coords_lists = simplified_coords_lists
+    route_map = folium.Map(location=next(coords[0] for coords in coords_lists if coords), zoom_start=15)
+    folium.PolyLine(locations=coords_lists, radius=5, color="red", weight=5, opacity=1).add_to(route_map)
+    route_map.save(str(path))
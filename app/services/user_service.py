@@ -1,4 +1,5 @@
 from app.api.schemas.user import UserCreate, UserExtended, UserFromDB, UserLogin
+from app.utils.auth import invalidate_principals, principal_cache
 from app.utils.unitofwork import IUnitOfWork
 
 
@@ -13,13 +14,22 @@ class UserService:
             user_to_return = UserFromDB.model_validate(user_from_db)
 
             await self.uow.commit()
-            return user_to_return
+        invalidate_principals(user_to_return.username)
+        return user_to_return
 
     async def get_user_by_username(self, username: str) -> UserExtended:
         async with self.uow:
-            user = await self.uow.user.find_one_by_username(username)
+            user = await self.uow.user.find_principal_by_username(username)
             return UserExtended.model_validate(user)
 
+    async def get_principal(self, username: str) -> UserExtended:
+        """Authenticated user for the token subject, served from principal_cache while it is fresh."""
+        principal = principal_cache.get(username)
+        if principal is None:
+            principal = await self.get_user_by_username(username)
+            principal_cache.set(username, principal)
+        return principal
+
     async def get_user_by_username_for_login(self, username: str) -> UserLogin:
         async with self.uow:
             user = await self.uow.user.find_one_by_username(username)
@@ -1,9 +1,11 @@
-import math
-from datetime import datetime
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import AsyncIterator
 
 from fastapi.exceptions import ValidationException
 from pytz import timezone
 
+from app.api.schemas.schema_mixin import SchemaMixin
 from app.api.schemas.user import UserExtended
 from app.api.schemas.vehicle import VehicleCreate, VehicleFromDB, VehiclePartialUpdate, VehicleNamesFromDB
 from app.api.schemas.vehicle_brand import (
@@ -20,15 +22,25 @@ from app.api.schemas.vehicle_model import (
 from app.api.schemas.vehicle_track_point import (
     VehicleCreateTrackPoint,
     VehicleCreateTrackPointGeo,
+    VehicleInPolygon,
+    VehiclesInPolygonQuery,
     VehicleTrackPoint,
+    VehicleTrackPointBulkResult,
     VehicleTrackPointGeoFromDB,
     VehicleTrackPointGeoJSON,
     from_geo_point_to_geojson,
     from_geo_point_to_lat_long,
 )
+from app.core.config import settings
 from app.utils.auth import get_users_enterpises
-from app.utils.pagination import PagedResponseSchema, PageParams
-from app.utils.unitofwork import IUnitOfWork
+from app.utils.datetime_utils import localize_datetime
+from app.utils.lru import TTLCache
+from app.utils.map_cache import etag_matches, map_cache_key, tile_cache
+from app.utils.pagination import CursorParams, PagedResponseSchema, PageParams, count_total, get_paged_response
+from app.utils.unitofwork import IUnitOfWork, UnitOfWork
+
+# filters and data version of track tiles per user scope and filters, shared by the tiles of a viewport
+tile_version_cache = TTLCache(maxsize=1024, ttl=settings.TILE_VERSION_CACHE_TTL)
 
 
 class VehicleBrandService:
@@ -179,7 +191,9 @@ class VehicleService:
 
     async def get_vehicles_names(self, enterprise_id: int) -> list[VehicleNamesFromDB]:
         async with self.uow:
-            vehicles = await self.uow.vehicle.find_all_filter_by_enterprise({"enterprise_id": [enterprise_id]})
+            vehicles = await self.uow.vehicle.find_all_filter_by_enterprise(
+                {"enterprise_id": [enterprise_id]}, with_relations=False
+            )
             list_to_return = []
             for vehicle in vehicles:
                 list_to_return.append(VehicleNamesFromDB(id=vehicle.id, vehicle_name=str(vehicle)))
@@ -202,17 +216,17 @@ class VehicleService:
                 allowed_objects = None
             elif current_user.role == "manager" and allowed_objects.get("enterprise_id") is None:
                 raise ValidationException({"enterprise_id": "You are not allowed to get vehicles for this enterprise"})
-            vehicles: list = await self.uow.vehicle.find_all_with_brandmodel_filter_by_enterprise(allowed_objects)
-            from_index = page_params.page * page_params.size
-            to_index = (page_params.page + 1) * page_params.size
-            return PagedResponseSchema(
-                total=math.ceil(len(vehicles) / page_params.size) - 1,
-                page=page_params.page,
-                size=page_params.size,
-                results=[
+            vehicles: list = await self.uow.vehicle.find_all_with_brandmodel_filter_by_enterprise(
+                allowed_objects, page_params
+            )
+            total_count = await count_total(self.uow.vehicle, allowed_objects)
+            return get_paged_response(
+                [
                     VehicleFromDB.model_validate_datetime_with_tz(vehicle, vehicle.enterprise.company_timezone.value)
-                    for vehicle in vehicles[from_index:to_index]
+                    for vehicle in vehicles
                 ],
+                page_params,
+                total_count,
             )
 
     async def retrieve_vehicles(self, vehicle_id: int, current_user: UserExtended = None) -> VehicleFromDB:
@@ -280,8 +294,7 @@ class VehicleService:
                 )
             company_tz = vehicle.enterprise.company_timezone.value
 
-        vehicle_dict: dict = vehicle_data.model_dump_with_tz_align(tz=company_tz, exclude_unset=True)
-        async with self.uow:
+            vehicle_dict: dict = vehicle_data.model_dump_with_tz_align(tz=company_tz, exclude_unset=True)
             vehicle_from_db = await self.uow.vehicle.update_one(vehicle_id, vehicle_dict)
             vehicle_from_db_with_join = await self.uow.vehicle.find_one(vehicle_from_db.id)
             vehicle_to_return = VehicleFromDB.model_validate(vehicle_from_db_with_join)
@@ -299,7 +312,7 @@ class VehicleService:
 
         allowed_objects = get_users_enterpises(current_user)
         async with self.uow:
-            vehicle = await self.uow.vehicle.find_one(vehicle_id)
+            vehicle = await self.uow.vehicle.find_one(vehicle_id, with_relations=False)
 
             if current_user.role not in ["admin", "manager"] or (
                 current_user.role == "manager"
@@ -310,7 +323,6 @@ class VehicleService:
                     {"enterprise_id": "You are not allowed to delete a vehicle for this enterprise"}
                 )
 
-        async with self.uow:
             vehicle_from_db = await self.uow.vehicle.delete_one(vehicle_id)
             vehicle_to_return = VehicleFromDB.model_validate(vehicle_from_db)
 
@@ -332,22 +344,6 @@ class VehicleTrackPointService:
 
         allowed_objects = get_users_enterpises(current_user)
 
-        async with self.uow:
-            vehicle_from_db = await self.uow.vehicle.find_one(vehicle_track_point_data.vehicle_id)
-            vehicle_repr = VehicleFromDB.model_validate(vehicle_from_db)
-
-        if current_user.role not in ["admin", "manager"] or (
-            current_user.role == "manager" and vehicle_repr.enterprise_id not in allowed_objects["enterprise_id"]
-        ):
-            raise ValidationException(
-                {
-                    "vehicle_id": (
-                        "You are not allowed to create a track point for this vehicle. "
-                        "The vehicle does not belong to your enterprise"
-                    )
-                }
-            )
-
         vehicle_track_point_geo_data = VehicleCreateTrackPointGeo(
             date_time=vehicle_track_point_data.date_time,
             geotag=f"POINT({vehicle_track_point_data.long} {vehicle_track_point_data.lat})",
@@ -357,12 +353,149 @@ class VehicleTrackPointService:
         vehicle_tp_dict: dict = vehicle_track_point_geo_data.model_dump()  # add Mixin to align timezone
 
         async with self.uow:
-            vehicle_track_point_created = await self.uow.vehicletrackpoint.add_one(vehicle_tp_dict)
+            vehicle_from_db = await self.uow.vehicle.find_one(vehicle_track_point_data.vehicle_id)
+            vehicle_repr = VehicleFromDB.model_validate(vehicle_from_db)
+
+            if current_user.role not in ["admin", "manager"] or (
+                current_user.role == "manager" and vehicle_repr.enterprise_id not in allowed_objects["enterprise_id"]
+            ):
+                raise ValidationException(
+                    {
+                        "vehicle_id": (
+                            "You are not allowed to create a track point for this vehicle. "
+                            "The vehicle does not belong to your enterprise"
+                        )
+                    }
+                )
+
+            vehicle_track_point_created = await self.uow.vehicletrackpoint.add_one(
+                vehicle_tp_dict, with_relations=False
+            )
             track_point_to_return = VehicleTrackPointGeoFromDB.model_validate(vehicle_track_point_created)
+            await self._mark_track_points_added(
+                [(vehicle_track_point_data.vehicle_id, vehicle_track_point_data.date_time)],
+                {vehicle_repr.id: vehicle_repr.enterprise_id},
+            )
             await self.uow.commit()
 
             return track_point_to_return
 
+    async def add_vehicle_track_points(
+        self,
+        vehicle_track_points_data: list[VehicleCreateTrackPoint],
+        current_user: UserExtended = None,
+    ) -> VehicleTrackPointBulkResult:
+        if not current_user:
+            return None
+
+        allowed_objects = get_users_enterpises(current_user)
+        vehicle_ids = sorted({track_point.vehicle_id for track_point in vehicle_track_points_data})
+        if not vehicle_ids:
+            return VehicleTrackPointBulkResult(inserted=0, vehicle_ids=[])
+
+        async with self.uow:
+            # permissions are checked once per distinct vehicle of the batch
+            vehicles_enterprises = await self.uow.vehicle.find_enterprise_ids(vehicle_ids)
+            not_allowed_vehicle_ids = [
+                vehicle_id
+                for vehicle_id in vehicle_ids
+                if vehicle_id not in vehicles_enterprises
+                or current_user.role == "manager"
+                and vehicles_enterprises[vehicle_id] not in allowed_objects["enterprise_id"]
+            ]
+            if current_user.role not in ["admin", "manager"] or not_allowed_vehicle_ids:
+                raise ValidationException(
+                    {
+                        "vehicle_id": (
+                            "You are not allowed to create track points for vehicles "
+                            f"{not_allowed_vehicle_ids or vehicle_ids}. "
+                            "The vehicles do not exist or do not belong to your enterprise"
+                        )
+                    }
+                )
+
+            await self.uow.vehicletrackpoint.add_many(
+                [
+                    {
+                        "date_time": track_point.date_time,
+                        "geotag": f"POINT({track_point.long} {track_point.lat})",
+                        "vehicle_id": track_point.vehicle_id,
+                    }
+                    for track_point in vehicle_track_points_data
+                ]
+            )
+            await self._mark_track_points_added(
+                [(track_point.vehicle_id, track_point.date_time) for track_point in vehicle_track_points_data],
+                vehicles_enterprises,
+            )
+            await self.uow.commit()
+
+        return VehicleTrackPointBulkResult(inserted=len(vehicle_track_points_data), vehicle_ids=vehicle_ids)
+
+    async def _mark_track_points_added(self, vehicles_date_times: list[tuple], vehicles_enterprises: dict) -> None:
+        """
+        Updates day watermarks (report cache), drops daily mileage rows of closed days that got late points and
+        summaries of trips overlapping the points, should be awaited inside of the uow block. A point changes the
+        segment ending at it and the one starting from it, so the next day is marked too.
+        """
+        from main import SERVER_TIME_ZONE
+
+        enterprise_timezones = await self.uow.enterprise.find_timezones(
+            [enterprise_id for enterprise_id in set(vehicles_enterprises.values()) if enterprise_id is not None]
+        )
+        vehicle_days = set()
+        closed_vehicle_days = set()
+        vehicles_ranges = {}
+        for vehicle_id, date_time in vehicles_date_times:
+            local_tz = timezone(enterprise_timezones.get(vehicles_enterprises.get(vehicle_id), "UTC"))
+            if date_time.tzinfo is None:
+                date_time = timezone(SERVER_TIME_ZONE).localize(date_time)
+            first_date_time, last_date_time = vehicles_ranges.get(vehicle_id, (date_time, date_time))
+            vehicles_ranges[vehicle_id] = (min(first_date_time, date_time), max(last_date_time, date_time))
+            day = date_time.astimezone(local_tz).date()
+            days = {(vehicle_id, day), (vehicle_id, day + timedelta(days=1))}
+            vehicle_days.update(days)
+            if day < datetime.now(tz=local_tz).date():
+                closed_vehicle_days.update(days)
+        await self.uow.vehicledaywatermark.touch(vehicle_days)
+        await self.uow.vehicledailymileage.delete_days(closed_vehicle_days)
+        await self.uow.tripsummary.delete_by_vehicles_ranges(vehicles_ranges)
+
+    async def get_track_points_filters(
+        self,
+        current_user: UserExtended,
+        vehicle_id: int = None,
+        from_date: str = None,
+        till_date: str = None,
+    ) -> tuple[dict, dict | None]:
+        """
+        Checks the access and builds repository filters of track points and trips,
+        should be awaited inside of the uow block.
+        """
+        from main import SERVER_TIME_ZONE
+
+        allowed_objects = get_users_enterpises(current_user)
+        filter_set = {"vehicle_id": vehicle_id}
+        if current_user.role == "manager" and allowed_objects.get("enterprise_id"):
+            enterprise_ids = allowed_objects["enterprise_id"]
+        elif current_user.role == "admin":
+            allowed_objects = enterprise_ids = None
+        else:
+            raise ValidationException({"enterprise_id": "You are not allowed to get objects for this enterprise"})
+
+        if from_date and till_date:
+            from_date_loc = datetime.strptime(from_date, "%Y-%m-%d %H:%M:%S")
+            till_date_loc = datetime.strptime(till_date, "%Y-%m-%d %H:%M:%S")
+            enterprise_timezones = await self.uow.enterprise.find_timezones(enterprise_ids, vehicle_id)
+            filter_set["date_time_by_enterprise"] = {
+                enterprise_id: (
+                    localize_datetime(from_date_loc, enterprize_tz, SERVER_TIME_ZONE),
+                    localize_datetime(till_date_loc, enterprize_tz, SERVER_TIME_ZONE),
+                )
+                for enterprise_id, enterprize_tz in enterprise_timezones.items()
+            }
+        return filter_set, allowed_objects
+
     async def get_vehicle_track_points(
         self,
         current_user: UserExtended = None,
@@ -370,52 +503,62 @@ class VehicleTrackPointService:
         vehicle_id: int = None,
         from_date: str = None,
         till_date: str = None,
+        cursor_params: CursorParams = None,
+        spatial_filter_set: dict = None,
     ) -> list[VehicleTrackPoint | VehicleTrackPointGeoJSON]:
-        from main import SERVER_TIME_ZONE
-
         if not current_user:
             return None
 
-        allowed_objects = get_users_enterpises(current_user)
-        filter_set = {
-            "vehicle_id": vehicle_id,
-            "from_date": from_date,
-            "till_date": till_date,
-        }
-        async with self.uow:
-            if current_user.role == "manager" and allowed_objects.get("enterprise_id"):
-                track_points: list = await self.uow.vehicletrackpoint.find_all_with_filters(
-                    allowed_objects=allowed_objects, filter_set=filter_set
-                )
-            elif current_user.role == "admin":
-                track_points: list = await self.uow.vehicletrackpoint.find_all_with_filters(filter_set=filter_set)
-            else:
-                raise ValidationException({"enterprise_id": "You are not allowed to get objects for this enterprise"})
+        async with self.uow.read_only():
+            filter_set, allowed_objects = await self.get_track_points_filters(
+                current_user, vehicle_id, from_date, till_date
+            )
+            filter_set.update(spatial_filter_set or {})
+            track_points: list = await self.uow.vehicletrackpoint.find_all_with_filters(
+                allowed_objects=allowed_objects, filter_set=filter_set, cursor_params=cursor_params
+            )
 
-            if from_date and till_date:
-                from_date_loc = datetime.strptime(from_date, "%Y-%m-%d %H:%M:%S")
-                till_date_loc = datetime.strptime(till_date, "%Y-%m-%d %H:%M:%S")
             list_to_return = []
             serializer = from_geo_point_to_lat_long if not geojson else from_geo_point_to_geojson
             for tp_db in track_points:
-                enterprize_tz = tp_db.vehicle.enterprise.company_timezone.value
-                if from_date and till_date:
-                    from_date_utc = (
-                        timezone(enterprize_tz).localize(from_date_loc).astimezone(tz=timezone(SERVER_TIME_ZONE))
-                    )
-                    till_date_utc = (
-                        timezone(enterprize_tz).localize(till_date_loc).astimezone(tz=timezone(SERVER_TIME_ZONE))
-                    )
-                if (
-                    from_date
-                    and till_date
-                    and from_date_utc <= tp_db.date_time <= till_date_utc
-                    or not (from_date and till_date)
-                ):
-                    tp = serializer(tp_db, tz=enterprize_tz)
-                    list_to_return.append(tp)
+                tp = serializer(tp_db, tz=tp_db.vehicle.enterprise.company_timezone.value)
+                list_to_return.append(tp)
             return list_to_return
 
+    async def stream_vehicle_track_points(
+        self,
+        current_user: UserExtended = None,
+        geojson: bool = False,
+        vehicle_id: int = None,
+        from_date: str = None,
+        till_date: str = None,
+        cursor_params: CursorParams = None,
+        spatial_filter_set: dict = None,
+    ) -> AsyncIterator[VehicleTrackPoint | VehicleTrackPointGeoJSON]:
+        """
+        Same as get_vehicle_track_points, but returns an async iterator reading the points through a server side
+        cursor. Access is checked before the iterator is returned, so errors are raised before the response starts.
+        """
+        if not current_user:
+            return None
+
+        async with self.uow.read_only():
+            filter_set, allowed_objects = await self.get_track_points_filters(
+                current_user, vehicle_id, from_date, till_date
+            )
+            filter_set.update(spatial_filter_set or {})
+
+        serializer = from_geo_point_to_lat_long if not geojson else from_geo_point_to_geojson
+
+        async def track_points_stream():
+            async with self.uow.read_only():
+                async for tp_db in self.uow.vehicletrackpoint.stream_all_with_filters(
+                    allowed_objects=allowed_objects, filter_set=filter_set, cursor_params=cursor_params
+                ):
+                    yield serializer(tp_db, tz=tp_db.vehicle.enterprise.company_timezone.value)
+
+        return track_points_stream()
+
     async def retrieve_vehicle_track_point(
         self,
         track_point_id: int,
@@ -426,7 +569,7 @@ class VehicleTrackPointService:
             return None
 
         allowed_objects = get_users_enterpises(current_user)
-        async with self.uow:
+        async with self.uow.read_only():
             if current_user.role == "manager" and allowed_objects.get("enterprise_id"):
                 track_point = await self.uow.vehicletrackpoint.find_one_by_eneterprise(track_point_id, allowed_objects)
             elif current_user.role == "admin":
@@ -436,3 +579,126 @@ class VehicleTrackPointService:
 
             serializer = from_geo_point_to_lat_long if not geojson else from_geo_point_to_geojson
             return serializer(track_point, tz=track_point.vehicle.enterprise.company_timezone.value)
+
+    @staticmethod
+    def _filter_by_enterprise(filter_set: dict, allowed_objects: dict | None, enterprise_id: int = None) -> list | None:
+        """Narrows the filters to one of the allowed enterprises, returns ids of the enterprises in scope."""
+        enterprise_ids = None if allowed_objects is None else allowed_objects["enterprise_id"]
+        if enterprise_id is None:
+            return enterprise_ids
+        if enterprise_ids is not None and enterprise_id not in enterprise_ids:
+            raise ValidationException({"enterprise_id": "You are not allowed to get objects for this enterprise"})
+        filter_set["enterprise_id"] = enterprise_id
+        return [enterprise_id]
+
+    async def find_vehicles_in_polygon(
+        self, current_user: UserExtended, query: VehiclesInPolygonQuery
+    ) -> list[VehicleInPolygon]:
+        """Vehicles having points inside of the polygon in the range, times are local to their enterprises."""
+        if not current_user:
+            return None
+
+        async with self.uow.read_only():
+            filter_set, allowed_objects = await self.get_track_points_filters(
+                current_user, None, query.from_date, query.till_date
+            )
+            self._filter_by_enterprise(filter_set, allowed_objects, query.enterprise_id)
+            filter_set["polygon"] = query.polygon_wkt
+            rows = await self.uow.vehicletrackpoint.find_vehicles_by_filters(filter_set, allowed_objects)
+
+        vehicles = []
+        for vehicle_id, first_date_time, last_date_time, points_count, company_timezone in rows:
+            tz = company_timezone.value if company_timezone is not None else "UTC"
+            vehicles.append(
+                VehicleInPolygon(
+                    vehicle_id=vehicle_id,
+                    first_date_time=SchemaMixin.to_user_timezone(first_date_time, tz),
+                    last_date_time=SchemaMixin.to_user_timezone(last_date_time, tz),
+                    points_count=points_count,
+                )
+            )
+        return vehicles
+
+    async def _get_tiles_version(
+        self, current_user: UserExtended, enterprise_id: int, vehicle_id: int, from_date: str, till_date: str
+    ) -> tuple[dict, dict | None, str]:
+        """
+        Filters of track tiles and the version of their data, cached for TILE_VERSION_CACHE_TTL seconds, so the
+        tiles of a viewport and their revalidations read the watermarks once.
+        """
+        cache_key = (
+            current_user.role,
+            tuple(sorted(get_users_enterpises(current_user)["enterprise_id"])),
+            enterprise_id,
+            vehicle_id,
+            from_date,
+            till_date,
+        )
+        cached = tile_version_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        async with self.uow.read_only():
+            filter_set, allowed_objects = await self.get_track_points_filters(
+                current_user, vehicle_id, from_date, till_date
+            )
+            enterprise_ids = self._filter_by_enterprise(filter_set, allowed_objects, enterprise_id)
+            from_day = till_day = None
+            if filter_set.get("date_time_by_enterprise"):
+                # windows are in server time, watermark days are local to the enterprises, a day around covers both
+                windows = filter_set["date_time_by_enterprise"].values()
+                from_day = min(window[0] for window in windows).date() - timedelta(days=1)
+                till_day = max(window[1] for window in windows).date() + timedelta(days=1)
+            last_modified = await self.uow.vehicledaywatermark.find_last_modified_by_vehicles(
+                from_day, till_day, enterprise_ids, vehicle_id
+            )
+
+        version = map_cache_key(sorted(filter_set.items()), [tuple(row) for row in last_modified])
+        tile_version_cache.set(cache_key, (filter_set, allowed_objects, version))
+        return filter_set, allowed_objects, version
+
+    async def get_track_tile(
+        self,
+        current_user: UserExtended,
+        z: int,
+        x: int,
+        y: int,
+        enterprise_id: int = None,
+        vehicle_id: int = None,
+        from_date: str = None,
+        till_date: str = None,
+        if_none_match: str = None,
+    ) -> tuple[str, bytes | None]:
+        """
+        ETag and content of the vector tile of tracks, the content is None when if_none_match has the ETag. The ETag
+        is made of the filters and the day watermarks of the vehicles, so a tile is built again only after points
+        were added to its vehicles in the range.
+        """
+        if not current_user:
+            return None
+
+        filter_set, allowed_objects, version = await self._get_tiles_version(
+            current_user, enterprise_id, vehicle_id, from_date, till_date
+        )
+        tile_key = map_cache_key("track_tile", z, x, y, version)
+        etag = f'"{tile_key}"'
+        if etag_matches(if_none_match, etag):
+            return etag, None
+
+        async def build(path: Path) -> None:
+            # the build is shared with other requests and outlives this one, it must not use the request session
+            uow = UnitOfWork()
+            async with uow.read_only():
+                tile = await uow.vehicletrackpoint.find_tile(
+                    z,
+                    x,
+                    y,
+                    filter_set,
+                    allowed_objects,
+                    settings.TILE_EXTENT,
+                    settings.TILE_BUFFER,
+                    timedelta(seconds=settings.TILE_TRACK_MAX_GAP),
+                )
+            path.write_bytes(tile)
+
+        return etag, await tile_cache.read_or_create(tile_key, build)
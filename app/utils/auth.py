@@ -4,6 +4,9 @@ from fastapi.security import OAuth2PasswordBearer
 from jose import jwt
 from passlib.context import CryptContext
 
+from app.core.config import settings
+from app.utils.lru import TTLCache
+
 # to get a string like this run:
 # openssl rand -hex 32
 SECRET_KEY = "114c6f6cae0aab9de40352fd3e34b2d7c8f6bfc6815c8a373005b8113a3acca5"
@@ -13,6 +16,8 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
+principal_cache = TTLCache(maxsize=settings.AUTH_PRINCIPAL_CACHE_SIZE, ttl=settings.AUTH_PRINCIPAL_CACHE_TTL)
+
 
 def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
@@ -40,3 +45,11 @@ def get_token_payload(token):
 def get_users_enterpises(current_user):
     allowed_enterprises = [enterprise.id for enterprise in current_user.enterprises]
     return {"enterprise_id": allowed_enterprises}
+
+
+def invalidate_principals(username: str | None = None) -> None:
+    """Drops the cached principal of one user, or of every user when memberships change."""
+    if username is None:
+        principal_cache.clear()
+    else:
+        principal_cache.pop(username)
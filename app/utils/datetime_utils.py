@@ -1,4 +1,7 @@
 from datetime import date, datetime, timedelta
+
+from pytz import timezone
+
 from app.db.models.report import ReportPeriodChoices
 
 
@@ -8,6 +11,10 @@ def daterange(start_date: date, end_date: date):
         yield start_date + timedelta(n)
 
 
+def localize_datetime(naive_datetime: datetime, from_tz: str, to_tz: str = "UTC") -> datetime:
+    return timezone(from_tz).localize(naive_datetime).astimezone(tz=timezone(to_tz))
+
+
 def get_period_from_datetime(init_datetime: datetime, period: str) -> str:
     match period.lower():
         case ReportPeriodChoices.DAILY.value:
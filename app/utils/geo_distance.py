@@ -0,0 +1,126 @@
+import math
+
+import numpy as np
+
+from app.db.models.report import ReportPeriodChoices
+
+# mean Earth radius (IUGG), haversine error against the WGS-84 geodesic stays below 0.5%
+EARTH_RADIUS_KM = 6371.0088
+
+
+def point_distance_km(long_1: float, lat_1: float, long_2: float, lat_2: float) -> float:
+    """Haversine distance of two points with math, for point by point code where NumPy overhead dominates."""
+    long_1, lat_1, long_2, lat_2 = map(math.radians, (long_1, lat_1, long_2, lat_2))
+    half_chord = (
+        math.sin((lat_2 - lat_1) / 2) ** 2 + math.cos(lat_1) * math.cos(lat_2) * math.sin((long_2 - long_1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(min(max(half_chord, 0.0), 1.0)))
+
+
+def radius_degrees(lat: float, radius_m: float) -> float:
+    """
+    Degrees around a point at lat covering radius_m metres in any direction, with a margin for the difference
+    of Earth radii. Prefilters by degrees are answered by the GiST index, exact distances are checked after.
+    """
+    lat_degrees = math.degrees(radius_m * 1.01 / (EARTH_RADIUS_KM * 1000))
+    cos_lat = math.cos(math.radians(min(abs(lat) + lat_degrees, 90.0)))
+    if cos_lat < 1e-6:
+        return 360.0
+    return lat_degrees / cos_lat
+
+
+def segment_lengths_km(longs, lats) -> np.ndarray:
+    """Distances between consecutive points, the result is one element shorter than the track."""
+    longs = np.radians(np.asarray(longs, dtype=np.float64))
+    lats = np.radians(np.asarray(lats, dtype=np.float64))
+    if longs.size < 2:
+        return np.zeros(0, dtype=np.float64)
+    # same formula as point_distance_km, sines and cosines are computed once per point instead of once per segment end
+    cos_lats = np.cos(lats)
+    sin_half_dlat = np.sin(np.diff(lats) / 2)
+    sin_half_dlong = np.sin(np.diff(longs) / 2)
+    half_chord = sin_half_dlat * sin_half_dlat + cos_lats[:-1] * cos_lats[1:] * sin_half_dlong * sin_half_dlong
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(half_chord, 0, 1, out=half_chord), out=half_chord))
+
+
+def get_period_keys(date_times, period: str) -> np.ndarray:
+    """Integer period keys of datetime64 values, see get_period_labels for the reverse conversion."""
+    date_times = np.asarray(date_times, dtype="datetime64[us]")
+    match period.lower():
+        case ReportPeriodChoices.DAILY.value:
+            return date_times.astype("datetime64[D]").astype(np.int64)
+        case ReportPeriodChoices.MONTHLY.value:
+            return date_times.astype("datetime64[M]").astype(np.int64)
+        case ReportPeriodChoices.QUARTERLY.value:
+            return date_times.astype("datetime64[M]").astype(np.int64) // 3
+        case ReportPeriodChoices.ANNUALLY.value:
+            return date_times.astype("datetime64[Y]").astype(np.int64)
+    raise ValueError(f"Unknown period {period}")
+
+
+def get_period_labels(period_keys, period: str) -> list[str]:
+    """Labels in the format of report_result keys: 2024-01-31, 2024-01, 2024-Q1, 2024."""
+    period_keys = np.asarray(period_keys, dtype=np.int64)
+    match period.lower():
+        case ReportPeriodChoices.DAILY.value:
+            return [str(day) for day in period_keys.astype("datetime64[D]")]
+        case ReportPeriodChoices.MONTHLY.value:
+            return [str(month) for month in period_keys.astype("datetime64[M]")]
+        case ReportPeriodChoices.QUARTERLY.value:
+            return [f"{1970 + quarter // 4}-Q{quarter % 4 + 1}" for quarter in period_keys]
+        case ReportPeriodChoices.ANNUALLY.value:
+            return [str(year) for year in period_keys.astype("datetime64[Y]")]
+    raise ValueError(f"Unknown period {period}")
+
+
+def sum_values_by_period(date_times, values, period: str) -> dict[str, float]:
+    """Sums values (e.g. daily mileage) per period of their datetime64 values."""
+    if len(date_times) == 0:
+        return {}
+    period_keys = get_period_keys(date_times, period)
+    first_key = period_keys.min()
+    offsets = period_keys - first_key
+    sums = np.bincount(offsets, weights=np.asarray(values, dtype=np.float64))
+    present = np.flatnonzero(np.bincount(offsets))
+    return dict(zip(get_period_labels(present + first_key, period), sums[present].tolist()))
+
+
+def sum_segments_by_period(date_times, longs, lats, period: str) -> dict[str, float]:
+    """
+    Sums consecutive segment lengths of a time ordered track per period.
+    A segment belongs to the period of its end point, so a segment crossing midnight is counted once.
+    Periods containing points but no segment ends are reported with 0.
+    """
+    if len(date_times) == 0:
+        return {}
+    group_ids = np.zeros(len(date_times), dtype=np.int64)
+    return sum_segments_by_group_and_period(group_ids, date_times, longs, lats, period)[0]
+
+
+def sum_segments_by_group_and_period(group_ids, date_times, longs, lats, period: str) -> dict[int, dict[str, float]]:
+    """
+    Same as sum_segments_by_period for several tracks (e.g. vehicles) in one pass.
+    Points have to be ordered by group and by time inside of a group, segments never join two groups.
+    """
+    if len(date_times) == 0:
+        return {}
+    group_ids = np.asarray(group_ids, dtype=np.int64)
+    period_keys = get_period_keys(date_times, period)
+    segments = np.concatenate(([0.0], segment_lengths_km(longs, lats)))
+    group_starts = np.concatenate(([True], group_ids[1:] != group_ids[:-1]))
+    segments[group_starts] = 0.0
+
+    unique_groups = group_ids[group_starts]
+    group_indexes = np.cumsum(group_starts) - 1
+    # keys of a report are dense (days of a year at most), so they are used as bincount offsets without sorting
+    first_key = period_keys.min()
+    periods_count = int(period_keys.max() - first_key) + 1
+    offsets = group_indexes * periods_count + (period_keys - first_key)
+    sums = np.bincount(offsets, weights=segments)
+    present = np.flatnonzero(np.bincount(offsets))
+    labels = get_period_labels(present % periods_count + first_key, period)
+
+    result = {}
+    for group_id, label, value in zip(unique_groups[present // periods_count].tolist(), labels, sums[present].tolist()):
+        result.setdefault(group_id, {})[label] = value
+    return result
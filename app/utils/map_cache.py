@@ -0,0 +1,112 @@
+import asyncio
+import hashlib
+import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Awaitable, Callable
+
+from app.core.config import settings
+
+# folium rendering is synchronous, it runs here so the event loop keeps serving other requests
+render_executor = ThreadPoolExecutor(max_workers=settings.MAP_RENDER_WORKERS, thread_name_prefix="map-render")
+
+
+def map_cache_key(*parts) -> str:
+    return hashlib.sha256(":".join(map(str, parts)).encode()).hexdigest()
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """Whether an If-None-Match header lists the (strong) etag, weak validators are compared weakly."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return etag in (tag.strip().removeprefix("W/") for tag in if_none_match.split(","))
+
+
+class MapFileCache:
+    """
+    Content addressed files in a directory bounded by max_bytes, the least recently used files are removed first.
+    Files are shared by all workers using the directory (modification time is the last use), concurrent creations
+    of the same key are collapsed into one per process.
+    """
+
+    def __init__(self, directory: str, max_bytes: int, suffix: str = ".html"):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.suffix = suffix
+        self._in_flight: dict[str, asyncio.Task] = {}
+
+    def path(self, key: str) -> Path:
+        return self.directory / f"{key}{self.suffix}"
+
+    def get(self, key: str) -> Path | None:
+        path = self.path(key)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    async def get_or_create(self, key: str, create: Callable[[Path], Awaitable[None]]) -> Path:
+        """Path of the cached file, create(path) writes a missing one. Waiters of the same key share one creation."""
+        path = self.get(key)
+        if path is not None:
+            return path
+
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._create(key, create))
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        # a cancelled request does not cancel the creation other requests wait for
+        return await asyncio.shield(task)
+
+    async def read_or_create(self, key: str, create: Callable[[Path], Awaitable[None]], attempts: int = 3) -> bytes:
+        """
+        Content of the cached file, see get_or_create. The content is read at once instead of sending the file by
+        path later, another worker may evict it in between; a file evicted before it is read is created again.
+        """
+        while True:
+            path = await self.get_or_create(key, create)
+            try:
+                # file I/O must not wait for renderings queued in render_executor
+                return await asyncio.to_thread(path.read_bytes)
+            except FileNotFoundError:
+                attempts -= 1
+                if attempts <= 0:
+                    raise
+
+    async def _create(self, key: str, create: Callable[[Path], Awaitable[None]]) -> Path:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.path(key)
+        tmp_path = path.with_name(f"{path.name}.{uuid.uuid4().hex}.tmp")
+        try:
+            await create(tmp_path)
+            os.replace(tmp_path, path)
+        finally:
+            tmp_path.unlink(missing_ok=True)
+        await asyncio.to_thread(self.evict)
+        return path
+
+    def evict(self) -> None:
+        """Removes least recently used files until the directory fits into max_bytes."""
+        files = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and entry.name.endswith(self.suffix):
+                stat = entry.stat()
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+        total_bytes = sum(size for _, size, _ in files)
+        for _, size, file_path in sorted(files):
+            if total_bytes <= self.max_bytes:
+                break
+            try:
+                os.remove(file_path)
+            except FileNotFoundError:
+                pass  # removed by another worker
+            total_bytes -= size
+
+
+map_cache = MapFileCache(settings.MAP_CACHE_DIR, settings.MAP_CACHE_MAX_BYTES)
+tile_cache = MapFileCache(settings.TILE_CACHE_DIR, settings.TILE_CACHE_MAX_BYTES, suffix=".mvt")
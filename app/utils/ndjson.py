@@ -0,0 +1,8 @@
+from pydantic import BaseModel
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+
+def parse_ndjson(body: bytes, model: type[BaseModel]) -> list:
+    """Validates every non-empty line of newline delimited JSON body as `model`."""
+    return [model.model_validate_json(line) for line in body.splitlines() if line.strip()]
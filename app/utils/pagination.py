@@ -1,14 +1,34 @@
+import math
+from datetime import datetime
 from typing import Generic, TypeVar
 
 from fastapi import Query
 from pydantic import BaseModel
 
+from app.core.config import settings
+from app.utils.lru import TTLCache
+
+count_cache = TTLCache(maxsize=1024, ttl=settings.PAGINATION_COUNT_CACHE_TTL)
+
 
 class PageParams(BaseModel):
     """Request query params for paginated API."""
 
     page: int = Query(ge=0, default=0)
     size: int = Query(ge=1, le=100)
+    # keyset pagination for deep pages: the page starts after this id and `page` is ignored
+    after_id: int | None = Query(ge=0, default=None)
+
+
+class CursorParams(BaseModel):
+    """
+    Request query params for time ordered API. Items are ordered by (date_time, id), pass date_time and id
+    of the last item as after_date_time and after_id to get the next page. Without size nothing is limited.
+    """
+
+    size: int | None = Query(ge=1, le=10000, default=None)
+    after_date_time: datetime | None = Query(default=None)
+    after_id: int | None = Query(ge=0, default=None)
 
 
 T = TypeVar("T")
@@ -21,3 +41,32 @@ class PagedResponseSchema(BaseModel, Generic[T]):
     page: int
     size: int
     results: list[T]
+    # pass as after_id to get the next page, None on the last page
+    next_after_id: int | None = None
+
+
+async def count_total(repository, filter_set: dict = None) -> int:
+    """
+    Rows of the listing, should be awaited inside of the uow block. Counts are cached for
+    PAGINATION_COUNT_CACHE_TTL seconds, the unfiltered count of a big table is estimated from pg_class.reltuples.
+    """
+    cache_key = (repository.model.__tablename__, tuple(sorted(filter_set["enterprise_id"])) if filter_set else None)
+    total = count_cache.get(cache_key)
+    if total is not None:
+        return total
+    if filter_set is None:
+        total = await repository.estimate_count()
+    if total is None or total < settings.PAGINATION_ESTIMATE_COUNT_FROM:
+        total = await repository.count_filter_by_enterprise(filter_set)
+    count_cache.set(cache_key, total)
+    return total
+
+
+def get_paged_response(results: list, page_params: PageParams, total_count: int) -> PagedResponseSchema:
+    return PagedResponseSchema(
+        total=math.ceil(total_count / page_params.size) - 1,
+        page=page_params.page,
+        size=page_params.size,
+        results=results,
+        next_after_id=results[-1].id if len(results) == page_params.size else None,
+    )
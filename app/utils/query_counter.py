@@ -0,0 +1,59 @@
+from contextvars import ContextVar
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+QUERY_COUNT_HEADER = "X-Query-Count"
+CONNECTION_COUNT_HEADER = "X-Connection-Count"
+
+_query_counter: ContextVar[list | None] = ContextVar("query_counter", default=None)
+
+
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    counter = _query_counter.get()
+    if counter is not None:
+        counter[0] += 1
+
+
+def _count_checkout(dbapi_connection, connection_record, connection_proxy):
+    counter = _query_counter.get()
+    if counter is not None:
+        counter[1] += 1
+
+
+def install_query_counter(engine: AsyncEngine) -> None:
+    event.listen(engine.sync_engine, "before_cursor_execute", _count_query)
+    event.listen(engine.sync_engine, "checkout", _count_checkout)
+
+
+class QueryCountMiddleware:
+    """
+    Sets X-Query-Count response header to the number of SQL statements executed while the request was served and
+    X-Connection-Count to the number of connections checked out of the pool for it.
+    Statements of a streaming response made after its headers were sent are not counted.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        counter = [0, 0]
+        token = _query_counter.set(counter)
+
+        async def send_with_query_count(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                headers.append(QUERY_COUNT_HEADER, str(counter[0]))
+                headers.append(CONNECTION_COUNT_HEADER, str(counter[1]))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_query_count)
+        finally:
+            _query_counter.reset(token)
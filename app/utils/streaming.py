@@ -0,0 +1,53 @@
+import json
+from typing import AsyncIterator, Literal
+
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+
+from app.utils.ndjson import NDJSON_MEDIA_TYPE
+
+GEOJSON_MEDIA_TYPE = "application/geo+json"
+STREAM_CHUNK_SIZE = 1000
+
+StreamFormat = Literal["json", "ndjson", "geojson"]
+
+
+async def ndjson_chunks(items: AsyncIterator[BaseModel], chunk_size: int = STREAM_CHUNK_SIZE):
+    lines = []
+    async for item in items:
+        lines.append(item.model_dump_json())
+        if len(lines) >= chunk_size:
+            yield "\n".join(lines) + "\n"
+            lines = []
+    if lines:
+        yield "\n".join(lines) + "\n"
+
+
+async def feature_collection_chunks(features: AsyncIterator[dict], chunk_size: int = STREAM_CHUNK_SIZE):
+    # the header goes out before the first row is fetched
+    yield '{"type": "FeatureCollection", "features": ['
+    separator = ""
+    batch = []
+    async for feature in features:
+        batch.append(json.dumps(feature))
+        if len(batch) >= chunk_size:
+            yield separator + ",".join(batch)
+            separator = ","
+            batch = []
+    if batch:
+        yield separator + ",".join(batch)
+    yield "]}"
+
+
+async def _as_features(items: AsyncIterator, to_feature):
+    async for item in items:
+        yield to_feature(item)
+
+
+def streaming_response(items: AsyncIterator, output_format: StreamFormat, to_feature=None) -> StreamingResponse:
+    """Wraps an async iterator of pydantic objects into NDJSON or GeoJSON FeatureCollection stream."""
+    if output_format == "geojson":
+        return StreamingResponse(
+            feature_collection_chunks(_as_features(items, to_feature)), media_type=GEOJSON_MEDIA_TYPE
+        )
+    return StreamingResponse(ndjson_chunks(items), media_type=NDJSON_MEDIA_TYPE)
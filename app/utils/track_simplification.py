@@ -0,0 +1,92 @@
+import bisect
+import heapq
+
+import numpy as np
+
+# metres per degree of latitude, and of longitude at the equator (scaled by cos(latitude) elsewhere)
+METERS_PER_DEGREE_LAT = 110574.0
+METERS_PER_DEGREE_LONG = 111320.0
+
+
+def _to_local_meters(longs, lats) -> tuple[np.ndarray, np.ndarray]:
+    """Equirectangular projection around the mean latitude, precise enough for tolerances of a track."""
+    longs = np.asarray(longs, dtype=np.float64)
+    lats = np.asarray(lats, dtype=np.float64)
+    cos_lat = np.cos(np.radians(lats.mean())) if lats.size else 1.0
+    return longs * METERS_PER_DEGREE_LONG * cos_lat, lats * METERS_PER_DEGREE_LAT
+
+
+def _farthest_point(x: np.ndarray, y: np.ndarray, start: int, end: int) -> tuple[float, int]:
+    """(distance, index) of the point of (start, end) farthest from the segment start-end."""
+    inner_x, inner_y = x[start + 1 : end], y[start + 1 : end]
+    segment_x, segment_y = x[end] - x[start], y[end] - y[start]
+    length_2 = segment_x * segment_x + segment_y * segment_y
+    if length_2 == 0:
+        distances_2 = (inner_x - x[start]) ** 2 + (inner_y - y[start]) ** 2
+    else:
+        # distance to the segment, not to the line: returning tracks keep their turning point
+        t = np.clip(((inner_x - x[start]) * segment_x + (inner_y - y[start]) * segment_y) / length_2, 0, 1)
+        distances_2 = (inner_x - x[start] - t * segment_x) ** 2 + (inner_y - y[start] - t * segment_y) ** 2
+    farthest = int(np.argmax(distances_2))
+    return float(np.sqrt(distances_2[farthest])), start + 1 + farthest
+
+
+def simplify_track_mask(
+    longs, lats, tolerance_m: float = None, max_points: int = None, breaks: list[int] = None
+) -> np.ndarray:
+    """
+    Douglas-Peucker simplification of a track, returns a mask of the points to keep. Segments are split farthest
+    point first, so the splitting stops at tolerance_m metres or after max_points points, whichever comes first.
+    breaks are indices starting separate parts (e.g. trips), first and last points of every part are kept.
+    """
+    x, y = _to_local_meters(longs, lats)
+    size = x.size
+    keep = np.zeros(size, dtype=bool)
+    if size == 0:
+        return keep
+
+    bounds = [0, *sorted(set(breaks or ()) - {0}), size]
+    parts = [(start, end - 1) for start, end in zip(bounds[:-1], bounds[1:]) if end > start]
+    for start, end in parts:
+        keep[start] = keep[end] = True
+    kept = int(keep.sum())
+    max_points = max(max_points, kept) if max_points is not None else size
+    tolerance_m = tolerance_m or 0.0
+
+    heap = []
+    for start, end in parts:
+        if end - start > 1:
+            distance, index = _farthest_point(x, y, start, end)
+            heapq.heappush(heap, (-distance, index, start, end))
+    while heap and kept < max_points:
+        distance, index, start, end = heapq.heappop(heap)
+        if -distance <= tolerance_m:
+            break
+        keep[index] = True
+        kept += 1
+        for part_start, part_end in ((start, index), (index, end)):
+            if part_end - part_start > 1:
+                part_distance, part_index = _farthest_point(x, y, part_start, part_end)
+                heapq.heappush(heap, (-part_distance, part_index, part_start, part_end))
+    return keep
+
+
+def simplify_track_points(
+    track_points: list, parts_starts: list = None, tolerance_m: float = None, max_points: int = None
+) -> list:
+    """
+    Simplified track of points having date_time, long and lat, in time order. parts_starts are start times of parts
+    simplified separately, e.g. of trips.
+    """
+    track_points = sorted(track_points, key=lambda track_point: (track_point.date_time, track_point.id))
+    parts_starts = sorted(parts_starts or ())
+    part_indices = [bisect.bisect_right(parts_starts, track_point.date_time) for track_point in track_points]
+    breaks = [index for index in range(1, len(part_indices)) if part_indices[index] != part_indices[index - 1]]
+    keep = simplify_track_mask(
+        [track_point.long for track_point in track_points],
+        [track_point.lat for track_point in track_points],
+        tolerance_m,
+        max_points,
+        breaks,
+    )
+    return [track_point for track_point, kept in zip(track_points, keep) if kept]
@@ -0,0 +1,115 @@
+from datetime import datetime
+
+from app.utils.geo_distance import point_distance_km
+
+TRIP_OPENED = "opened"
+TRIP_CLOSED = "closed"
+TRIP_DISCARDED = "discarded"
+
+
+class VehicleTripState:
+    """Last point of a vehicle and its open trip, everything TripSegmenter needs to take the next point."""
+
+    __slots__ = (
+        "vehicle_id",
+        "last_date_time",
+        "last_long",
+        "last_lat",
+        "trip_id",
+        "trip_start_date_time",
+        "trip_last_moving_date_time",
+        "trip_distance_km",
+    )
+
+    def __init__(
+        self,
+        vehicle_id: int,
+        last_date_time: datetime = None,
+        last_long: float = None,
+        last_lat: float = None,
+        trip_id: int = None,
+        trip_start_date_time: datetime = None,
+        trip_last_moving_date_time: datetime = None,
+        trip_distance_km: float = 0.0,
+    ):
+        self.vehicle_id = vehicle_id
+        self.last_date_time = last_date_time
+        self.last_long = last_long
+        self.last_lat = last_lat
+        self.trip_id = trip_id  # None while the open trip is not saved yet
+        self.trip_start_date_time = trip_start_date_time
+        self.trip_last_moving_date_time = trip_last_moving_date_time
+        self.trip_distance_km = trip_distance_km
+
+    @property
+    def has_open_trip(self) -> bool:
+        return self.trip_start_date_time is not None
+
+    def as_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class TripSegmenter:
+    """
+    Splits a vehicle's track into trips point by point. A trip starts with the first segment faster than
+    min_speed_kmh and ends at its last such segment when the vehicle stays slower for stop_dwell_seconds or sends
+    nothing for max_gap_seconds. Trips shorter than min_duration_seconds or min_distance_km are discarded.
+    Points not later than the last one of the vehicle are skipped, late points are handled by a backfill.
+    """
+
+    def __init__(
+        self,
+        min_speed_kmh: float,
+        stop_dwell_seconds: float,
+        max_gap_seconds: float,
+        min_duration_seconds: float,
+        min_distance_km: float,
+    ):
+        self.min_speed_kmh = min_speed_kmh
+        self.stop_dwell_seconds = stop_dwell_seconds
+        self.max_gap_seconds = max_gap_seconds
+        self.min_duration_seconds = min_duration_seconds
+        self.min_distance_km = min_distance_km
+
+    def feed(self, state: VehicleTripState, date_time: datetime, long: float, lat: float) -> tuple | None:
+        """
+        Moves the state by one point. Returns (TRIP_OPENED, None, start, finish) when the point starts a trip,
+        (TRIP_CLOSED or TRIP_DISCARDED, trip_id, start, finish) when it ends one, None otherwise.
+        """
+        if state.last_date_time is not None and date_time <= state.last_date_time:
+            return None
+
+        event = None
+        if state.last_date_time is not None:
+            gap_seconds = (date_time - state.last_date_time).total_seconds()
+            if gap_seconds > self.max_gap_seconds:
+                event = self.close(state) if state.has_open_trip else None
+            else:
+                distance_km = point_distance_km(state.last_long, state.last_lat, long, lat)
+                if distance_km * 3600 >= self.min_speed_kmh * gap_seconds:
+                    if not state.has_open_trip:
+                        state.trip_start_date_time = state.last_date_time
+                        event = (TRIP_OPENED, None, state.trip_start_date_time, date_time)
+                    state.trip_last_moving_date_time = date_time
+                    state.trip_distance_km += distance_km
+                elif (
+                    state.has_open_trip
+                    and (date_time - state.trip_last_moving_date_time).total_seconds() >= self.stop_dwell_seconds
+                ):
+                    event = self.close(state)
+
+        state.last_date_time, state.last_long, state.last_lat = date_time, long, lat
+        return event
+
+    def close(self, state: VehicleTripState) -> tuple:
+        """Ends the open trip of the state at its last moving point."""
+        start_date_time, finish_date_time = state.trip_start_date_time, state.trip_last_moving_date_time
+        too_short = (
+            finish_date_time - start_date_time
+        ).total_seconds() < self.min_duration_seconds or state.trip_distance_km < self.min_distance_km
+        event = (TRIP_DISCARDED if too_short else TRIP_CLOSED, state.trip_id, start_date_time, finish_date_time)
+        state.trip_id = None
+        state.trip_start_date_time = None
+        state.trip_last_moving_date_time = None
+        state.trip_distance_km = 0.0
+        return event
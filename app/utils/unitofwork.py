@@ -1,13 +1,24 @@
 from abc import ABC, abstractmethod
+from typing import AsyncIterator
 
+from app.core.config import settings
 from app.db.database import async_session_maker
+from app.db.replicas import replica_router
 from app.repositories.driver_repository import DriverRepository
 from app.repositories.enterprise_repository import EnterpriseRepository
-from app.repositories.report_repository import ReportRepository
-from app.repositories.trip_repository import TripRepository
+from app.repositories.geocoding_repository import GazetteerPlaceRepository, GeocodedAddressRepository
+from app.repositories.report_repository import ReportJobRepository, ReportRepository
+from app.repositories.trip_repository import (
+    TripDetectionCursorRepository,
+    TripRepository,
+    TripSummaryRepository,
+    VehicleTripDetectionStateRepository,
+)
 from app.repositories.user_repository import UserRepository
 from app.repositories.vehicle_repository import (
     VehicleBrandRepository,
+    VehicleDailyMileageRepository,
+    VehicleDayWatermarkRepository,
     VehicleModelRepository,
     VehicleRepository,
     VehicleTrackPointRepository,
@@ -17,13 +28,21 @@ from app.repositories.vehicle_repository import (
 class IUnitOfWork(ABC):
     driver: DriverRepository
     enterprise: EnterpriseRepository
+    gazetteerplace: GazetteerPlaceRepository
+    geocodedaddress: GeocodedAddressRepository
     report: ReportRepository
+    reportjob: ReportJobRepository
     trip: TripRepository
+    tripdetectioncursor: TripDetectionCursorRepository
+    tripsummary: TripSummaryRepository
     user: UserRepository
     vehicle: VehicleRepository
     vehiclebrand: VehicleBrandRepository
+    vehicledailymileage: VehicleDailyMileageRepository
+    vehicledaywatermark: VehicleDayWatermarkRepository
     vehiclemodel: VehicleModelRepository
     vehicletrackpoint: VehicleTrackPointRepository
+    vehicletripdetectionstate: VehicleTripDetectionStateRepository
 
     @abstractmethod
     def __init__(self): ...
@@ -34,6 +53,9 @@ class IUnitOfWork(ABC):
     @abstractmethod
     async def __aexit__(self, *args): ...
 
+    @abstractmethod
+    def read_only(self): ...
+
     @abstractmethod
     async def commit(self): ...
 
@@ -42,28 +64,109 @@ class IUnitOfWork(ABC):
 
 
 class UnitOfWork(IUnitOfWork):
-    def __init__(self):
+    """
+    Blocks nested in an open block reuse its session inside of a savepoint, uncommitted changes of a block
+    (nested or not) are rolled back on its exit. commit() commits the whole transaction of the session, the
+    session is closed by the outermost block.
+
+    With keep_session the session is kept open between outermost blocks until close(), each of them runs in a
+    savepoint too. The next outermost block reuses it unless it is on a replica and the block writes, or the block
+    is read only and a replica is usable while the session is on the primary.
+    """
+
+    def __init__(self, keep_session: bool = False):
         self.session_factory = async_session_maker
+        self.session = None
+        self.keep_session = keep_session
+        self._depth = 0
+        self._read_only = False
+        self._on_replica = False
+        self._savepoints = []
 
     async def __aenter__(self):
-        self.session = self.session_factory()
+        read_only, self._read_only = self._read_only, False
+        self._depth += 1
+        if self._depth == 1:
+            await self._open_session(read_only)
+        if self._depth > 1 or self.keep_session:
+            self._savepoints.append(await self.session.begin_nested())
+
+    async def _open_session(self, read_only: bool):
+        replica_session_factory = None
+        if read_only and not self._on_replica:
+            replica_session_factory = await replica_router.get_session_maker()
+        if self.session is not None:
+            if replica_session_factory is None and (read_only or not self._on_replica):
+                return
+            await self.close()
+
+        self._on_replica = replica_session_factory is not None
+        self.session = (replica_session_factory or self.session_factory)()
 
         self.driver = DriverRepository(self.session)
         self.enterprise = EnterpriseRepository(self.session)
+        self.gazetteerplace = GazetteerPlaceRepository(self.session)
+        self.geocodedaddress = GeocodedAddressRepository(self.session)
         self.report = ReportRepository(self.session)
+        self.reportjob = ReportJobRepository(self.session)
         self.trip = TripRepository(self.session)
+        self.tripdetectioncursor = TripDetectionCursorRepository(self.session)
+        self.tripsummary = TripSummaryRepository(self.session)
         self.user = UserRepository(self.session)
         self.vehicle = VehicleRepository(self.session)
         self.vehiclebrand = VehicleBrandRepository(self.session)
+        self.vehicledailymileage = VehicleDailyMileageRepository(self.session)
+        self.vehicledaywatermark = VehicleDayWatermarkRepository(self.session)
         self.vehiclemodel = VehicleModelRepository(self.session)
         self.vehicletrackpoint = VehicleTrackPointRepository(self.session)
+        self.vehicletripdetectionstate = VehicleTripDetectionStateRepository(self.session)
 
-    async def __aexit__(self, *args):
-        await self.rollback()
-        await self.session.close()
+    async def __aexit__(self, exc_type, *args):
+        self._depth -= 1
+        if self._depth > 0 or self.keep_session:
+            savepoint = self._savepoints.pop()
+            # a committed savepoint is not active anymore
+            if savepoint.is_active:
+                await savepoint.rollback()
+            return
+
+        await self.session.rollback()
+        await self.close()
+
+    def read_only(self) -> "UnitOfWork":
+        """
+        The next block opens its session on a replica, `async with self.uow.read_only():`. Falls back to the primary
+        without usable replicas, a block nested in an open one keeps the open session.
+        """
+        self._read_only = True
+        return self
 
     async def commit(self):
         await self.session.commit()
 
     async def rollback(self):
-        await self.session.rollback()
+        """Rolls back the changes of the current block only, a nested block keeps the work of outer blocks."""
+        if not self._savepoints:
+            await self.session.rollback()
+        elif self._savepoints[-1].is_active:
+            await self._savepoints[-1].rollback()
+
+    async def close(self):
+        """Closes the session, uncommitted changes are rolled back."""
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+            self._on_replica = False
+
+
+async def get_uow() -> AsyncIterator[IUnitOfWork]:
+    """
+    Unit of work of a request. With DB_REQUEST_SCOPED_SESSION blocks of the services and the authentication share
+    the session of the request instead of opening one each. It is opened by the first block, on a replica when the
+    block is read only, and moves to the primary or to a replica when a later block needs the other one.
+    """
+    uow = UnitOfWork(keep_session=settings.DB_REQUEST_SCOPED_SESSION)
+    try:
+        yield uow
+    finally:
+        await uow.close()
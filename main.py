@@ -23,7 +23,9 @@ from app.api.endpoints import (
     vehicle_router,
     vehicle_track_point_router,
 )
+from app.core.config import settings
 from app.db.database import engine
+from app.utils.query_counter import QueryCountMiddleware, install_query_counter
 
 app = FastAPI()
 admin = Admin(app, engine)
@@ -56,6 +58,10 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+if settings.QUERY_COUNT_HEADER:
+    install_query_counter(engine)
+    app.add_middleware(QueryCountMiddleware)
+
 # Timezone setting for server
 SERVER_TIME_ZONE = "UTC"
 
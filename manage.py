@@ -1,3 +1,6 @@
+import asyncio
+import csv
+import logging
 from collections import defaultdict
 from datetime import datetime, timedelta
 from random import randint
@@ -5,18 +8,43 @@ from typing import Annotated
 from zoneinfo import ZoneInfo
 
 import typer
-from sqlalchemy import create_engine, delete, insert, select, update
+from sqlalchemy import create_engine, delete, insert, select, text, update
 from sqlalchemy.orm import Session
 
 from app.core.config import settings
+from app.db.partitions import (
+    add_months,
+    create_track_point_partition_statements,
+    month_start,
+    track_point_partition_exists_sql,
+)
+from app.db.rollup import (
+    DAILY_MILEAGE_EMPTY_DAYS_SQL,
+    DAILY_MILEAGE_UPSERT_SQL,
+    TRIP_SUMMARY_UPSERT_SQL,
+    daily_mileage_rollup_params,
+    trip_summary_params,
+)
 from app.db.models import (
     Driver,
     DriverVehicle,
+    GazetteerPlace,
+    Trip,
     Vehicle,
     VehicleModel,
     VehicleTrackPoint,
 )
+from app.services.trip_detection_service import TripDetectionService
+from app.utils.unitofwork import UnitOfWork
+from manage.benchmark_point_decoding import run_benchmark
+from manage.check_geo_distance import compare_with_geopy, measure_year_report
+from manage.check_mileage_engines import compare_mileage_engines
+from manage.check_query_budget import check_query_budgets
+from manage.check_replicas import check_replicas
 from manage.generate_routes_points import generate_route
+from manage.load_test_connections import run_load_test
+from manage.report_worker import run_report_worker
+from manage.trip_detector import run_trip_detector
 
 engine = create_engine(settings.DATABASE_URL)
 
@@ -146,5 +174,289 @@ def generate_track_points(
         result.scalars().all()
 
 
+@app.command()
+def create_track_point_partitions(
+    months_ahead: Annotated[int, typer.Option(help=("How many months after the current one should be covered."))] = 3,
+):
+    """
+    Creates missing monthly partitions of vehicletrackpoint table from the current month on.
+    Should be scheduled (e.g. by cron) so that incoming points never fall into the default partition,
+    points of a new month already stored in the default partition are moved into its partition.
+    ```python manage.py create-track-point-partitions --months-ahead 6```
+    """
+    month = month_start(datetime.now(tz=ZoneInfo("UTC")).date())
+    with Session(engine) as session:
+        for _ in range(months_ahead + 1):
+            if not session.execute(text(track_point_partition_exists_sql(month))).scalar():
+                for statement in create_track_point_partition_statements(month):
+                    session.execute(text(statement))
+                print(f"partition of {month:%Y-%m} created")
+            month = add_months(month, 1)
+        session.commit()
+
+
+@app.command()
+def rollup(
+    days_back: Annotated[int, typer.Option(help=("How many days before today are recomputed."))] = 2,
+    from_date: Annotated[
+        datetime, typer.Option(formats=["%Y-%m-%d"], help=("Recompute from this day instead, e.g. for backfill."))
+    ] = None,
+    chunk_days: Annotated[int, typer.Option(help=("How many days are recomputed per transaction."))] = 31,
+):
+    """
+    Fills vehicle_daily_mileage with closed days (before today of the enterprise timezone).
+    Should be scheduled daily (e.g. by cron), late points invalidate their days and reports recompute them.
+    ```python manage.py rollup --from-date 2024-01-01```
+    """
+    # one day ahead of UTC covers timezones east of it, open days are skipped by the query itself
+    till_day = datetime.now(tz=ZoneInfo("UTC")).date() + timedelta(days=1)
+    from_day = from_date.date() if from_date else till_day - timedelta(days=days_back + 1)
+    with Session(engine) as session:
+        while from_day <= till_day:
+            chunk_till_day = min(from_day + timedelta(days=chunk_days - 1), till_day)
+            params = daily_mileage_rollup_params(from_day, chunk_till_day)
+            session.execute(text(DAILY_MILEAGE_UPSERT_SQL), params)
+            session.execute(text(DAILY_MILEAGE_EMPTY_DAYS_SQL), params)
+            session.commit()
+            from_day = chunk_till_day + timedelta(days=1)
+
+
+@app.command()
+def summarize_trips(
+    recompute: Annotated[bool, typer.Option(help=("Recompute existing summaries too, not only missing ones."))] = False,
+    chunk_size: Annotated[int, typer.Option(help=("How many trips are summarized per transaction."))] = 1000,
+):
+    """
+    Fills trip_summary for trips without a summary, e.g. after the table was added or for trips of imported points.
+    ```python manage.py summarize-trips --chunk-size 500```
+    """
+    with Session(engine) as session:
+        last_id = 0
+        while True:
+            trip_ids = (
+                session.execute(select(Trip.id).where(Trip.id > last_id).order_by(Trip.id).limit(chunk_size))
+                .scalars()
+                .all()
+            )
+            if not trip_ids:
+                break
+            session.execute(text(TRIP_SUMMARY_UPSERT_SQL), trip_summary_params(list(trip_ids), not recompute))
+            session.commit()
+            last_id = trip_ids[-1]
+
+
+@app.command()
+def import_gazetteer(
+    path: Annotated[str, typer.Option(help=("Path to GeoNames dump file (tab separated, e.g. cities500.txt)."))],
+    replace: Annotated[bool, typer.Option(help=("Remove previously imported places first."))] = False,
+    batch_size: Annotated[int, typer.Option(help=("How many places are inserted per statement."))] = 5000,
+):
+    """
+    Imports places used by offline reverse geocoder (GEOCODER_PROVIDER=gazetteer).
+    ```python manage.py import-gazetteer --path cities500.txt --replace```
+    """
+    with Session(engine) as session, open(path, encoding="utf-8", newline="") as gazetteer_file:
+        if replace:
+            session.execute(delete(GazetteerPlace))
+
+        bulk_places_list = []
+        for row in csv.reader(gazetteer_file, delimiter="\t", quoting=csv.QUOTE_NONE):
+            # geonameid, name, asciiname, alternatenames, latitude, longitude, feature class, feature code,
+            # country code, ...
+            name, lat, long, country_code = row[1], row[4], row[5], row[8]
+            bulk_places_list.append(
+                {
+                    "name": name,
+                    "address": f"{name}, {country_code}" if country_code else name,
+                    "geotag": f"POINT({float(long)} {float(lat)})",
+                }
+            )
+            if len(bulk_places_list) >= batch_size:
+                session.execute(insert(GazetteerPlace).values(bulk_places_list))
+                bulk_places_list = []
+        if bulk_places_list:
+            session.execute(insert(GazetteerPlace).values(bulk_places_list))
+        session.commit()
+
+
+@app.command()
+def benchmark_point_decoding(
+    count: Annotated[int, typer.Option(help=("How many track points are serialized by each variant."))] = 10000,
+):
+    """
+    Compares per-point cost of the legacy WKB -> WKT -> split serializer and the current one, no database is used.
+    ```python manage.py benchmark-point-decoding --count 50000```
+    """
+    result = run_benchmark(count)
+    for variant, cost in result.items():
+        print(f"{variant}: {cost:.2f} us/point")
+    print(f"speedup: {result['legacy'] / result['current']:.1f}x")
+
+
+@app.command()
+def check_geo_distance(
+    count: Annotated[int, typer.Option(help=("How many points the compared track has."))] = 10000,
+    tolerance: Annotated[float, typer.Option(help=("Allowed relative difference with geopy geodesic."))] = 0.005,
+):
+    """
+    Checks the vectorized mileage engine against geopy and measures a daily report over a year of points.
+    ```python manage.py check-geo-distance --count 20000```
+    """
+    result = compare_with_geopy(count, tolerance)
+    print(
+        f"geopy: {result['geopy_km']:.3f} km in {result['geopy_ms']:.1f} ms, "
+        f"numpy: {result['numpy_km']:.3f} km in {result['numpy_ms']:.1f} ms, "
+        f"relative error {result['relative_error']:.5f}"
+    )
+    print(f"daily report over a year of points: {measure_year_report():.1f} ms")
+
+
+@app.command()
+def check_mileage_engines(
+    vehicle_id: Annotated[int, typer.Option(help=("Vehicle to build the report for."))],
+    from_date: Annotated[datetime, typer.Option(formats=["%Y-%m-%d"], help=("First day of the report."))],
+    till_date: Annotated[datetime, typer.Option(formats=["%Y-%m-%d"], help=("Last day of the report."))],
+    period: Annotated[str, typer.Option(help=("daily, monthly, quarterly or annually."))] = "daily",
+):
+    """
+    Builds mileage of a vehicle with both REPORT_MILEAGE_ENGINE values and with the daily rollup,
+    prints the periods that differ.
+    ```python manage.py check-mileage-engines --vehicle-id 1 --from-date 2024-01-01 --till-date 2024-12-31```
+    """
+    mismatches = asyncio.run(compare_mileage_engines(vehicle_id, period, from_date.date(), till_date.date()))
+    for label, (python_km, postgis_km, rollup_km) in mismatches.items():
+        print(f"{label}: python {python_km}, postgis {postgis_km}, rollup {rollup_km}")
+    print("engines match" if not mismatches else f"{len(mismatches)} periods differ")
+
+
+@app.command()
+def report_worker(
+    concurrency: Annotated[int, typer.Option(help=("How many jobs the process computes at the same time."))] = 1,
+    poll_interval: Annotated[
+        float, typer.Option(help=("Seconds to wait when the queue is empty."))
+    ] = settings.REPORT_JOB_POLL_INTERVAL,
+    burst: Annotated[bool, typer.Option(help=("Exit when the queue is empty instead of waiting."))] = False,
+):
+    """
+    Computes queued reports. Jobs are taken with SELECT ... FOR UPDATE SKIP LOCKED, so any number of workers
+    may run in parallel, a job left running longer than REPORT_JOB_STALE_AFTER seconds is taken over.
+    ```python manage.py report-worker --concurrency 4```
+    """
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(run_report_worker(concurrency, poll_interval, burst))
+
+
+@app.command()
+def trip_detector(
+    shard: Annotated[int, typer.Option(help=("Vehicles with vehicle_id % shards == shard are processed."))] = 0,
+    shards: Annotated[int, typer.Option(help=("Number of detector processes."))] = 1,
+    poll_interval: Annotated[
+        float, typer.Option(help=("Seconds to wait when there are no new points."))
+    ] = settings.TRIP_DETECTION_POLL_INTERVAL,
+    batch_size: Annotated[
+        int, typer.Option(help=("How many points are processed per transaction."))
+    ] = settings.TRIP_DETECTION_BATCH_SIZE,
+    burst: Annotated[bool, typer.Option(help=("Exit when there are no new points instead of waiting."))] = False,
+    from_id: Annotated[
+        int,
+        typer.Option(help=("First start only: the shard starts after this track point id, the last one by default.")),
+    ] = None,
+):
+    """
+    Opens and closes trips from new track points. Run one process per shard, e.g. for 4 processes
+    ```python manage.py trip-detector --shards 4 --shard 0 --from-id 123456``` ... ```--shard 3 --from-id 123456```
+    On the first start a shard begins after from_id (pass the same one to all shards), older points are left to
+    `detect-trips --till-point-id`.
+    """
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(run_trip_detector(shard, shards, poll_interval, batch_size, burst, from_id))
+
+
+@app.command()
+def detect_trips(
+    from_date: Annotated[datetime, typer.Option(formats=["%Y-%m-%d"], help=("First day of the range, UTC."))],
+    till_date: Annotated[datetime, typer.Option(formats=["%Y-%m-%d"], help=("Day after the range, UTC."))],
+    vehicle_id: Annotated[
+        list[int], typer.Option(help=("Vehicles to process, all when omitted. Repeat for several vehicles."))
+    ] = None,
+    replace: Annotated[bool, typer.Option(help=("Remove trips starting in the range first."))] = False,
+    till_point_id: Annotated[
+        int, typer.Option(help=("Track point id the detectors started after, later points are left to them."))
+    ] = None,
+):
+    """
+    Detects trips from historical track points, a trip open at the end of the range is closed there.
+    Pass the point id `trip-detector` started after, so points are not processed by both.
+    ```python manage.py detect-trips --from-date 2024-01-01 --till-date 2024-06-02 --till-point-id 123456 --replace```
+    """
+    utc = ZoneInfo("UTC")
+    trips_count = asyncio.run(
+        TripDetectionService(UnitOfWork()).backfill(
+            from_date.replace(tzinfo=utc), till_date.replace(tzinfo=utc), vehicle_id or None, replace, till_point_id
+        )
+    )
+    print(f"{trips_count} trips saved")
+
+
+@app.command()
+def check_query_budget(
+    username: Annotated[str, typer.Option(help=("User to call the endpoints with."))],
+    password: Annotated[str, typer.Option(help=("Password of the user."))],
+    base_url: Annotated[str, typer.Option(help=("Server started with QUERY_COUNT_HEADER=true."))] = (
+        "http://127.0.0.1:8001"
+    ),
+):
+    """
+    Fails when a read endpoint executes more SQL statements than its budget in ENDPOINT_QUERY_BUDGETS.
+    ```python manage.py check-query-budget --username admin --password secret```
+    """
+    results = check_query_budgets(base_url, username, password)
+    over_budget = 0
+    for path, (query_count, budget) in results.items():
+        over_budget += query_count > budget
+        print(f"{'FAIL' if query_count > budget else 'ok'} {path}: {query_count} queries, budget {budget}")
+    if over_budget:
+        print(f"{over_budget} endpoints are over budget")
+        raise typer.Exit(code=1)
+
+
+@app.command()
+def load_test(
+    username: Annotated[str, typer.Option(help=("User to call the endpoints with."))],
+    password: Annotated[str, typer.Option(help=("Password of the user."))],
+    requests_num: Annotated[int, typer.Option(help=("Number of requests to send."))] = 200,
+    concurrency: Annotated[int, typer.Option(help=("Number of requests sent at once."))] = 20,
+    base_url: Annotated[str, typer.Option(help=("Server started with QUERY_COUNT_HEADER=true."))] = (
+        "http://127.0.0.1:8001"
+    ),
+):
+    """
+    Loads read endpoints and prints pool connections, SQL statements and p95 latency per request.
+    ```python manage.py load-test --username admin --password secret --concurrency 50```
+    """
+    results = run_load_test(base_url, username, password, requests_num, concurrency)
+    for path, (count, mean_connections, max_connections, mean_queries, p95) in results.items():
+        print(
+            f"{path}: {count} requests, connections {mean_connections:.2f} (max {max_connections}), "
+            f"queries {mean_queries:.2f}, p95 {p95:.1f} ms"
+        )
+
+
+@app.command()
+def check_replicas_routing(
+    reads: Annotated[int, typer.Option(help=("Number of read only sessions to route."))] = 10,
+):
+    """
+    Prints lag of every replica in DB_REPLICA_URLS and where read only sessions are routed. Stop a replica or
+    pause its replay (`SELECT pg_wal_replay_pause()`) to see the reads fall back to the other one or the primary.
+    ```python manage.py check-replicas-routing --reads 20```
+    """
+    lags, routed = asyncio.run(check_replicas(reads))
+    for url, lag in lags.items():
+        print(f"{url}: lag {lag}")
+    for database, count in routed.items():
+        print(f"{database}: {count} reads")
+
+
 if __name__ == "__main__":
     app()
@@ -0,0 +1,65 @@
+"""Per-point cost of the track point serializers: legacy WKB -> shapely -> WKT -> split vs database coordinates."""
+
+import random
+from datetime import datetime, timedelta
+from time import perf_counter
+from types import SimpleNamespace
+
+from fastapi.exceptions import ValidationException
+from geoalchemy2.shape import from_shape
+from shapely.geometry import Point
+
+from app.api.schemas.vehicle_track_point import (
+    VehicleTrackPoint,
+    VehicleTrackPointGeoFromDB,
+    from_geo_point_to_lat_long,
+)
+
+
+def legacy_from_geo_point_to_lat_long(track_point, *, tz="UTC"):
+    tp_json = VehicleTrackPointGeoFromDB.model_validate_datetime_with_tz(track_point, tz).model_dump()
+    match tp_json["geotag"].replace("(", "").replace(")", "").split():
+        case ["POINT", long, lat] if long is not None and lat is not None:
+            pass
+        case _:
+            raise ValidationException({"geom": "Wrong data of POINT type"})
+    return VehicleTrackPoint(
+        id=tp_json["id"],
+        date_time=tp_json["date_time"],
+        long=long,
+        lat=lat,
+        vehicle_id=tp_json["vehicle_id"],
+    )
+
+
+def make_track_points(count: int) -> list:
+    start = datetime(2024, 1, 1, 0, 0, 0).astimezone()
+    track_points = []
+    for ind in range(count):
+        long, lat = 37 + random.random(), 55 + random.random()
+        track_points.append(
+            SimpleNamespace(
+                id=ind,
+                date_time=start + timedelta(seconds=10 * ind),
+                geotag=from_shape(Point(long, lat)),
+                long=long,
+                lat=lat,
+                vehicle_id=1,
+            )
+        )
+    return track_points
+
+
+def measure(serializer, track_points: list, tz: str) -> float:
+    started = perf_counter()
+    for track_point in track_points:
+        serializer(track_point, tz=tz)
+    return (perf_counter() - started) / len(track_points)
+
+
+def run_benchmark(count: int = 10000, tz: str = "Europe/Moscow") -> dict:
+    """Returns per-point cost in microseconds for both serializers."""
+    # the legacy path rewrites datetimes of the passed objects, so each run gets its own copy
+    legacy_cost = measure(legacy_from_geo_point_to_lat_long, make_track_points(count), tz)
+    current_cost = measure(from_geo_point_to_lat_long, make_track_points(count), tz)
+    return {"legacy": legacy_cost * 1e6, "current": current_cost * 1e6}
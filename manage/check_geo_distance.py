@@ -0,0 +1,51 @@
+"""Compares the NumPy haversine engine with geopy geodesic distances and measures a year-long report."""
+
+from time import perf_counter
+
+import numpy as np
+from geopy.distance import geodesic
+
+from app.utils.geo_distance import segment_lengths_km, sum_segments_by_period
+
+SECONDS_PER_YEAR = 365 * 24 * 3600
+
+
+def make_track(count: int, seed: int = 0) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Random walk around Moscow with a point every 10 seconds."""
+    rng = np.random.default_rng(seed)
+    longs = 37.6 + np.cumsum(rng.normal(0, 0.0005, count))
+    lats = 55.7 + np.cumsum(rng.normal(0, 0.0003, count))
+    date_times = np.datetime64("2024-01-01T00:00:00", "us") + np.arange(count) * np.timedelta64(10, "s")
+    return date_times, longs, lats
+
+
+def compare_with_geopy(count: int = 10000, tolerance: float = 0.005) -> dict:
+    """Relative difference of the track length, raises AssertionError when it exceeds the tolerance."""
+    date_times, longs, lats = make_track(count)
+    started = perf_counter()
+    geopy_length = sum(
+        geodesic((lats[ind], longs[ind]), (lats[ind + 1], longs[ind + 1])).km for ind in range(count - 1)
+    )
+    geopy_time = perf_counter() - started
+
+    started = perf_counter()
+    numpy_length = float(segment_lengths_km(longs, lats).sum())
+    numpy_time = perf_counter() - started
+
+    relative_error = abs(numpy_length - geopy_length) / geopy_length
+    assert relative_error <= tolerance, f"relative error {relative_error:.5f} exceeds {tolerance}"
+    return {
+        "geopy_km": geopy_length,
+        "numpy_km": numpy_length,
+        "relative_error": relative_error,
+        "geopy_ms": geopy_time * 1000,
+        "numpy_ms": numpy_time * 1000,
+    }
+
+
+def measure_year_report(period: str = "daily") -> float:
+    """Milliseconds spent on per-period sums of a year of points taken every 10 seconds."""
+    date_times, longs, lats = make_track(SECONDS_PER_YEAR // 10)
+    started = perf_counter()
+    sum_segments_by_period(date_times, longs, lats, period)
+    return (perf_counter() - started) * 1000
@@ -0,0 +1,30 @@
+"""Runs both mileage engines (and the daily rollup) on the same vehicle and period, reports differences."""
+
+from datetime import date
+
+from app.services.report_service import ReportService
+from app.utils.unitofwork import UnitOfWork
+
+
+async def compare_mileage_engines(
+    vehicle_id: int, period: str, from_date: date, till_date: date, tolerance_km: float = 0.001
+) -> dict:
+    """
+    Returns {period_label: (python_km, postgis_km, rollup_km)} of the periods where any pair differs more than
+    tolerance_km. Rollup days also count the segment from the previous day's last point, so the first period of
+    the range may differ by that segment.
+    """
+    report_service = ReportService(UnitOfWork())
+    results = [
+        await report_service.get_mileage_by_period(
+            vehicle_id, period, from_date, till_date, engine, use_rollup=use_rollup
+        )
+        for engine, use_rollup in (("python", False), ("postgis", False), (None, True))
+    ]
+
+    mismatches = {}
+    for label in sorted(set().union(*results)):
+        values = tuple(result.get(label) for result in results)
+        if None in values or max(values) - min(values) > tolerance_km:
+            mismatches[label] = values
+    return mismatches
@@ -0,0 +1,67 @@
+"""
+Calls read endpoints of a running server and checks how many SQL statements each of them executed.
+The server should be started with QUERY_COUNT_HEADER=true.
+"""
+
+import requests
+
+from app.utils.query_counter import QUERY_COUNT_HEADER
+
+# statements of loading the principal: the user and its enterprises, made while principal_cache has no entry of it
+AUTHENTICATION_QUERY_BUDGET = 2
+# statements per request with the principal cached
+ENDPOINT_QUERY_BUDGETS = {
+    "/users/current_user": 0,
+    "/enterprise/enterprises/short/": 1,
+    "/enterprise/enterprises/": 5,
+    "/enterprise/enterprises/{enterprise_id}": 5,
+    "/driver/drivers/?size=100": 3,
+    "/vehicle/vehicles/?size=100": 2,
+    "/vehicle/vehicles_names/?enterprise_id={enterprise_id}": 1,
+    "/vehicle/vehicles/{vehicle_id}": 1,
+    "/vehicle_brand/vehicle_brands/": 1,
+    "/vehicle_model/vehicle_models/": 1,
+    "/vehicle_model/vehicle_models/brandmodel/": 1,
+    "/vehicle_track_point/tracks/?vehicle_id={vehicle_id}": 1,
+    "/trip/trips/": 1,
+    "/report/reports/": 1,
+}
+
+
+def _get(session: requests.Session, base_url: str, path: str) -> requests.Response:
+    response = session.get(f"{base_url}{path}")
+    response.raise_for_status()
+    if QUERY_COUNT_HEADER not in response.headers:
+        raise RuntimeError(f"{QUERY_COUNT_HEADER} header is missing, start the server with QUERY_COUNT_HEADER=true")
+    return response
+
+
+def check_query_budgets(base_url: str, username: str, password: str, budgets: dict = None) -> dict:
+    """
+    Returns {path: (query_count, budget)} of every checked endpoint. Endpoints needing an enterprise or a vehicle
+    are skipped when the user does not see any.
+    """
+    budgets = ENDPOINT_QUERY_BUDGETS if budgets is None else budgets
+    base_url = base_url.rstrip("/")
+    session = requests.Session()
+    token = session.post(f"{base_url}/token", data={"username": username, "password": password})
+    token.raise_for_status()
+    session.headers["Authorization"] = f"Bearer {token.json()['access_token']}"
+
+    # the first request opens pool connections and fills the principal cache
+    _get(session, base_url, "/users/current_user")
+    enterprises = _get(session, base_url, "/enterprise/enterprises/short/").json()
+    vehicles = _get(session, base_url, "/vehicle/vehicles/?size=1").json()["results"]
+    ids = {
+        "enterprise_id": enterprises[0]["id"] if enterprises else None,
+        "vehicle_id": vehicles[0]["id"] if vehicles else None,
+    }
+
+    results = {}
+    for path_template, budget in budgets.items():
+        if any(f"{{{name}}}" in path_template and value is None for name, value in ids.items()):
+            continue
+        path = path_template.format(**ids)
+        response = _get(session, base_url, path)
+        results[path] = (int(response.headers[QUERY_COUNT_HEADER]), budget)
+    return results
@@ -0,0 +1,27 @@
+"""Checks replication lag of DB_REPLICA_URLS and how read only units of work are routed between them."""
+
+from collections import Counter
+
+from app.db.replicas import replica_router
+
+
+async def check_replicas(reads: int = 10) -> tuple[dict, Counter]:
+    """
+    Returns ({replica url: lag in seconds or error}, Counter of the databases `reads` read only sessions went to).
+    """
+    lags = {}
+    for index, engine in enumerate(replica_router.engines):
+        url = engine.url.render_as_string(hide_password=True)
+        try:
+            lags[url] = await replica_router.get_lag(index)
+        except Exception as error:  # the error is reported instead of the lag
+            lags[url] = f"{type(error).__name__}: {error}"
+
+    routed = Counter()
+    for _ in range(reads):
+        session_maker = await replica_router.get_session_maker()
+        if session_maker is None:
+            routed["primary"] += 1
+        else:
+            routed[session_maker.kw["bind"].url.render_as_string(hide_password=True)] += 1
+    return lags, routed
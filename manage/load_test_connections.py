@@ -0,0 +1,74 @@
+"""
+Sends concurrent requests to read endpoints of a running server and reports how many pool connections and SQL
+statements a request took. The server should be started with QUERY_COUNT_HEADER=true, run it once with
+DB_REQUEST_SCOPED_SESSION=false and once with true to compare.
+"""
+
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from app.utils.query_counter import CONNECTION_COUNT_HEADER, QUERY_COUNT_HEADER
+
+LOAD_TEST_PATHS = (
+    "/users/current_user",
+    "/enterprise/enterprises/short/",
+    "/driver/drivers/?size=20",
+    "/vehicle/vehicles/?size=20",
+    "/trip/trips/?size=20",
+)
+
+
+def _login(base_url: str, username: str, password: str) -> str:
+    response = requests.post(f"{base_url}/token", data={"username": username, "password": password})
+    response.raise_for_status()
+    return response.json()["access_token"]
+
+
+def run_load_test(
+    base_url: str, username: str, password: str, requests_num: int = 200, concurrency: int = 20, paths=None
+) -> dict:
+    """
+    Returns {path: (requests, mean connections, max connections, mean queries, p95 latency in ms)}.
+    """
+    paths = LOAD_TEST_PATHS if paths is None else paths
+    base_url = base_url.rstrip("/")
+    headers = {"Authorization": f"Bearer {_login(base_url, username, password)}"}
+
+    def call(path: str) -> tuple[str, int, int, float]:
+        started = time.perf_counter()
+        response = requests.get(f"{base_url}{path}", headers=headers)
+        elapsed = (time.perf_counter() - started) * 1000
+        response.raise_for_status()
+        if CONNECTION_COUNT_HEADER not in response.headers:
+            raise RuntimeError(
+                f"{CONNECTION_COUNT_HEADER} header is missing, start the server with QUERY_COUNT_HEADER=true"
+            )
+        return (
+            path,
+            int(response.headers[CONNECTION_COUNT_HEADER]),
+            int(response.headers[QUERY_COUNT_HEADER]),
+            elapsed,
+        )
+
+    calls = [paths[i % len(paths)] for i in range(requests_num)]
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        samples = list(executor.map(call, calls))
+
+    results = {}
+    for path in paths:
+        path_samples = [sample for sample in samples if sample[0] == path]
+        if not path_samples:
+            continue
+        connections = [sample[1] for sample in path_samples]
+        latencies = sorted(sample[3] for sample in path_samples)
+        results[path] = (
+            len(path_samples),
+            statistics.mean(connections),
+            max(connections),
+            statistics.mean(sample[2] for sample in path_samples),
+            latencies[int(0.95 * (len(latencies) - 1))],
+        )
+    return results
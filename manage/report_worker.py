@@ -0,0 +1,28 @@
+"""Report job worker, several processes (and several tasks per process) drain the queue in parallel."""
+
+import asyncio
+import logging
+
+from app.services.report_service import ReportService
+from app.utils.unitofwork import UnitOfWork
+
+logger = logging.getLogger(__name__)
+
+
+async def run_report_worker(concurrency: int = 1, poll_interval: float = 1.0, burst: bool = False) -> None:
+    async def worker():
+        # every task has its own unit of work, a session can not be shared by concurrent tasks
+        report_service = ReportService(UnitOfWork())
+        while True:
+            try:
+                processed = await report_service.process_next_job()
+            except Exception:
+                logger.exception("Report job processing failed")
+                processed = False
+            if processed:
+                continue
+            if burst:
+                return
+            await asyncio.sleep(poll_interval)
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
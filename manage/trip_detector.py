@@ -0,0 +1,55 @@
+"""Live trip detector, one process per shard of vehicles reads new track points and opens and closes trips."""
+
+import asyncio
+import logging
+
+from sqlalchemy import func, select
+
+from app.db.database import engine
+from app.services.trip_detection_service import TripDetectionService
+from app.utils.unitofwork import UnitOfWork
+
+logger = logging.getLogger(__name__)
+
+
+async def run_trip_detector(
+    shard: int = 0,
+    shards: int = 1,
+    poll_interval: float = 1.0,
+    batch_size: int = None,
+    burst: bool = False,
+    from_point_id: int = None,
+) -> None:
+    # the session level lock of the shard is held by this connection while the detector runs
+    async with engine.connect() as lock_connection:
+        locked = await lock_connection.scalar(select(func.pg_try_advisory_lock(shard, shards)))
+        await lock_connection.commit()
+        if not locked:
+            logger.error("Shard %s/%s is processed by another detector", shard, shards)
+            raise SystemExit(1)
+        await _run_shard(shard, shards, poll_interval, batch_size, burst, from_point_id)
+
+
+async def _run_shard(
+    shard: int, shards: int, poll_interval: float, batch_size: int | None, burst: bool, from_point_id: int | None
+) -> None:
+    trip_detection_service = TripDetectionService(UnitOfWork(), shard, shards, from_point_id)
+    async with trip_detection_service.uow:
+        last_point_id = await trip_detection_service.uow.tripdetectioncursor.get_last_point_id(shard, shards)
+    if last_point_id is None:
+        async with trip_detection_service.uow:
+            start_point_id = trip_detection_service.from_point_id = await trip_detection_service.get_start_point_id()
+        logger.info("Shard %s/%s starts after track point %s, backfill history up to it", shard, shards, start_point_id)
+    else:
+        logger.info("Shard %s/%s continues after track point %s", shard, shards, last_point_id)
+    while True:
+        try:
+            points_count = await trip_detection_service.process_next_batch(batch_size)
+        except Exception:
+            logger.exception("Trip detection batch failed")
+            points_count = 0
+        if points_count:
+            continue
+        if burst:
+            return
+        await asyncio.sleep(poll_interval)
@@ -0,0 +1,117 @@
+import os
+
+# settings are read at import of app modules, unit tests never connect to the database
+for name, value in {
+    "POSTGRES_HOST": "localhost",
+    "POSTGRES_PORT": "5432",
+    "POSTGRES_USER": "postgres",
+    "POSTGRES_PASSWORD": "postgres",
+    "POSTGRES_NAME": "postgres",
+}.items():
+    os.environ.setdefault(name, value)
+
+import pytest  # noqa: E402
+from sqlalchemy import insert, text  # noqa: E402
+from sqlalchemy.exc import SQLAlchemyError  # noqa: E402
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession, async_sessionmaker, create_async_engine  # noqa: E402
+from sqlalchemy.pool import NullPool  # noqa: E402
+
+from app.core.config import settings  # noqa: E402
+from app.db.models import Enterprise, Vehicle, VehicleBrand, VehicleModel  # noqa: E402
+from app.utils.unitofwork import UnitOfWork  # noqa: E402
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+async def db_engine():
+    """Engine of the database of POSTGRES_* settings, tests using it are skipped when the database is unreachable."""
+    engine = create_async_engine(settings.ASYNC_DATABASE_URL, poolclass=NullPool, connect_args={"timeout": 3})
+    try:
+        async with engine.connect() as connection:
+            await connection.execute(text("SELECT 1"))
+    except (OSError, SQLAlchemyError) as error:
+        await engine.dispose()
+        pytest.skip(f"PostgreSQL is not available: {error}")
+    yield engine
+    await engine.dispose()
+
+
+@pytest.fixture
+async def migrated_db_engine(db_engine):
+    """db_engine of a database migrated by `alembic upgrade head`, tests using it are skipped otherwise."""
+    async with db_engine.connect() as connection:
+        migrated = (await connection.execute(text("SELECT to_regclass('vehicletrackpoint')"))).scalar()
+    if migrated is None:
+        pytest.skip("The database is not migrated, run `alembic upgrade head`")
+    return db_engine
+
+
+@pytest.fixture
+async def db_connection(db_engine):
+    """Connection in a transaction which is rolled back after the test."""
+    async with db_engine.connect() as connection:
+        transaction = await connection.begin()
+        yield connection
+        await transaction.rollback()
+
+
+@pytest.fixture
+def uow(migrated_db_engine, db_connection) -> UnitOfWork:
+    """Unit of work on db_connection, its blocks run in savepoints and commits are rolled back with the test."""
+    uow = UnitOfWork()
+    uow.session_factory = async_sessionmaker(
+        bind=db_connection, class_=AsyncSession, join_transaction_mode="create_savepoint"
+    )
+    return uow
+
+
+async def _add_fleet(connection: AsyncConnection, company_timezone: str = "UTC", name: str = "Test") -> dict:
+    enterprise_id = await connection.scalar(
+        insert(Enterprise)
+        .values(
+            company_name=f"{name} enterprise",
+            company_address=f"{name} street 1",
+            contact_email="fleet@example.com",
+            company_timezone=company_timezone,
+        )
+        .returning(Enterprise.id)
+    )
+    brand_id = await connection.scalar(
+        insert(VehicleBrand).values(brand_name=f"{name} brand", original_country="DE").returning(VehicleBrand.id)
+    )
+    brandmodel_id = await connection.scalar(
+        insert(VehicleModel)
+        .values(
+            exact_model_name=f"{name} model",
+            vehicle_type="truck",
+            passenger_capacity=2,
+            tonnage=10,
+            fuel_capacity=300,
+            brand_id=brand_id,
+        )
+        .returning(VehicleModel.id)
+    )
+    vehicle_id = await connection.scalar(
+        insert(Vehicle)
+        .values(manufactured_year=2020, mileage=0, brandmodel_id=brandmodel_id, enterprise_id=enterprise_id)
+        .returning(Vehicle.id)
+    )
+    return {
+        "enterprise_id": enterprise_id,
+        "brand_id": brand_id,
+        "brandmodel_id": brandmodel_id,
+        "vehicle_id": vehicle_id,
+    }
+
+
+@pytest.fixture
+def add_fleet():
+    """
+    `await add_fleet(connection, company_timezone)` adds an enterprise with one vehicle of a new brand and model,
+    returns their ids.
+    """
+    return _add_fleet
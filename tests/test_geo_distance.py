@@ -0,0 +1,107 @@
+from datetime import date, datetime
+
+import numpy as np
+import pytest
+from pytz import timezone
+
+from app.db.rollup import missing_day_spans
+from app.utils.datetime_utils import localize_datetime
+from app.utils.geo_distance import (
+    get_period_keys,
+    get_period_labels,
+    segment_lengths_km,
+    sum_segments_by_group_and_period,
+    sum_segments_by_period,
+    sum_values_by_period,
+)
+
+# one degree of a meridian on the mean Earth radius
+DEGREE_KM = 111.19508
+
+
+def to_datetime64(date_times: list[datetime]) -> np.ndarray:
+    return np.array(date_times, dtype="datetime64[us]")
+
+
+def test_segment_lengths():
+    lengths = segment_lengths_km([37.0, 37.0, 37.0], [55.0, 56.0, 56.0])
+    assert lengths == pytest.approx([DEGREE_KM, 0.0], abs=1e-3)
+    assert segment_lengths_km([37.0], [55.0]).size == 0
+
+
+@pytest.mark.parametrize(
+    "period, date_times, labels",
+    [
+        ("daily", [datetime(2024, 1, 31, 23, 59), datetime(2024, 2, 29)], ["2024-01-31", "2024-02-29"]),
+        ("monthly", [datetime(2023, 12, 31), datetime(2024, 1, 1)], ["2023-12", "2024-01"]),
+        ("quarterly", [datetime(2023, 12, 31), datetime(2024, 4, 1), datetime(2024, 6, 30)], ["2023-Q4", "2024-Q2"]),
+        ("annually", [datetime(2023, 12, 31, 23), datetime(2024, 1, 1)], ["2023", "2024"]),
+    ],
+)
+def test_period_labels(period, date_times, labels):
+    keys = get_period_keys(to_datetime64(date_times), period)
+    assert get_period_labels(np.unique(keys), period) == labels
+
+
+def test_unknown_period():
+    with pytest.raises(ValueError):
+        get_period_keys(to_datetime64([datetime(2024, 1, 1)]), "weekly")
+
+
+def test_sum_values_by_period():
+    date_times = to_datetime64([datetime(2024, 1, 1), datetime(2024, 1, 31), datetime(2024, 3, 1)])
+    assert sum_values_by_period(date_times, [1.5, 2.0, 4.0], "monthly") == {"2024-01": 3.5, "2024-03": 4.0}
+    assert sum_values_by_period([], [], "monthly") == {}
+
+
+def test_segment_counted_in_period_of_its_end():
+    date_times = to_datetime64([datetime(2024, 1, 1, 23, 50), datetime(2024, 1, 2, 0, 10), datetime(2024, 1, 2, 1)])
+    mileage = sum_segments_by_period(date_times, [37.0, 37.0, 37.0], [55.0, 56.0, 57.0], "daily")
+    assert mileage == pytest.approx({"2024-01-01": 0.0, "2024-01-02": 2 * DEGREE_KM}, abs=1e-3)
+    assert sum_segments_by_period([], [], [], "daily") == {}
+
+
+def test_segments_never_join_groups():
+    mileage = sum_segments_by_group_and_period(
+        [1, 1, 2, 2],
+        to_datetime64([datetime(2024, 1, 1, hour) for hour in range(4)]),
+        [37.0, 37.0, 10.0, 10.0],
+        [55.0, 56.0, 0.0, 1.0],
+        "daily",
+    )
+    assert list(mileage) == [1, 2]
+    assert mileage[1] == pytest.approx({"2024-01-01": DEGREE_KM}, abs=1e-3)
+    assert mileage[2] == pytest.approx({"2024-01-01": DEGREE_KM}, abs=1e-3)
+
+
+def test_points_are_bucketed_by_local_day():
+    # the database returns date_time in local time of the enterprise, 22:30 UTC is the next day in Moscow
+    utc_date_times = [datetime(2024, 1, 1, 20, 30), datetime(2024, 1, 1, 22, 30)]
+    local_date_times = [
+        timezone("UTC").localize(date_time).astimezone(timezone("Europe/Moscow")).replace(tzinfo=None)
+        for date_time in utc_date_times
+    ]
+    mileage = sum_segments_by_period(to_datetime64(local_date_times), [37.0, 37.0], [55.0, 56.0], "daily")
+    assert mileage == pytest.approx({"2024-01-01": 0.0, "2024-01-02": DEGREE_KM}, abs=1e-3)
+
+
+@pytest.mark.parametrize(
+    "local_midnight, tz, utc_date_time",
+    [
+        (datetime(2024, 1, 2), "Europe/Moscow", datetime(2024, 1, 1, 21)),
+        (datetime(2024, 3, 10), "America/New_York", datetime(2024, 3, 10, 5)),
+        (datetime(2024, 3, 11), "America/New_York", datetime(2024, 3, 11, 4)),
+    ],
+)
+def test_report_day_bounds(local_midnight, tz, utc_date_time):
+    assert localize_datetime(local_midnight, tz) == timezone("UTC").localize(utc_date_time)
+
+
+def test_missing_day_spans():
+    present_days = {(1, date(2024, 1, 2)), (2, date(2024, 1, 1)), (2, date(2024, 1, 2)), (2, date(2024, 1, 3))}
+    spans = missing_day_spans([1, 2, 3], date(2024, 1, 1), date(2024, 1, 3), present_days)
+    assert spans == {
+        (date(2024, 1, 1), date(2024, 1, 1)): [1],
+        (date(2024, 1, 3), date(2024, 1, 3)): [1],
+        (date(2024, 1, 1), date(2024, 1, 3)): [3],
+    }
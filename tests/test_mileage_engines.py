@@ -0,0 +1,110 @@
+import math
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import insert
+
+from app.db.models import VehicleTrackPoint
+from app.services.report_service import ReportService
+from app.utils.datetime_utils import localize_datetime
+
+pytestmark = pytest.mark.anyio
+
+TZ = "Europe/Berlin"
+# local midnights of 30 and 31 March, the switch to summer time at 2024-03-31 02:00 and the end of the month
+FIRST_POINT = localize_datetime(datetime(2024, 3, 30, 20), TZ, "UTC")
+POINTS_COUNT = 33 * 6
+POINTS_INTERVAL = timedelta(minutes=10)
+FROM_DATE_TIME = localize_datetime(datetime(2024, 3, 30), TZ, "UTC")
+TILL_DATE_TIME = localize_datetime(datetime(2024, 4, 2), TZ, "UTC")
+
+
+async def add_track(connection, vehicle_id: int) -> None:
+    points = []
+    for index in range(POINTS_COUNT):
+        long = 13.0 + index * 0.002
+        lat = 52.5 + 0.0002 * math.sin(index / 3)
+        points.append(
+            {
+                "date_time": FIRST_POINT + index * POINTS_INTERVAL,
+                "geotag": f"POINT({long} {lat})",
+                "vehicle_id": vehicle_id,
+            }
+        )
+    await connection.execute(insert(VehicleTrackPoint), points)
+
+
+@pytest.mark.parametrize(
+    "period, labels",
+    [
+        ("daily", ["2024-03-30", "2024-03-31", "2024-04-01"]),
+        ("monthly", ["2024-03", "2024-04"]),
+    ],
+)
+async def test_postgis_engine_matches_python_engine(uow, db_connection, add_fleet, period, labels):
+    fleet = await add_fleet(db_connection, TZ)
+    vehicle_id = fleet["vehicle_id"]
+    await add_track(db_connection, vehicle_id)
+
+    report_service = ReportService(uow)
+    async with uow:
+        python_mileage = await report_service._get_mileage_python(
+            [vehicle_id], FROM_DATE_TIME, TILL_DATE_TIME, period, TZ
+        )
+        postgis_mileage = await report_service._get_mileage_postgis(
+            [vehicle_id], FROM_DATE_TIME, TILL_DATE_TIME, period, TZ
+        )
+
+    assert list(python_mileage) == list(postgis_mileage) == [vehicle_id]
+    assert sorted(python_mileage[vehicle_id]) == sorted(postgis_mileage[vehicle_id]) == labels
+    for label in labels:
+        # the engines may differ by the Earth radius only, 6371.0088 km against 6370.986 km of ST_DistanceSphere
+        assert postgis_mileage[vehicle_id][label] == pytest.approx(python_mileage[vehicle_id][label], rel=1e-5)
+    total_km = sum(python_mileage[vehicle_id].values())
+    assert total_km == pytest.approx((POINTS_COUNT - 1) * 0.002 * 111.195 * math.cos(math.radians(52.5)), rel=0.02)
+
+
+async def test_segments_are_counted_in_local_days(uow, db_connection, add_fleet):
+    """The points of 30 March after 23:00 UTC belong to 31 March in Berlin, an hour of it was skipped by DST."""
+    fleet = await add_fleet(db_connection, TZ)
+    vehicle_id = fleet["vehicle_id"]
+    await add_track(db_connection, vehicle_id)
+
+    async with uow:
+        mileage = await ReportService(uow)._get_mileage_postgis(
+            [vehicle_id], FROM_DATE_TIME, TILL_DATE_TIME, "daily", TZ
+        )
+
+    segment_km = 0.002 * 111.195 * math.cos(math.radians(52.5))
+    # 20:00-24:00 local of 30 March is 24 points, 23 segments
+    assert mileage[vehicle_id]["2024-03-30"] == pytest.approx(23 * segment_km, rel=0.02)
+    # 31 March has 23 hours
+    assert mileage[vehicle_id]["2024-03-31"] == pytest.approx(23 * 6 * segment_km, rel=0.02)
+
+
+@pytest.mark.parametrize("engine", ["python", "postgis"])
+async def test_open_day_counts_segment_from_previous_day(uow, db_connection, add_fleet, engine):
+    fleet = await add_fleet(db_connection, "UTC")
+    vehicle_id = fleet["vehicle_id"]
+    today = datetime.now(tz=timezone.utc).date()
+    midnight = datetime.combine(today, datetime.min.time(), tzinfo=timezone.utc)
+    await db_connection.execute(
+        insert(VehicleTrackPoint),
+        [
+            {
+                "date_time": midnight + timedelta(minutes=minutes),
+                "geotag": f"POINT({long} 52.5)",
+                "vehicle_id": vehicle_id,
+            }
+            for minutes, long in ((-10, 13.0), (10, 13.002), (20, 13.004))
+        ],
+    )
+
+    async with uow:
+        mileage = await ReportService(uow)._get_mileage_with_rollup(
+            [vehicle_id], "daily", today - timedelta(days=1), today, "UTC", engine
+        )
+
+    segment_km = 0.002 * 111.195 * math.cos(math.radians(52.5))
+    assert mileage[vehicle_id][str(today - timedelta(days=1))] == 0
+    assert mileage[vehicle_id][str(today)] == pytest.approx(2 * segment_km, rel=0.01)
@@ -0,0 +1,102 @@
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy import delete, event, insert
+
+from app.db.database import engine
+from app.db.models import (
+    Enterprise,
+    User,
+    Vehicle,
+    VehicleBrand,
+    VehicleTrackPoint,
+    user_enterprise_association_table,
+)
+from app.utils.auth import create_access_token, principal_cache
+from app.utils.query_counter import (
+    QUERY_COUNT_HEADER,
+    QueryCountMiddleware,
+    _count_checkout,
+    _count_query,
+    install_query_counter,
+)
+from main import app
+from manage.check_query_budget import AUTHENTICATION_QUERY_BUDGET, ENDPOINT_QUERY_BUDGETS
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def fleet_manager(migrated_db_engine, add_fleet):
+    """Committed fleet with a few track points and its manager, the app reads them through its own connections."""
+    username = f"manager-{uuid.uuid4().hex}"
+    async with migrated_db_engine.begin() as connection:
+        fleet = await add_fleet(connection, name=username)
+        user_id = await connection.scalar(
+            insert(User)
+            .values(
+                username=username,
+                first_name="Fleet",
+                last_name="Manager",
+                email="manager@example.com",
+                password="secret",
+                role="manager",
+            )
+            .returning(User.id)
+        )
+        await connection.execute(
+            insert(user_enterprise_association_table).values(user_id=user_id, enterprise_id=fleet["enterprise_id"])
+        )
+        now = datetime.now(timezone.utc)
+        await connection.execute(
+            insert(VehicleTrackPoint),
+            [
+                {
+                    "date_time": now - timedelta(minutes=minutes),
+                    "geotag": f"POINT({13.0 + minutes * 0.001} 52.5)",
+                    "vehicle_id": fleet["vehicle_id"],
+                }
+                for minutes in range(5)
+            ],
+        )
+    yield {"username": username, **fleet}
+
+    async with migrated_db_engine.begin() as connection:
+        # track points go with the vehicle, the model with the brand and memberships with the user
+        await connection.execute(delete(Vehicle).where(Vehicle.id == fleet["vehicle_id"]))
+        await connection.execute(delete(VehicleBrand).where(VehicleBrand.id == fleet["brand_id"]))
+        await connection.execute(delete(User).where(User.id == user_id))
+        await connection.execute(delete(Enterprise).where(Enterprise.id == fleet["enterprise_id"]))
+    principal_cache.pop(username)
+
+
+@pytest.fixture
+async def client(migrated_db_engine):
+    """Client of the app counting statements of its engine, as with QUERY_COUNT_HEADER=true."""
+    install_query_counter(engine)
+    try:
+        async with AsyncClient(
+            transport=ASGITransport(app=QueryCountMiddleware(app)), base_url="http://test"
+        ) as client:
+            yield client
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", _count_query)
+        event.remove(engine.sync_engine, "checkout", _count_checkout)
+        # pool connections belong to the event loop of the test
+        await engine.dispose()
+
+
+@pytest.mark.parametrize("path_template, budget", ENDPOINT_QUERY_BUDGETS.items())
+async def test_endpoint_query_budget(client, fleet_manager, path_template, budget):
+    path = path_template.format(**fleet_manager)
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': fleet_manager['username']})}"}
+
+    principal_cache.pop(fleet_manager["username"])
+    cold = await client.get(path, headers=headers)
+    warm = await client.get(path, headers=headers)
+
+    assert cold.status_code == warm.status_code == 200, cold.text
+    assert int(cold.headers[QUERY_COUNT_HEADER]) <= budget + AUTHENTICATION_QUERY_BUDGET
+    assert int(warm.headers[QUERY_COUNT_HEADER]) <= budget
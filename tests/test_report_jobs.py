@@ -0,0 +1,52 @@
+from datetime import date
+
+import pytest
+from sqlalchemy import func, select
+
+from app.db.models.report import ReportJob, ReportJobStatusChoices, VehicleMileageReport
+from app.services.report_service import ReportService
+
+pytestmark = pytest.mark.anyio
+
+REPORT_INPUTS = {"period": "daily", "from_date": date(2024, 5, 1), "till_date": date(2024, 5, 3)}
+
+
+async def count_jobs(db_connection, vehicle_id: int) -> int:
+    return await db_connection.scalar(select(func.count()).where(ReportJob.vehicle_id == vehicle_id))
+
+
+async def test_cached_report_is_returned_without_a_job(uow, db_connection, add_fleet):
+    fleet = await add_fleet(db_connection)
+    async with uow:
+        report = VehicleMileageReport(
+            title="cached",
+            period=REPORT_INPUTS["period"],
+            from_date=REPORT_INPUTS["from_date"],
+            to_date=REPORT_INPUTS["till_date"],
+            report_result={},
+            computed_snapshot=await uow.report.get_current_snapshot(),
+            vehicle_id=fleet["vehicle_id"],
+            enterprise_id=fleet["enterprise_id"],
+        )
+        uow.session.add(report)
+        await uow.session.flush()
+        report_id = report.id
+        await uow.commit()
+
+    job = await ReportService(uow).enqueue_report_by_vehicle(
+        vehicle_id=fleet["vehicle_id"], enterprise_id=fleet["enterprise_id"], **REPORT_INPUTS
+    )
+
+    assert (job.id, job.status, job.report_id) == (None, ReportJobStatusChoices.DONE.value, report_id)
+    assert await count_jobs(db_connection, fleet["vehicle_id"]) == 0
+
+
+async def test_missing_report_is_queued(uow, db_connection, add_fleet):
+    fleet = await add_fleet(db_connection)
+
+    job = await ReportService(uow).enqueue_report_by_vehicle(
+        vehicle_id=fleet["vehicle_id"], enterprise_id=fleet["enterprise_id"], **REPORT_INPUTS
+    )
+
+    assert job.id is not None and job.status == ReportJobStatusChoices.PENDING.value
+    assert await count_jobs(db_connection, fleet["vehicle_id"]) == 1
@@ -0,0 +1,33 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import func, select
+
+from app.db.models import VehicleTrackPoint
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_add_many_inserts_every_batch(uow, db_connection, add_fleet, monkeypatch):
+    fleet = await add_fleet(db_connection)
+    first_point = datetime(2024, 5, 1, tzinfo=timezone.utc)
+    points = [
+        {
+            "date_time": first_point + timedelta(minutes=index),
+            "geotag": f"POINT({13.0 + index * 0.001} 52.5)",
+            "vehicle_id": fleet["vehicle_id"],
+        }
+        for index in range(7)
+    ]
+
+    async with uow:
+        monkeypatch.setattr(uow.vehicletrackpoint, "insert_batch_size", 3)
+        await uow.vehicletrackpoint.add_many(points)
+        await uow.commit()
+
+    stored = await db_connection.execute(
+        select(func.count(), func.min(VehicleTrackPoint.date_time), func.max(VehicleTrackPoint.date_time)).where(
+            VehicleTrackPoint.vehicle_id == fleet["vehicle_id"]
+        )
+    )
+    assert tuple(stored.one()) == (7, points[0]["date_time"], points[-1]["date_time"])
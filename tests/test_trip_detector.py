@@ -0,0 +1,52 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import func, insert, select
+
+from app.db.database import engine
+from app.db.models import Trip, VehicleTrackPoint
+from app.services.trip_detection_service import TripDetectionService
+from manage.trip_detector import run_trip_detector
+
+pytestmark = pytest.mark.anyio
+
+# a shard of its own for the vehicle of a test, cursors of real shards are not touched
+SHARDS = 1000003
+
+
+async def test_second_detector_of_a_shard_exits(db_engine):
+    async with db_engine.connect() as connection:
+        assert await connection.scalar(select(func.pg_try_advisory_lock(0, SHARDS)))
+        try:
+            with pytest.raises(SystemExit):
+                await run_trip_detector(0, SHARDS, burst=True)
+        finally:
+            await connection.scalar(select(func.pg_advisory_unlock(0, SHARDS)))
+            # pool connections belong to the event loop of the test
+            await engine.dispose()
+
+
+async def test_trip_of_idle_vehicle_is_closed(uow, db_connection, add_fleet):
+    fleet = await add_fleet(db_connection)
+    vehicle_id = fleet["vehicle_id"]
+    from_point_id = await db_connection.scalar(select(func.coalesce(func.max(VehicleTrackPoint.id), 0)))
+    # ten minutes at about 40 km/h an hour ago, nothing since
+    first_point = datetime.now(tz=timezone.utc) - timedelta(hours=1)
+    await db_connection.execute(
+        insert(VehicleTrackPoint),
+        [
+            {
+                "date_time": first_point + timedelta(minutes=minute),
+                "geotag": f"POINT({13.0 + minute * 0.01} 52.5)",
+                "vehicle_id": vehicle_id,
+            }
+            for minute in range(11)
+        ],
+    )
+    service = TripDetectionService(uow, vehicle_id % SHARDS, SHARDS, from_point_id)
+
+    assert await service.process_next_batch(batch_size=100) == 11
+
+    trips = (await db_connection.execute(select(Trip.start_date_time).where(Trip.vehicle_id == vehicle_id))).all()
+    assert len(trips) == 1
+    assert not service.states[vehicle_id].has_open_trip
@@ -0,0 +1,87 @@
+import pytest
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.utils.unitofwork import UnitOfWork
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def plain_uow(db_connection) -> UnitOfWork:
+    """Unit of work on db_connection with a temporary table uow_value, the schema of the app is not needed."""
+    await db_connection.execute(text("CREATE TEMPORARY TABLE uow_value (value int)"))
+    uow = UnitOfWork()
+    uow.session_factory = async_sessionmaker(
+        bind=db_connection, class_=AsyncSession, join_transaction_mode="create_savepoint"
+    )
+    return uow
+
+
+async def add_value(uow: UnitOfWork, value: int) -> None:
+    await uow.session.execute(text("INSERT INTO uow_value VALUES (:value)"), {"value": value})
+
+
+async def get_values(db_connection) -> list[int]:
+    return (await db_connection.execute(text("SELECT value FROM uow_value ORDER BY value"))).scalars().all()
+
+
+async def test_uncommitted_nested_block_is_rolled_back(plain_uow, db_connection):
+    async with plain_uow:
+        await add_value(plain_uow, 1)
+        async with plain_uow:
+            await add_value(plain_uow, 2)
+        await plain_uow.commit()
+
+    assert await get_values(db_connection) == [1]
+
+
+async def test_committed_nested_block_is_kept(plain_uow, db_connection):
+    async with plain_uow:
+        async with plain_uow:
+            await add_value(plain_uow, 1)
+            await plain_uow.commit()
+        await add_value(plain_uow, 2)
+
+    assert await get_values(db_connection) == [1]
+
+
+async def test_failed_nested_block_keeps_outer_work(plain_uow, db_connection):
+    async with plain_uow:
+        await add_value(plain_uow, 1)
+        with pytest.raises(ZeroDivisionError):
+            async with plain_uow:
+                await add_value(plain_uow, 2)
+                raise ZeroDivisionError
+        await add_value(plain_uow, 3)
+        await plain_uow.commit()
+
+    assert await get_values(db_connection) == [1, 3]
+
+
+async def test_rollback_of_nested_block(plain_uow, db_connection):
+    async with plain_uow:
+        await add_value(plain_uow, 1)
+        async with plain_uow:
+            await add_value(plain_uow, 2)
+            await plain_uow.rollback()
+        await plain_uow.commit()
+
+    assert await get_values(db_connection) == [1]
+
+
+async def test_kept_session_rolls_back_uncommitted_blocks(plain_uow, db_connection):
+    plain_uow.keep_session = True
+    async with plain_uow:
+        await add_value(plain_uow, 1)
+        await plain_uow.commit()
+    session = plain_uow.session
+    async with plain_uow:
+        await add_value(plain_uow, 2)
+    async with plain_uow:
+        assert plain_uow.session is session
+        await add_value(plain_uow, 3)
+        await plain_uow.commit()
+    await plain_uow.close()
+
+    assert await get_values(db_connection) == [1, 3]